@@ -17,13 +17,23 @@ db_url = os.getenv("DATABASE_URL")
 if db_url:
     config.set_main_option("sqlalchemy.url", db_url)
 
+# user shards (app/db/shards.py) each get the same migrations: all of them, or `-x shard=N`;
+# autogenerate compares against shard 0 only
+shard_urls = [config.get_main_option("sqlalchemy.url")]
+shard_urls += [u.strip() for u in os.getenv("DB_SHARD_URLS", "").split(",") if u.strip()]
+picked = context.get_x_argument(as_dictionary=True).get("shard")
+if picked is not None:
+    shard_urls = [shard_urls[int(picked)]]
+elif getattr(config.cmd_opts, "autogenerate", False):
+    shard_urls = shard_urls[:1]
+
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
 target_metadata = Base.metadata
 
 def run_migrations_offline():
-    url = config.get_main_option("sqlalchemy.url")
+    url = shard_urls[0]
     context.configure(
         url=url,
         target_metadata=target_metadata,
@@ -33,16 +43,25 @@ def run_migrations_offline():
     with context.begin_transaction():
         context.run_migrations()
 
+def run_migrations(connection):
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
 def run_migrations_online():
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
-    with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
-        with context.begin_transaction():
-            context.run_migrations()
+    # app.db.schema passes the connection it holds the migration lock on
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_migrations(connection)
+        return
+    for url in shard_urls:
+        connectable = engine_from_config(
+            dict(config.get_section(config.config_ini_section, {}), **{"sqlalchemy.url": url}),
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
+        )
+        with connectable.connect() as connection:
+            run_migrations(connection)
 
 if context.is_offline_mode():
     run_migrations_offline()
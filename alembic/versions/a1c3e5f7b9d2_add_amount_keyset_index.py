@@ -0,0 +1,28 @@
+"""add (user_id, amount, id) index for keyset pagination
+
+Revision ID: a1c3e5f7b9d2
+Revises: deb65e1cf6e2
+Create Date: 2026-10-18 09:12:41.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b9d2'
+down_revision: Union[str, Sequence[str], None] = 'deb65e1cf6e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_expenses_user_amount_id', 'expenses', ['user_id', 'amount', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_expenses_user_amount_id', table_name='expenses')
@@ -0,0 +1,47 @@
+"""add user directory and shard fence
+
+Revision ID: a8d0c2e4f6b7
+Revises: f4b6d8e0a2c5
+Create Date: 2026-10-18 23:58:41.207316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db import shards
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d0c2e4f6b7'
+down_revision: Union[str, Sequence[str], None] = 'f4b6d8e0a2c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_directory',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('shard', sa.SmallInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_user_directory_email'), 'user_directory', ['email'], unique=True)
+    op.add_column('users', sa.Column('resident', sa.Boolean(), server_default=sa.true(), nullable=False))
+    op.execute(shards.FENCE_SQL)
+    # existing users all live on this database; on a new, empty shard this copies nothing
+    op.execute("INSERT INTO user_directory (id, email, shard) SELECT id, email, 0 FROM users")
+    op.execute("SELECT setval(pg_get_serial_sequence('user_directory', 'id'), "
+               "coalesce((SELECT max(id) FROM user_directory), 0) + 1, false)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # move every user back to shard 0 first (python -m app.db.rebalance move)
+    op.execute("DROP FUNCTION shard_fence(integer)")
+    op.drop_column('users', 'resident')
+    op.drop_index(op.f('ix_user_directory_email'), table_name='user_directory')
+    op.drop_table('user_directory')
@@ -0,0 +1,46 @@
+"""store job results in chunks
+
+Revision ID: b3e5a7c9d1f2
+Revises: a8d0c2e4f6b7
+Create Date: 2026-10-19 10:41:12.604815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e5a7c9d1f2'
+down_revision: Union[str, Sequence[str], None] = 'a8d0c2e4f6b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'job_result_chunks',
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['jobs.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('job_id', 'seq'),
+    )
+    # existing results become single-chunk results
+    op.execute("INSERT INTO job_result_chunks (job_id, seq, user_id, data) "
+               "SELECT id, 0, user_id, result FROM jobs WHERE result IS NOT NULL")
+    op.drop_column('jobs', 'result')
+    op.alter_column('jobs', 'result_size', type_=sa.BigInteger(), existing_nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('jobs', 'result_size', type_=sa.Integer(), existing_nullable=True)
+    op.add_column('jobs', sa.Column('result', sa.LargeBinary(), nullable=True))
+    op.execute("UPDATE jobs SET result = (SELECT string_agg(data, ''::bytea ORDER BY seq) "
+               "FROM job_result_chunks c WHERE c.job_id = jobs.id)")
+    op.drop_table('job_result_chunks')
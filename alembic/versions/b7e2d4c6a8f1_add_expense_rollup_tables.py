@@ -0,0 +1,62 @@
+"""add expense rollup tables
+
+Revision ID: b7e2d4c6a8f1
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-18 10:04:17.552906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4c6a8f1'
+down_revision: Union[str, Sequence[str], None] = 'a1c3e5f7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'expense_rollups_daily',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('category', sa.String(length=64), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'day', 'category'),
+    )
+    op.create_table(
+        'expense_rollups_monthly',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('category', sa.String(length=64), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'month', 'category'),
+    )
+
+    # backfill from existing rows; `python -m app.db.rollups rebuild` does the same later
+    op.execute("""
+        INSERT INTO expense_rollups_daily (user_id, day, category, total, count)
+        SELECT user_id, date_trunc('day', timezone('UTC', created_at))::date, category,
+               sum(amount), count(id)
+        FROM expenses GROUP BY 1, 2, 3
+    """)
+    op.execute("""
+        INSERT INTO expense_rollups_monthly (user_id, month, category, total, count)
+        SELECT user_id, date_trunc('month', timezone('UTC', created_at))::date, category,
+               sum(amount), count(id)
+        FROM expenses GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('expense_rollups_monthly')
+    op.drop_table('expense_rollups_daily')
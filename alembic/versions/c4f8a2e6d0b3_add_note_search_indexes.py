@@ -0,0 +1,39 @@
+"""add note search indexes (pg_trgm + tsvector)
+
+Revision ID: c4f8a2e6d0b3
+Revises: b7e2d4c6a8f1
+Create Date: 2026-10-18 11:37:05.204719
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f8a2e6d0b3'
+down_revision: Union[str, Sequence[str], None] = 'b7e2d4c6a8f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('expenses', sa.Column(
+        'note_tsv', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', coalesce(note, ''))", persisted=True),
+    ))
+    op.create_index('ix_expenses_note_trgm', 'expenses', ['note'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'note': 'gin_trgm_ops'})
+    op.create_index('ix_expenses_note_tsv', 'expenses', ['note_tsv'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_expenses_note_tsv', table_name='expenses')
+    op.drop_index('ix_expenses_note_trgm', table_name='expenses')
+    op.drop_column('expenses', 'note_tsv')
@@ -0,0 +1,115 @@
+"""partition expenses by month on created_at
+
+Revision ID: d9b1f3a5c7e2
+Revises: c4f8a2e6d0b3
+Create Date: 2026-10-18 14:02:37.551920
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9b1f3a5c7e2'
+down_revision: Union[str, Sequence[str], None] = 'c4f8a2e6d0b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# frozen copies of app/db/partitions.py as of this revision
+COLUMNS = "id, user_id, category, amount, note, created_at, updated_at"
+AHEAD_MONTHS = 3
+SECONDARY_INDEXES = ('ix_expenses_category', 'ix_expenses_created_at', 'ix_expenses_user_created_at',
+                     'ix_expenses_user_category', 'ix_expenses_user_amount_id', 'ix_expenses_note_trgm',
+                     'ix_expenses_note_tsv')
+
+
+def _add_months(d: date, n: int) -> date:
+    m = d.month - 1 + n
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+def _create_month(month: date) -> None:
+    lo, hi = month.isoformat(), _add_months(month, 1).isoformat()
+    op.execute(f"CREATE TABLE expenses_p{month:%Y_%m} PARTITION OF expenses "
+               f"FOR VALUES FROM ('{lo} 00:00:00+00') TO ('{hi} 00:00:00+00')")
+
+
+def _create_table(partitioned: bool) -> None:
+    op.execute(f"""
+        CREATE TABLE expenses (
+            id integer NOT NULL DEFAULT nextval('expenses_id_seq'),
+            user_id integer NOT NULL,
+            category varchar(64) NOT NULL,
+            amount double precision NOT NULL,
+            note varchar(255),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            note_tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(note, ''))) STORED,
+            CONSTRAINT expenses_pkey PRIMARY KEY ({'id, created_at' if partitioned else 'id'}),
+            CONSTRAINT expenses_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        ){' PARTITION BY RANGE (created_at)' if partitioned else ''}
+    """)
+    op.execute("ALTER SEQUENCE expenses_id_seq OWNED BY expenses.id")
+
+
+def _create_indexes() -> None:
+    op.create_index('ix_expenses_category', 'expenses', ['category'], unique=False)
+    op.create_index('ix_expenses_created_at', 'expenses', ['created_at'], unique=False)
+    op.create_index('ix_expenses_user_created_at', 'expenses', ['user_id', sa.text('created_at DESC')], unique=False)
+    op.create_index('ix_expenses_user_category', 'expenses', ['user_id', 'category'], unique=False)
+    op.create_index('ix_expenses_user_amount_id', 'expenses', ['user_id', 'amount', 'id'], unique=False)
+    op.create_index('ix_expenses_note_trgm', 'expenses', ['note'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'note': 'gin_trgm_ops'})
+    op.create_index('ix_expenses_note_tsv', 'expenses', ['note_tsv'], unique=False, postgresql_using='gin')
+
+
+def _set_aside() -> None:
+    """Rename the current table out of the way, freeing its constraint and index names."""
+    op.execute("ALTER TABLE expenses RENAME TO expenses_old")
+    op.execute("ALTER TABLE expenses_old RENAME CONSTRAINT expenses_pkey TO expenses_old_pkey")
+    op.execute("ALTER TABLE expenses_old RENAME CONSTRAINT expenses_user_id_fkey TO expenses_old_user_id_fkey")
+    for name in SECONDARY_INDEXES + ('ix_expenses_id',):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute("ALTER TABLE expenses_old ALTER COLUMN id DROP DEFAULT")
+    op.execute("ALTER SEQUENCE expenses_id_seq OWNED BY NONE")
+
+
+def _copy_and_drop_old() -> None:
+    op.execute(f"INSERT INTO expenses ({COLUMNS}) SELECT {COLUMNS} FROM expenses_old")
+    op.execute("DROP TABLE expenses_old")
+    op.execute("ANALYZE expenses")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _set_aside()
+    _create_table(partitioned=True)
+
+    # one partition per month that has data, through AHEAD_MONTHS past today
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text(
+        "SELECT min(created_at AT TIME ZONE 'UTC')::date FROM expenses_old")).scalar()
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    month = min(oldest or this_month, this_month).replace(day=1)
+    last = _add_months(this_month, AHEAD_MONTHS)
+    while month <= last:
+        _create_month(month)
+        month = _add_months(month, 1)
+    # anything further out (future-dated rows) lands here until `partitions ensure` picks it up
+    op.execute("CREATE TABLE expenses_default PARTITION OF expenses DEFAULT")
+
+    _copy_and_drop_old()
+    # the (id, created_at) primary key index leads with id, so ix_expenses_id is not recreated
+    _create_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _set_aside()
+    _create_table(partitioned=False)
+    _copy_and_drop_old()  # drops every partition
+    op.create_index('ix_expenses_id', 'expenses', ['id'], unique=False)
+    _create_indexes()
@@ -0,0 +1,40 @@
+"""add expenses archive
+
+Revision ID: f4b6d8e0a2c5
+Revises: e3a5c7d9f1b4
+Create Date: 2026-10-18 23:12:07.514390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b6d8e0a2c5'
+down_revision: Union[str, Sequence[str], None] = 'e3a5c7d9f1b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'expenses_archive',
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('category', sa.String(length=64), nullable=False),
+        sa.Column('note', sa.String(length=255), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'created_at', 'id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # archived rows go back to expenses first (python -m app.db.archive run with ARCHIVE_AFTER_MONTHS=0)
+    op.drop_table('expenses_archive')
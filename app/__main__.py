@@ -0,0 +1,54 @@
+"""Production launcher: ``python -m app``.
+
+    python -m app --workers 4
+    python -m app --port 9000 --loop uvloop --http httptools
+    python -m app --reload                      # development
+
+By default the launcher preloads: it imports the app and runs the ``DB_SCHEMA``
+step once, then starts the workers with ``DB_SCHEMA=off``. Import errors and
+schema mismatches then fail once, up front, instead of in every worker, and N
+workers don't each check or migrate the schema. ``--no-preload`` leaves the
+step to each worker's lifespan, where it is serialized by an advisory lock.
+"""
+import argparse, os, sys, time
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--loop", choices=("auto", "uvloop", "asyncio"), default="auto",
+                        help="event loop; auto uses uvloop when installed")
+    parser.add_argument("--http", choices=("auto", "httptools", "h11"), default="auto",
+                        help="HTTP parser; auto uses httptools when installed")
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=True,
+                        help="import the app and run the schema step before starting workers")
+    parser.add_argument("--reload", action="store_true", help="restart on code changes (single worker)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    if args.preload and not args.reload:
+        t0 = time.perf_counter()
+        import app.main  # noqa: F401
+        from app.core.settings import settings
+        from app.db import schema
+        from app.db.session import require_database
+        t1 = time.perf_counter()
+        try:
+            require_database()
+            schema.run()
+        except RuntimeError as e:  # includes SchemaError
+            sys.exit(f"startup aborted: {e}")
+        # spawned workers inherit the environment; a single worker runs in this process
+        os.environ["DB_SCHEMA"] = settings.DB_SCHEMA = "off"
+        print(f"preloaded: import {(t1 - t0) * 1000:.0f} ms, schema {(time.perf_counter() - t1) * 1000:.0f} ms",
+              file=sys.stderr)
+
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers,
+                loop=args.loop, http=args.http, reload=args.reload, log_level=args.log_level,
+                lifespan="on")
+
+if __name__ == "__main__":
+    main()
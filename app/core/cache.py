@@ -0,0 +1,172 @@
+"""Per-user versioned response cache with ETag / If-None-Match support.
+
+Every user has a data version that the write handlers bump after commit.
+Cached bodies are keyed by (user, endpoint, query, version), so a bump makes
+all of that user's entries unreachable without tracking them individually.
+A client whose ``If-None-Match`` matches the current ETag gets a 304 straight
+from the cache backend, without touching Postgres.
+
+The in-memory backend is per process; run more than one worker with
+``RESPONSE_CACHE_BACKEND=redis`` so that version bumps are shared.
+
+A bump can also record the primary's WAL position after the user's write.
+Replica routing (``app/db/replicas.py``) compares it with what each replica has
+replayed, so users always read their own writes. That needs the shared redis
+backend: with per-process marks, another worker would not see the write.
+"""
+import hashlib, threading, time, uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import Depends, Request, Response
+
+from app.core import metrics, serialize
+from app.core.security import get_current_user_id
+from app.core.settings import settings
+
+CACHE_REQUESTS = metrics.Counter("response_cache_requests_total",
+                                 "Cacheable requests by endpoint and outcome (hit, miss, not_modified)")
+
+class MemoryBackend:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self._writes: dict[int, int] = {}
+        # versions restart at 0 with the process; the boot id keeps old ETags from matching
+        self._boot = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> bytes | None:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            body, expires = hit
+            if time.time() >= expires:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return body
+
+    async def set(self, key: str, body: bytes, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (body, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def version(self, user_id: int) -> str:
+        return f"{self._boot}.{self._versions.get(user_id, 0)}"
+
+    async def bump(self, user_id: int, lsn: int = 0) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            if lsn:
+                self._writes[user_id] = max(lsn, self._writes.get(user_id, 0))
+
+    async def write_lsn(self, user_id: int) -> int:
+        return self._writes.get(user_id, 0)
+
+class RedisBackend:
+    # write marks only need to outlive replica lag
+    WRITE_MARK_TTL = 3600
+
+    def __init__(self, url: str, prefix: str = "expcache:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package")
+        self._r = redis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._r.get(self._prefix + key)
+
+    async def set(self, key: str, body: bytes, ttl: int) -> None:
+        await self._r.set(self._prefix + key, body, ex=ttl)
+
+    async def version(self, user_id: int) -> str:
+        v = await self._r.get(f"{self._prefix}v:{user_id}")
+        return v.decode() if v else "0"
+
+    async def bump(self, user_id: int, lsn: int = 0) -> None:
+        async with self._r.pipeline(transaction=False) as p:
+            p.incr(f"{self._prefix}v:{user_id}")
+            if lsn:
+                # GT: a slower request's older position never replaces a newer one
+                key = f"{self._prefix}lsn:{user_id}"
+                p.zadd(key, {"lsn": lsn}, gt=True)
+                p.expire(key, self.WRITE_MARK_TTL)
+            await p.execute()
+
+    async def write_lsn(self, user_id: int) -> int:
+        v = await self._r.zscore(f"{self._prefix}lsn:{user_id}", "lsn")
+        return int(v) if v else 0
+
+def _make_backend():
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        return RedisBackend(settings.RESPONSE_CACHE_URL)
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryBackend(settings.RESPONSE_CACHE_SIZE)
+    return None
+
+backend = _make_backend()
+
+async def bump_version(user_id: int, lsn: int = 0) -> None:
+    """Invalidate every cached response for ``user_id``; call after a write commits.
+
+    ``lsn`` is the primary's WAL position after that commit (``replicas.write_lsn``).
+    """
+    if backend is not None:
+        await backend.bump(user_id, lsn)
+
+async def write_lsn(user_id: int) -> int:
+    """WAL position a replica must have replayed to see ``user_id``'s writes, 0 if none is known."""
+    if backend is not None:
+        return await backend.write_lsn(user_id)
+    return 0
+
+@dataclass
+class CachedResponse:
+    """Handed to a route: return ``hit`` if set, else build the payload and ``store()`` it."""
+    endpoint: str
+    key: str | None = None
+    etag: str | None = None
+    hit: Response | None = None
+
+    async def store(self, payload) -> Response:
+        body = serialize.dumps(payload)
+        if backend is not None:
+            await backend.set(self.key, body, settings.RESPONSE_CACHE_TTL)
+        return _json(body, self.etag)
+
+def _json(body: bytes, etag: str | None) -> Response:
+    headers = {"Cache-Control": "private, no-cache"}
+    if etag:
+        headers["ETag"] = etag
+    return Response(body, media_type="application/json", headers=headers)
+
+def response_cache(endpoint: str, vary=None):
+    """Dependency factory; ``vary(request)`` adds extra key material (e.g. today's date)."""
+    async def dependency(request: Request, user_id: int = Depends(get_current_user_id)):
+        if backend is None:
+            return CachedResponse(endpoint)
+        params = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        if vary is not None:
+            params += f"|{vary(request)}"
+        version = await backend.version(user_id)
+        digest = hashlib.blake2b(f"{endpoint}?{params}".encode(), digest_size=8).hexdigest()
+        etag = f'W/"{version}-{digest}"'
+        cached = CachedResponse(endpoint, key=f"{user_id}:{version}:{digest}", etag=etag)
+
+        if etag in request.headers.get("if-none-match", ""):
+            CACHE_REQUESTS.inc(endpoint=endpoint, outcome="not_modified")
+            cached.hit = Response(status_code=304, headers={"ETag": etag,
+                                                            "Cache-Control": "private, no-cache"})
+        elif (body := await backend.get(cached.key)) is not None:
+            CACHE_REQUESTS.inc(endpoint=endpoint, outcome="hit")
+            cached.hit = _json(body, etag)
+        else:
+            CACHE_REQUESTS.inc(endpoint=endpoint, outcome="miss")
+        return cached
+    return dependency
@@ -0,0 +1,84 @@
+"""Bounded, off-loop executor for argon2 password hashing.
+
+Hashing runs on a dedicated thread or process pool sized by ``HASH_WORKERS`` so
+a login storm cannot take over Starlette's threadpool. At most
+``HASH_WORKERS + HASH_QUEUE_DEPTH`` jobs are admitted; the rest get an
+immediate 503 with ``Retry-After``.
+"""
+import asyncio, threading, time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+
+from app.core import metrics, timing
+from app.core.security import hash_password, verify_and_update
+from app.core.settings import settings
+
+HASH_SECONDS = metrics.Histogram("password_hash_seconds", "Time spent inside argon2")
+HASH_QUEUE_WAIT = metrics.Histogram("password_hash_queue_wait_seconds",
+                                    "Time a hashing job waited for a pool worker")
+HASH_REJECTED = metrics.Counter("password_hash_rejected_total",
+                                "Hashing jobs rejected because the pool was saturated")
+HASH_IN_FLIGHT = metrics.Gauge("password_hash_in_flight", "Hashing jobs admitted and not finished")
+
+def _timed(fn, *args):
+    # runs in the worker: report how long argon2 itself took
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+class PasswordHasher:
+    def __init__(self, workers: int, queue_depth: int, kind: str = "thread"):
+        self.workers = workers
+        self.capacity = workers + queue_depth
+        self.kind = kind
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix="argon2")
+        return self._executor
+
+    async def _submit(self, op: str, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                HASH_REJECTED.inc(op=op)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication is busy, retry shortly",
+                    headers={"Retry-After": str(settings.HASH_RETRY_AFTER)},
+                )
+            self._in_flight += 1
+        HASH_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, spent = await loop.run_in_executor(self.executor, _timed, fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            HASH_IN_FLIGHT.dec()
+            timing.record("hash", time.perf_counter() - t0)
+        HASH_SECONDS.observe(spent, op=op)
+        HASH_QUEUE_WAIT.observe(max(time.perf_counter() - t0 - spent, 0.0), op=op)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """Returns ``(ok, new_hash)``; ``new_hash`` is set when the stored hash needs upgrading."""
+        return await self._submit("verify", verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+hasher = PasswordHasher(settings.HASH_WORKERS, settings.HASH_QUEUE_DEPTH, settings.HASH_EXECUTOR)
@@ -0,0 +1,205 @@
+"""Admission control: per-client token buckets and a global concurrency limit.
+
+``rate_limit(budget)`` is a route dependency that charges one token from the
+caller's bucket for that budget: ``analytics``, ``read``, ``write`` or ``auth``.
+Authenticated callers are keyed by user id (the principal that
+``get_current_user_id`` resolves); anonymous ones by client IP. Run uvicorn
+with ``--proxy-headers`` behind a proxy so the IP is the client's. An empty
+bucket gets 429 with ``Retry-After``. Budgets are ``RATE_LIMIT_<BUDGET>``
+settings such as ``"60/1m"``: a burst of 60, refilled at 60 per minute.
+
+Buckets live in process memory by default. ``RATE_LIMIT_BACKEND=redis``
+shares them between workers through one atomic Lua script. If Redis is
+unreachable, requests are let through rather than failed.
+
+``AdmissionMiddleware`` caps the requests in flight per process (by default at
+the pool's ``DB_POOL_SIZE + DB_MAX_OVERFLOW``). Requests over the cap wait in a
+bounded queue for up to ``ADMISSION_QUEUE_TIMEOUT`` seconds, which should be
+well under ``DB_POOL_TIMEOUT``. After that, or when the queue is full, they get
+a 503 instead of piling up in front of the pool.
+"""
+import asyncio, logging, math, re, threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+from app.core import metrics, timing
+from app.core.security import resolve_principal
+from app.core.settings import settings
+
+log = logging.getLogger(__name__)
+
+BUDGETS = ("analytics", "read", "write", "auth")
+
+RATE_LIMITED = metrics.Counter("rate_limit_rejected_total",
+                               "Requests rejected by a token bucket, by budget and key (user, ip)")
+RATE_LIMIT_ERRORS = metrics.Counter("rate_limit_backend_errors_total",
+                                    "Bucket lookups that failed and let the request through")
+ADMISSION_REJECTED = metrics.Counter("admission_rejected_total",
+                                     "Requests shed by the concurrency limit, by reason (queue_full, timeout)")
+ADMISSION_WAIT = metrics.Histogram("admission_queue_wait_seconds",
+                                   "Time admitted requests waited for a slot")
+_admission: list = []  # AdmissionMiddleware instances, for the gauges
+ADMISSION_IN_FLIGHT = metrics.Gauge("admission_in_flight", "Requests holding an admission slot",
+                                    fn=lambda: {(): sum(m.in_flight for m in _admission)})
+ADMISSION_QUEUED = metrics.Gauge("admission_queued", "Requests waiting for an admission slot",
+                                 fn=lambda: {(): sum(m.waiting for m in _admission)})
+
+@dataclass(frozen=True)
+class Limit:
+    burst: int
+    rate: float  # tokens per second
+
+_LIMIT = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smh])\s*$")
+
+def parse_limit(spec: str) -> Limit | None:
+    """``"60/1m"`` -> burst 60, refilled at 1/s; empty or ``"0/..."`` means no limit."""
+    if not spec.strip():
+        return None
+    m = _LIMIT.match(spec)
+    if m is None:
+        raise ValueError(f"rate limit must look like 60/1m or 10/s, not {spec!r}")
+    count, n, unit = int(m[1]), int(m[2] or 1), m[3]
+    if count == 0:
+        return None
+    return Limit(burst=count, rate=count / (n * {"s": 1, "m": 60, "h": 3600}[unit]))
+
+class MemoryBackend:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # key -> (tokens, monotonic time of last refill); an evicted key starts full again
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, limit: Limit) -> float:
+        """Take a token; returns 0 if one was available, else seconds until there is."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - last) * limit.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+            self._buckets[key] = (tokens - 1 if wait == 0.0 else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+# KEYS[1] bucket; ARGV burst, rate. Redis' clock, so workers on different hosts agree.
+_TAKE_LUA = """
+local burst, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1e6
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = math.min(burst, (tonumber(b[1]) or burst) + (now - (tonumber(b[2]) or now)) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+class RedisBackend:
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self._r = redis.from_url(url)
+        self._take = self._r.register_script(_TAKE_LUA)
+        self._prefix = prefix
+
+    async def take(self, key: str, limit: Limit) -> float:
+        return float(await self._take(keys=[self._prefix + key], args=[limit.burst, limit.rate]))
+
+def _make_backend():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend(settings.RATE_LIMIT_URL)
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return MemoryBackend(settings.RATE_LIMIT_KEYS)
+    return None
+
+backend = _make_backend()
+limits = {b: parse_limit(getattr(settings, f"RATE_LIMIT_{b.upper()}")) for b in BUDGETS}
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+def rate_limit(budget: str):
+    """Dependency factory: charge the caller one token from ``budget`` or answer 429."""
+    if budget not in BUDGETS:
+        raise ValueError(f"unknown rate limit budget {budget!r}")
+
+    async def dependency(request: Request):
+        limit = limits[budget]
+        if backend is None or limit is None:
+            return
+        principal = resolve_principal(request)
+        kind, who = ("user", principal.user_id) if principal else ("ip", client_ip(request))
+        try:
+            wait = await backend.take(f"{budget}:{kind}:{who}", limit)
+        except Exception as e:  # a broken shared backend must not take the API down with it
+            RATE_LIMIT_ERRORS.inc()
+            log.warning("rate limit backend failed: %s", e)
+            return
+        if wait > 0:
+            RATE_LIMITED.inc(budget=budget, key=kind)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded, retry later",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+    return dependency
+
+class AdmissionMiddleware:
+    """Pure ASGI: at most ``limit`` requests in flight; a bounded, time-limited queue for the rest."""
+    # never queued or shed: scrapes have to keep working while the server is overloaded
+    EXEMPT = ("/metrics",)
+
+    def __init__(self, app, limit: int | None = None, queue_depth: int | None = None,
+                 timeout: float | None = None):
+        self.app = app
+        if limit is None:
+            limit = settings.ADMISSION_MAX_CONCURRENCY or settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        self.limit = limit
+        self.queue_depth = settings.ADMISSION_QUEUE_DEPTH if queue_depth is None else queue_depth
+        self.timeout = settings.ADMISSION_QUEUE_TIMEOUT if timeout is None else timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max(limit, 1))
+        _admission.append(self)
+
+    async def _reject(self, reason: str, scope, receive, send):
+        ADMISSION_REJECTED.inc(reason=reason)
+        response = JSONResponse({"detail": "Server busy, retry shortly"},
+                                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.limit < 0 or scope["path"] in self.EXEMPT:
+            return await self.app(scope, receive, send)
+
+        if self._slots.locked():
+            if self.waiting >= self.queue_depth:
+                return await self._reject("queue_full", scope, receive, send)
+            self.waiting += 1
+            t0 = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return await self._reject("timeout", scope, receive, send)
+            finally:
+                self.waiting -= 1
+            waited = time.perf_counter() - t0
+            ADMISSION_WAIT.observe(waited)
+            timing.record("queue", waited)
+        else:
+            await self._slots.acquire()
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
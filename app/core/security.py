@@ -1,11 +1,22 @@
-import os, jwt
+import os, jwt, hashlib, threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jwt import InvalidTokenError, ExpiredSignatureError
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from app.core.settings import settings
+from app.core import timing
 
-pwd = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
 
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me")
 JWT_ALG = os.getenv("JWT_ALG", "HS256")
@@ -19,25 +30,137 @@ def hash_password(p: str) -> str:
 def verify_password(p: str, hp: str) -> bool:
     return pwd.verify(p, hp)
 
+def verify_and_update(p: str, hp: str) -> tuple[bool, str | None]:
+    """Verify, and return a fresh hash if ``hp`` uses outdated cost parameters."""
+    return pwd.verify_and_update(p, hp)
+
 def create_token(user_id: int) -> str:
     payload = {"sub": str(user_id),
                "exp": datetime.now(timezone.utc) + timedelta(minutes=JWT_EXPIRE_MIN)}
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
 
-def decode_token(t: str) -> int:
+class TokenCache:
+    """Bounded LRU of verified token claims; entries never outlive the token's ``exp``."""
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._data: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> dict | None:
+        with self._lock:
+            hit = self._data.get(token)
+            if hit is None:
+                return None
+            claims, expires = hit
+            if time.time() >= expires:
+                del self._data[token]
+                return None
+            self._data.move_to_end(token)
+            return claims
+
+    def put(self, token: str, claims: dict) -> None:
+        if self.maxsize <= 0:
+            return
+        expires = min(float(claims.get("exp", 0)), time.time() + self.ttl)
+        with self._lock:
+            self._data[token] = (claims, expires)
+            self._data.move_to_end(token)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, token: str) -> None:
+        with self._lock:
+            self._data.pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+# digest -> exp; entries can be dropped once the token would have expired anyway
+_denylist: dict[str, float] = {}
+_revocation_hooks: list[Callable[[dict], bool]] = []
+
+def _digest(t: str) -> str:
+    return hashlib.sha256(t.encode()).hexdigest()
+
+def revoke_token(t: str) -> None:
     try:
-        data = jwt.decode(t, JWT_SECRET, algorithms=[JWT_ALG])
-        return int(data["sub"])
-    except ExpiredSignatureError:
-        raise InvalidTokenError("Token has expired")
+        exp = jwt.decode(t, options={"verify_signature": False}).get("exp", 0)
     except InvalidTokenError:
-        raise InvalidTokenError("Invalid token")
+        return
+    now = time.time()
+    for d in [d for d, e in _denylist.items() if e <= now]:
+        _denylist.pop(d, None)
+    _denylist[_digest(t)] = float(exp)
+    token_cache.discard(t)
 
-def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+def add_revocation_hook(fn: Callable[[dict], bool]) -> None:
+    """``fn(claims)`` returning True rejects the token; runs on cache hits too."""
+    _revocation_hooks.append(fn)
+
+def _is_revoked(t: str, claims: dict) -> bool:
+    return (bool(_denylist) and _digest(t) in _denylist) or any(h(claims) for h in _revocation_hooks)
+
+def verify_token(t: str) -> dict:
+    claims = token_cache.get(t)
+    if claims is None:
+        try:
+            claims = jwt.decode(t, JWT_SECRET, algorithms=[JWT_ALG])
+        except ExpiredSignatureError:
+            raise InvalidTokenError("Token has expired")
+        except InvalidTokenError:
+            raise InvalidTokenError("Invalid token")
+        token_cache.put(t, claims)
+    if _is_revoked(t, claims):
+        raise InvalidTokenError("Token has been revoked")
+    return claims
+
+def decode_token(t: str) -> int:
+    return int(verify_token(t)["sub"])
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int
+    claims: dict
+
+def _unauthorized():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def resolve_principal(request: Request, token: str | None = None) -> Principal | None:
+    """Verify the bearer token once per request and memoize it on ``request.state``.
+
+    Usable from middleware as well as dependencies; returns None when there is
+    no usable token.
+    """
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        return principal
+    if token is None:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+    t0 = time.perf_counter()
     try:
-        return decode_token(token)
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-        )
+        claims = verify_token(token)
+        principal = Principal(user_id=int(claims["sub"]), claims=claims)
+    except (InvalidTokenError, KeyError, TypeError, ValueError):
+        return None
+    finally:
+        timing.record("auth", time.perf_counter() - t0)
+    request.state.principal = principal
+    return principal
+
+async def get_principal(request: Request, token: str = Depends(oauth2_scheme)) -> Principal:
+    principal = resolve_principal(request, token)
+    if principal is None:
+        raise _unauthorized()
+    return principal
+
+async def get_current_user_id(principal: Principal = Depends(get_principal)) -> int:
+    return principal.user_id
@@ -0,0 +1,28 @@
+"""orjson fast path for hot JSON responses.
+
+Hot endpoints select plain column tuples and return ``json_response(...)``
+instead of building a Pydantic model per row and letting FastAPI validate and
+encode it again. Their ``response_model`` still documents the shape in
+OpenAPI. The bytes match FastAPI's default encoding: UTC datetimes end in
+``Z`` and dates are ISO strings.
+"""
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+def records(fields: tuple[str, ...], rows) -> list[dict]:
+    """Row tuples to dicts keyed by ``fields``, without a model per row."""
+    return [dict(zip(fields, r)) for r in rows]
+
+def json_response(obj, status_code: int = 200, headers: dict | None = None) -> Response:
+    return Response(dumps(obj), status_code=status_code, media_type="application/json", headers=headers)
@@ -1,13 +1,104 @@
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
-    DATABASE_URL: str
+    DATABASE_URL: str = ""  # required to serve; see app.db.session.require_database
     JWT_SECRET: str = "change-me"
     JWT_ALG: str = "HS256"
     JWT_EXPIRE_MIN: int = 60 * 24
+    DB_ASYNC: bool = False
+
+    # connection pool; DB_PGBOUNCER switches to NullPool without prepared statements
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800  # seconds, -1 disables
+    DB_POOL_PRE_PING: bool = False
+    DB_PGBOUNCER: bool = False
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # 0 = server default
+
+    # startup: schema "check" | "upgrade" | "create" | "off" (see app/db/schema.py)
+    DB_SCHEMA: str = "check"
+    DB_POOL_PREWARM: int = 2  # connections opened per pool before serving; 0 disables
+    WARMUP_REQUESTS: bool = True  # replay hot GET routes in-process before serving
+
+    # hot standbys for list/export/analytics reads; comma-separated URLs, empty = primary only
+    DB_REPLICA_URLS: str = ""
+    DB_REPLICA_MAX_LAG: float = 5.0  # seconds; replicas further behind are skipped
+    DB_REPLICA_CHECK_INTERVAL: float = 2.0  # seconds between health/lag probes
+
+    # user shards (see app/db/shards.py); DATABASE_URL is shard 0 and holds the user directory
+    DB_SHARD_URLS: str = ""  # comma-separated URLs of shards 1, 2, ...; only ever append
+    DB_SHARD_NEW_USERS: str = ""  # shard numbers new users are placed on, e.g. "2,3"; empty = all
+    DB_SHARD_CACHE_SIZE: int = 100000  # user -> shard entries cached per process
+    DB_SHARD_MOVE_TIMEOUT: float = 5.0  # seconds a move waits for the user's open transactions
+
+    # request instrumentation: Server-Timing "off", "request" (on X-Server-Timing: 1) or "always"
+    SERVER_TIMING: str = "request"
+    SLOW_QUERY_MS: int = 500  # 0 disables the slow-query log
+
+    # verified-JWT cache; 0 disables it
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: int = 300  # seconds, capped by the token's own exp
+
+    # analytics response cache: "memory" (per process), "redis" (shared) or "none"
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_URL: str = "redis://localhost:6379/0"
+    RESPONSE_CACHE_SIZE: int = 10000
+    RESPONSE_CACHE_TTL: int = 3600  # seconds
+
+    # per-client token buckets (see app/core/limits.py): "<burst>/<period>" such as 60/1m; empty = unlimited
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per process), "redis" (shared) or "none"
+    RATE_LIMIT_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_KEYS: int = 100000  # buckets kept by the memory backend
+    RATE_LIMIT_ANALYTICS: str = "120/1m"
+    RATE_LIMIT_READ: str = "600/1m"
+    RATE_LIMIT_WRITE: str = "300/1m"
+    RATE_LIMIT_AUTH: str = "20/1m"  # per client IP: login and registration
+
+    # requests in flight per process; 0 = DB_POOL_SIZE + DB_MAX_OVERFLOW, -1 disables
+    ADMISSION_MAX_CONCURRENCY: int = 0
+    ADMISSION_QUEUE_DEPTH: int = 100
+    ADMISSION_QUEUE_TIMEOUT: float = 5.0  # seconds; keep it well under DB_POOL_TIMEOUT
+    ADMISSION_RETRY_AFTER: int = 1  # seconds
+
+    # argon2 cost; raising these makes existing hashes get upgraded on next login
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+
+    # dedicated password-hashing pool; requests beyond workers + queue get 503
+    HASH_EXECUTOR: str = "thread"  # "thread" or "process"
+    HASH_WORKERS: int = 4
+    HASH_QUEUE_DEPTH: int = 32
+    HASH_RETRY_AFTER: int = 2  # seconds
+
+    # expenses older than this many whole months move to expenses_archive (python -m app.db.archive run); 0 = off
+    ARCHIVE_AFTER_MONTHS: int = 0
+
+    # rows /expenses/stats/distribution loads into memory (newest first, ~22 bytes each)
+    DISTRIBUTION_MAX_ROWS: int = 1_000_000
+
+    # background jobs (see app/db/jobs.py), run by python -m app.worker
+    JOB_WORKERS: int = 2  # worker processes
+    JOB_POLL_INTERVAL: float = 5.0  # seconds between polls when LISTEN/NOTIFY isn't delivering
+    JOB_HEARTBEAT_INTERVAL: float = 2.0  # seconds
+    JOB_LEASE_SECONDS: int = 60  # a running job without a heartbeat for this long is requeued
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 10.0  # seconds before the first retry, doubling after that
+    JOB_RESULT_TTL: int = 86400  # seconds a finished job and its result are kept
+    JOB_MAX_ACTIVE: int = 5  # queued or running jobs per user
+
+    # /ws/expenses live summaries (see app/db/live.py)
+    LIVE_UPDATES: bool = True  # NOTIFY on every expense write; off, connections get no deltas
+    LIVE_MAX_CONNECTIONS: int = 10000  # per API process
+    LIVE_MAX_PER_USER: int = 20
+    LIVE_QUEUE_SIZE: int = 256  # undelivered writes per connection before it gets a fresh snapshot instead
+    LIVE_SEND_TIMEOUT: float = 10.0  # seconds; a client that doesn't read for this long is disconnected
+    LIVE_AUTH_INTERVAL: float = 60.0  # seconds between re-checks of a connection's token
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+        extra = "ignore"
 
 settings = Settings()
@@ -0,0 +1,128 @@
+"""Per-request timing: where a request's latency went, as metrics and ``Server-Timing``.
+
+``TimingMiddleware`` puts a ``RequestTimings`` in a context variable for the
+duration of each request. Code on the request path adds to it with
+``record()`` (DB cursor hooks, pool checkouts, JWT verification, argon2), and
+``TimedRoute`` marks when the endpoint starts and returns so that dependency
+resolution and response serialization show up separately.
+
+When the request finishes, the middleware observes per-route histograms.
+Depending on ``SERVER_TIMING`` it also adds a ``Server-Timing`` header: never
+("off"), only when the client sends ``X-Server-Timing: 1`` ("request"), or on
+every response ("always").
+"""
+import functools, time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from inspect import iscoroutinefunction
+from fastapi.routing import APIRoute
+
+from app.core import metrics
+from app.core.settings import settings
+
+REQUEST_SECONDS = metrics.Histogram("http_request_duration_seconds",
+                                    "Request latency by method, route and status")
+REQUEST_DB_QUERIES = metrics.Histogram("http_request_db_queries", "SQL statements executed per request",
+                                       buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+REQUEST_DB_SECONDS = metrics.Histogram("http_request_db_seconds", "Time spent executing SQL per request")
+REQUEST_POOL_WAIT = metrics.Histogram("http_request_pool_wait_seconds",
+                                      "Time spent waiting for a pooled connection per request")
+
+# Server-Timing entries, in display order
+PHASES = ("queue", "deps", "endpoint", "serialize", "auth", "hash", "pool", "db")
+
+@dataclass
+class RequestTimings:
+    start: float = field(default_factory=time.perf_counter)
+    durations: dict[str, float] = field(default_factory=dict)
+    db_queries: int = 0
+    endpoint_start: float | None = None
+    endpoint_end: float | None = None
+
+    def add(self, phase: str, seconds: float):
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+    def server_timing(self, now: float) -> str:
+        d = dict(self.durations)
+        if self.endpoint_start is not None:
+            d["deps"] = self.endpoint_start - self.start
+            if self.endpoint_end is not None:
+                d["endpoint"] = self.endpoint_end - self.endpoint_start
+                d["serialize"] = now - self.endpoint_end
+        parts = []
+        for phase in PHASES:
+            if phase in d:
+                desc = f';desc="{self.db_queries} queries"' if phase == "db" else ""
+                parts.append(f"{phase};dur={d[phase] * 1000:.2f}{desc}")
+        parts.append(f"app;dur={(now - self.start) * 1000:.2f}")
+        return ", ".join(parts)
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+def current() -> RequestTimings | None:
+    return _current.get()
+
+def record(phase: str, seconds: float):
+    """Add ``seconds`` to ``phase`` of the current request, if there is one."""
+    t = _current.get()
+    if t is not None:
+        t.add(phase, seconds)
+
+class TimedRoute(APIRoute):
+    """Route class that marks when the endpoint function starts and returns."""
+    def get_route_handler(self):
+        call = self.dependant.call
+        if iscoroutinefunction(call) and not hasattr(call, "__timed__"):
+            @functools.wraps(call)
+            async def timed(*args, **kwargs):
+                t = _current.get()
+                if t is not None:
+                    t.endpoint_start = time.perf_counter()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    if t is not None:
+                        t.endpoint_end = time.perf_counter()
+            timed.__timed__ = True
+            self.dependant.call = timed
+        return super().get_route_handler()
+
+class TimingMiddleware:
+    """Pure ASGI middleware so streaming responses are timed to their last byte."""
+    def __init__(self, app, mode: str | None = None):
+        self.app = app
+        self.mode = mode or settings.SERVER_TIMING
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+        emit = self.mode == "always" or (
+            self.mode == "request" and (b"x-server-timing", b"1") in scope.get("headers", ()))
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if emit:
+                    header = timings.server_timing(time.perf_counter()).encode()
+                    message = {**message, "headers": [*message.get("headers", ()),
+                                                      (b"server-timing", header)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # unmatched paths share one label so scanners can't blow up the series count
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_SECONDS.observe(time.perf_counter() - timings.start,
+                                    method=method, route=path, status=str(status))
+            REQUEST_DB_QUERIES.observe(timings.db_queries, method=method, route=path)
+            REQUEST_DB_SECONDS.observe(timings.durations.get("db", 0.0), method=method, route=path)
+            REQUEST_POOL_WAIT.observe(timings.durations.get("pool", 0.0), method=method, route=path)
@@ -1,2 +1,3 @@
 # app/db/__init__.py
-from .session import Base, engine, get_db  # convenience re-exports
+from .session import Base, Database, engine  # convenience re-exports
+from .shards import get_db
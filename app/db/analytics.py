@@ -0,0 +1,65 @@
+"""Single-query analytics over the rollup tables.
+
+``period_stats`` answers every analytics endpoint with one ``GROUPING SETS``
+scan of the daily or monthly rollups: period totals, per-category sums and a
+per-bucket series for the requested period, plus the same totals for an
+optional comparison period. Rollups are bucketed in UTC; periods in another
+time zone scan ``expenses``, and the archive if they reach it, instead (see
+``app.db.queries``).
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from sqlalchemy.orm import Session
+
+from app.db import archive, queries
+
+@dataclass
+class Period:
+    total: float = 0.0
+    count: int = 0
+    by_category: dict[str, tuple[float, int]] = field(default_factory=dict)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+@dataclass
+class PeriodStats:
+    current: Period
+    previous: Period | None
+    series: list[tuple[date, float]]
+
+def period_stats(db: Session, user_id: int, start: date | None, end: date | None,
+                 prev_start: date | None = None, granularity: str = "month",
+                 tz: str = queries.UTC) -> PeriodStats:
+    """Stats for ``[start, end)``; with ``prev_start`` also for ``[prev_start, start)``.
+
+    ``granularity`` picks the rollup table and the bucket size of ``series``.
+    Dates are local to ``tz``; outside UTC they are read from ``expenses``.
+    """
+    local = tz != queries.UTC
+    lower = prev_start if prev_start is not None else start
+    bound = (lambda d: queries.midnight(d, tz)) if local else (lambda d: d)
+    archived = local and archive.reaches(lower and bound(lower))
+    stmt = queries.stats_statement(granularity, local, prev_start is not None,
+                                   lower is not None, end is not None, archived)
+    params = {"user_id": user_id}
+    if local:
+        params["tz"] = tz
+    for name, d in (("lower", lower), ("start", prev_start and start), ("end", end)):
+        if d is not None:
+            params[name] = bound(d)
+
+    current, previous, series = Period(), Period() if prev_start is not None else None, []
+    for r in db.execute(stmt, params):
+        p = current if r.cur else previous
+        total, cnt = float(r.total or 0.0), int(r.cnt or 0)
+        if r.g_cat and r.g_bucket:
+            p.total, p.count = total, cnt
+        elif not r.g_cat:
+            p.by_category[r.category] = (total, cnt)
+        elif r.cur:
+            series.append((r.bucket, total))
+    series.sort()
+    current.by_category = dict(sorted(current.by_category.items(), key=lambda kv: -kv[1][0]))
+    return PeriodStats(current=current, previous=previous, series=series)
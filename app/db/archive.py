@@ -0,0 +1,153 @@
+"""Cold tier: expenses older than ``ARCHIVE_AFTER_MONTHS`` live in ``expenses_archive``.
+
+The horizon is the first day (UTC) of the month ``ARCHIVE_AFTER_MONTHS``
+before this one; ``run`` moves every expense older than that into the
+archive. Whole monthly partitions are copied in ``(user_id, created_at)``
+order and then dropped, so the hot table keeps no dead rows and each user's
+month sits on a few adjacent archive pages. Anything else past the horizon
+(the default partition, an unpartitioned table) is moved row by row.
+
+The archive stores whole cents, so amounts with more decimals are rounded on
+the way in. The same move shifts the rollups by the rounding difference, which
+keeps them equal to a rebuild from both tables.
+
+Reads whose range starts before the horizon (``reaches``) also scan the
+archive; everything else touches ``expenses`` alone. Rollups keep archived
+history, so UTC analytics never read the archive. Updates and deletes of
+archived expenses are applied in place (``app.db.batch``) and keep the rollups
+in step.
+
+``run`` also moves rows that are newer than the horizon back, after
+``ARCHIVE_AFTER_MONTHS`` is raised or set to 0. Run it from cron with the
+API's settings, and right after changing them:
+
+    python -m app.db.archive run
+    python -m app.db.archive status
+"""
+import argparse
+from datetime import date, datetime, time, timezone
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+import app.models as models
+from app.core.settings import settings
+from app.db import partitions
+
+TABLE = models.ArchivedExpense.__tablename__
+COLUMNS = "id, user_id, category, amount_cents, note, created_at, updated_at"
+# rounded to the cent on the way in
+_TO_ARCHIVE = "id, user_id, category, round(amount * 100)::bigint, note, created_at, updated_at"
+_FROM_ARCHIVE = "id, user_id, category, amount_cents / 100.0, note, created_at, updated_at"
+_ORDER = "ORDER BY user_id, created_at, id"
+_ROLLUPS = ((models.DailyRollup.__tablename__, "day"), (models.MonthlyRollup.__tablename__, "month"))
+
+def _rounding(src: str) -> list[str]:
+    """UPDATEs that move the rollups of ``src``'s rows onto their amounts rounded to the cent."""
+    return [f"""
+        UPDATE {rollup} r SET total = r.total + d.diff
+        FROM (SELECT user_id, date_trunc('{bucket}', created_at AT TIME ZONE 'UTC')::date AS bucket,
+                     category, sum(round(amount * 100) / 100 - amount) AS diff
+              FROM {src} WHERE round(amount * 100) / 100 <> amount GROUP BY 1, 2, 3) d
+        WHERE r.user_id = d.user_id AND r.{bucket} = d.bucket AND r.category = d.category
+    """ for rollup, bucket in _ROLLUPS]
+
+def horizon(today: date | None = None) -> datetime | None:
+    """Everything archived is older than this; None when archiving is off."""
+    if settings.ARCHIVE_AFTER_MONTHS <= 0:
+        return None
+    this_month = (today or datetime.now(timezone.utc).date()).replace(day=1)
+    return datetime.combine(partitions.add_months(this_month, -settings.ARCHIVE_AFTER_MONTHS),
+                            time(), timezone.utc)
+
+def reaches(start: datetime | None) -> bool:
+    """Whether a range starting at ``start`` (None: unbounded) needs the archive."""
+    h = horizon()
+    return h is not None and (start is None or start < h)
+
+def tables(start: datetime | None) -> tuple:
+    """The expense models to read for a range starting at ``start``."""
+    return (models.Expense, models.ArchivedExpense) if reaches(start) else (models.Expense,)
+
+def archive_partition(conn: Connection, p: partitions.Partition) -> int:
+    # no writes may land between the copy and the drop
+    conn.execute(text(f"LOCK TABLE {p.name} IN EXCLUSIVE MODE"))
+    for stmt in _rounding(p.name):
+        conn.execute(text(stmt))
+    n = conn.execute(text(
+        f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {_TO_ARCHIVE} FROM {p.name} {_ORDER}")).rowcount
+    conn.execute(text(f"ALTER TABLE {partitions.TABLE} DETACH PARTITION {p.name}"))
+    conn.execute(text(f"DROP TABLE {p.name}"))
+    return n
+
+def archive_rows(conn: Connection, before: datetime) -> int:
+    daily, monthly = _rounding("moved")
+    return conn.execute(text(f"""
+        WITH moved AS (DELETE FROM {partitions.TABLE} WHERE created_at < :before RETURNING *),
+             daily AS ({daily}), monthly AS ({monthly})
+        INSERT INTO {TABLE} ({COLUMNS}) SELECT {_TO_ARCHIVE} FROM moved {_ORDER}
+    """), {"before": before}).rowcount
+
+def restore_rows(conn: Connection, since: datetime | None) -> int:
+    """Move archived rows at or after ``since`` (None: all) back into ``expenses``."""
+    where = "" if since is None else "WHERE created_at >= :since"
+    n = conn.execute(text(f"""
+        WITH moved AS (DELETE FROM {TABLE} {where} RETURNING *)
+        INSERT INTO {partitions.TABLE} ({partitions.COLUMNS}) SELECT {_FROM_ARCHIVE} FROM moved
+    """), {"since": since}).rowcount
+    if n and partitions.is_partitioned(conn):
+        partitions.ensure(conn)  # restored months land in the default partition first
+    return n
+
+def _status(engine):
+    with engine.connect() as conn:
+        for t in (partitions.TABLE, TABLE):
+            rows, size = conn.execute(text("""
+                SELECT sum(greatest(c.reltuples, 0))::bigint, pg_size_pretty(sum(pg_total_relation_size(c.oid)))
+                FROM pg_class c
+                WHERE c.oid IN (SELECT relid FROM pg_partition_tree(:t) WHERE isleaf)
+                   OR c.oid = to_regclass(:t) AND c.relkind = 'r'
+            """), {"t": t}).one()
+            print(f"{t:<18} ~{rows:>10} rows {size:>10}")
+
+def _run(engine, before: datetime | None, label: str):
+    with engine.begin() as conn:
+        restored = restore_rows(conn, before)
+    moved, dropped = 0, []
+    if before is not None:
+        with engine.connect() as conn:
+            old = [p for p in partitions.partitions(conn)
+                   if p.month is not None and partitions.add_months(p.month, 1) <= before.date()]
+        for p in old:  # a transaction per month
+            with engine.begin() as conn:
+                moved += archive_partition(conn, p)
+            dropped.append(p.name)
+        with engine.begin() as conn:
+            moved += archive_rows(conn, before)
+            conn.execute(text(f"ANALYZE {TABLE}"))
+    print(f"{label}archived {moved} rows" + (f" (dropped {', '.join(dropped)})" if dropped else "")
+          + f", restored {restored}")
+
+def main(argv=None):
+    from app.db.session import require_database
+    from app.db.shards import cluster, sharded
+
+    parser = argparse.ArgumentParser(prog="python -m app.db.archive")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("run", help="archive expenses older than the horizon, restore newer ones")
+    sub.add_parser("status", help="show the horizon and the size of both tiers")
+    args = parser.parse_args(argv)
+
+    require_database()
+    before = horizon()
+    if args.cmd == "status":
+        print(f"horizon: {before.date() if before else 'off (ARCHIVE_AFTER_MONTHS=0)'}")
+        for shard in cluster:
+            if sharded():
+                print(f"shard {shard.index} ({shard.name})")
+            _status(shard.engine)
+        return
+    for shard in cluster:
+        _run(shard.engine, before, f"shard {shard.index}: " if sharded() else "")
+
+if __name__ == "__main__":
+    main()
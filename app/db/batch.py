@@ -0,0 +1,127 @@
+"""Set-based expense writes with ``RETURNING``.
+
+Each helper is one statement for any number of rows and hands back the rows it
+touched, so no follow-up SELECT is needed either to answer the client or to
+correct the rollups. ``apply`` runs a whole ``ExpenseBatch`` in the caller's
+transaction.
+
+Ids not found in ``expenses`` are looked up in ``expenses_archive`` (see
+``app.db.archive``) and written there, so archived expenses stay editable.
+Their rows come back in the same shape, with ``amount`` in units and rounded
+to the cent as stored, and those are the amounts the rollups receive.
+"""
+from sqlalchemy import (BigInteger, Float, Integer, String, cast, column, delete, func, insert, select,
+                        update, values)
+from sqlalchemy.orm import Session
+
+import app.models as models
+from app.db import rollups
+from app.schemas.expense import (BatchItemResult, BatchResult, ExpenseBatch, ExpenseCreate,
+                                 ExpenseOut, ExpenseUpdateItem)
+
+T = models.Expense.__table__
+COLUMNS = (T.c.id, T.c.user_id, T.c.category, T.c.amount, T.c.note, T.c.created_at, T.c.updated_at)
+A = models.ArchivedExpense.__table__
+ARCHIVED = (A.c.id, A.c.user_id, A.c.category, (cast(A.c.amount_cents, Float) / 100).label("amount"),
+            A.c.note, A.c.created_at, A.c.updated_at)
+
+def _cents(amount):
+    # as app.db.archive rounds on the way in
+    return cast(func.round(amount * 100), BigInteger)
+
+def insert_expenses(db: Session, user_id: int, items: list[ExpenseCreate]) -> list:
+    """Multi-row INSERT; rows come back in the order of ``items``."""
+    if not items:
+        return []
+    stmt = insert(T).returning(*COLUMNS, sort_by_parameter_order=True)
+    return db.execute(stmt, [dict(i.model_dump(), user_id=user_id) for i in items]).all()
+
+def _values(items: list[ExpenseUpdateItem]):
+    return values(column("id", Integer), column("category", String), column("amount", Float),
+                  column("note", String), name="v").data([(i.id, i.category, i.amount, i.note) for i in items])
+
+def update_expenses(db: Session, user_id: int, items: list[ExpenseUpdateItem]) -> dict[int, object]:
+    """UPDATE ... FROM (VALUES ...) for the user's rows; missing ids are simply absent.
+
+    Returned rows also carry ``old_category``/``old_amount``, read from a locked
+    CTE that sees the pre-update values. Locks are taken in id order so
+    concurrent batches for the same user can't deadlock.
+    """
+    if not items:
+        return {}
+    v = _values(items)
+    old = (select(T.c.id, T.c.category, T.c.amount)
+           .where(T.c.user_id == user_id, T.c.id.in_([i.id for i in items]))
+           .order_by(T.c.id).with_for_update().cte("old"))
+    stmt = (
+        update(T)
+        .where(T.c.id == v.c.id, T.c.id == old.c.id)
+        .values(category=v.c.category, amount=v.c.amount, note=v.c.note)
+        .returning(*COLUMNS, old.c.category.label("old_category"), old.c.amount.label("old_amount"))
+    )
+    rows = {r.id: r for r in db.execute(stmt)}
+    missing = [i for i in items if i.id not in rows]
+    if missing:
+        rows |= _update_archived(db, user_id, missing)
+    return rows
+
+def _update_archived(db: Session, user_id: int, items: list[ExpenseUpdateItem]) -> dict[int, object]:
+    v = _values(items)
+    old = (select(A.c.id, A.c.created_at, A.c.category, A.c.amount_cents)
+           .where(A.c.user_id == user_id, A.c.id.in_([i.id for i in items]))
+           .order_by(A.c.id).with_for_update().cte("old"))
+    stmt = (
+        update(A)
+        .where(A.c.user_id == user_id, A.c.created_at == old.c.created_at, A.c.id == old.c.id,
+               A.c.id == v.c.id)
+        .values(category=v.c.category, amount_cents=_cents(v.c.amount), note=v.c.note, updated_at=func.now())
+        .returning(*ARCHIVED, old.c.category.label("old_category"),
+                   (cast(old.c.amount_cents, Float) / 100).label("old_amount"))
+    )
+    return {r.id: r for r in db.execute(stmt)}
+
+def delete_expenses(db: Session, user_id: int, ids: list[int]) -> dict[int, object]:
+    if not ids:
+        return {}
+    stmt = delete(T).where(T.c.user_id == user_id, T.c.id.in_(ids)).returning(*COLUMNS)
+    rows = {r.id: r for r in db.execute(stmt)}
+    missing = [i for i in ids if i not in rows]
+    if missing:
+        stmt = delete(A).where(A.c.user_id == user_id, A.c.id.in_(missing)).returning(*ARCHIVED)
+        rows |= {r.id: r for r in db.execute(stmt)}
+    return rows
+
+def update_rollups(db: Session, user_id: int, created=(), updated=(), deleted=()) -> None:
+    def deltas():
+        for r in created:
+            yield r.created_at, r.category, r.amount, 1
+        for r in updated:
+            yield r.created_at, r.old_category, -r.old_amount, -1
+            yield r.created_at, r.category, r.amount, 1
+        for r in deleted:
+            yield r.created_at, r.category, -r.amount, -1
+    rollups.apply_many(db, user_id, deltas())
+
+def apply(db: Session, user_id: int, batch: ExpenseBatch) -> BatchResult:
+    """Creates, then updates, then deletes; ids the user doesn't own come back as 404 items."""
+    created = insert_expenses(db, user_id, batch.create)
+    updated = update_expenses(db, user_id, batch.update)
+    deleted = delete_expenses(db, user_id, batch.delete)
+    update_rollups(db, user_id, created, updated.values(), deleted.values())
+
+    results = [BatchItemResult(op="create", index=n, status=201, id=r.id,
+                               expense=ExpenseOut.model_validate(r))
+               for n, r in enumerate(created)]
+    for n, item in enumerate(batch.update):
+        r = updated.get(item.id)
+        results.append(
+            BatchItemResult(op="update", index=n, status=200, id=item.id, expense=ExpenseOut.model_validate(r))
+            if r is not None else
+            BatchItemResult(op="update", index=n, status=404, id=item.id, error="Expense not found"))
+    for n, expense_id in enumerate(batch.delete):
+        found = expense_id in deleted
+        results.append(BatchItemResult(op="delete", index=n, status=204 if found else 404, id=expense_id,
+                                       error=None if found else "Expense not found"))
+
+    return BatchResult(created=len(created), updated=len(updated), deleted=len(deleted),
+                       failed=sum(r.status == 404 for r in results), results=results)
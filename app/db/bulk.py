@@ -0,0 +1,162 @@
+"""Streaming bulk import/export of expenses.
+
+Imports are parsed incrementally as body chunks arrive, validated against
+``ExpenseImportRow`` and loaded ``CHUNK_ROWS`` at a time with PostgreSQL
+``COPY`` (falling back to a multi-row INSERT on drivers without it).
+Exports encode plain column tuples straight to CSV/NDJSON text.
+"""
+import codecs, csv, io, json
+from datetime import datetime, timezone
+from typing import Optional
+from pydantic import ValidationError
+from sqlalchemy import Select, insert, select
+from sqlalchemy.orm import Session
+
+import app.models as models
+from app.db import queries, rollups
+from app.schemas.expense import ExpenseImportRow, ImportResult, ImportRowError
+
+CHUNK_ROWS = 5000
+MAX_REPORTED_ERRORS = 1000
+EXPORT_BATCH_ROWS = 1000
+
+EXPORT_FIELDS = ("id", "category", "amount", "note", "created_at", "updated_at")
+
+COPY_SQL = (
+    "COPY expenses (user_id, category, amount, note, created_at) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+class ImportParser:
+    """Push parser: ``feed()`` body chunks, get back validated rows.
+
+    CSV records may span chunks and contain quoted newlines; a newline only ends
+    a record when the running count of ``"`` characters is even.
+    """
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.failed = 0
+        self.errors: list[ImportRowError] = []
+        self._now = datetime.now(timezone.utc)
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._pending = ""
+        self._record: list[str] = []
+        self._in_quotes = False
+        self._line = 0
+        self._record_line = 1
+        self._header: Optional[list[str]] = None
+
+    def feed(self, chunk: bytes) -> list[ExpenseImportRow]:
+        return self._parse(self._decoder.decode(chunk), final=False)
+
+    def close(self) -> list[ExpenseImportRow]:
+        return self._parse(self._decoder.decode(b"", final=True), final=True)
+
+    def result(self, inserted: int) -> ImportResult:
+        return ImportResult(
+            inserted=inserted,
+            failed=self.failed,
+            errors=self.errors,
+            errors_truncated=self.failed > len(self.errors),
+        )
+
+    def _parse(self, text: str, final: bool) -> list[ExpenseImportRow]:
+        *lines, self._pending = (self._pending + text).split("\n")
+        if final and self._pending:
+            lines.append(self._pending)
+            self._pending = ""
+        rows = []
+        for line in lines:
+            self._line += 1
+            if self.fmt == "ndjson":
+                if line.strip():
+                    self._handle(self._line, self._ndjson(line), rows)
+                continue
+            if not self._record:
+                self._record_line = self._line
+            self._record.append(line)
+            if line.count('"') % 2:
+                self._in_quotes = not self._in_quotes
+            if not self._in_quotes:
+                self._csv("\n".join(self._record), rows)
+                self._record = []
+        return rows
+
+    def _ndjson(self, line: str):
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            return f"invalid JSON: {e}"
+
+    def _csv(self, record: str, rows: list) -> None:
+        if not record.strip("\r"):
+            return
+        values = next(csv.reader([record]))
+        if self._header is None:
+            self._header = [h.strip() for h in values]
+            return
+        rec = {k: (v if v != "" else None) for k, v in zip(self._header, values) if k}
+        self._handle(self._record_line, rec, rows)
+
+    def _handle(self, line: int, rec, rows: list) -> None:
+        try:
+            if isinstance(rec, str):
+                raise ValueError(rec)
+            row = ExpenseImportRow.model_validate(rec)
+        except (ValidationError, ValueError) as e:
+            self.failed += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                msg = "; ".join(
+                    f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+                ) if isinstance(e, ValidationError) else str(e)
+                self.errors.append(ImportRowError(line=line, error=msg))
+            return
+        if row.created_at is None:
+            row.created_at = self._now
+        elif row.created_at.tzinfo is None:
+            row.created_at = row.created_at.replace(tzinfo=timezone.utc)
+        rows.append(row)
+
+def load_rows(db: Session, user_id: int, rows: list[ExpenseImportRow]) -> int:
+    """COPY one chunk of validated rows and fold it into the rollups."""
+    cur = db.connection().connection.cursor()
+    try:
+        copied = hasattr(cur, "copy_expert")
+        if copied:
+            buf = io.StringIO()
+            w = csv.writer(buf)
+            for r in rows:
+                w.writerow((user_id, r.category, r.amount, r.note, r.created_at.isoformat()))
+            buf.seek(0)
+            cur.copy_expert(COPY_SQL, buf)
+    finally:
+        cur.close()
+    if not copied:
+        # async drivers have no copy_expert; use insertmanyvalues batches instead
+        db.execute(insert(models.Expense), [dict(r.model_dump(), user_id=user_id) for r in rows])
+    rollups.add_many(db, user_id, ((r.created_at, r.category, r.amount) for r in rows))
+    return len(rows)
+
+def export_statement(user_id: int, *filters) -> Select:
+    """``EXPORT_FIELDS`` of the rows matching ``queries.expense_filters``, newest first."""
+    src = queries.expense_rows(EXPORT_FIELDS, user_id, *filters)
+    return select(*(src.c[f] for f in EXPORT_FIELDS)).order_by(src.c.created_at.desc(), src.c.id.desc())
+
+def export_header(fmt: str) -> str:
+    return ",".join(EXPORT_FIELDS) + "\r\n" if fmt == "csv" else ""
+
+def encode_rows(rows, fmt: str) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    for r in rows:
+        created, updated = r[4].isoformat(), r[5].isoformat()
+        if fmt == "csv":
+            w.writerow((r[0], r[1], r[2], r[3], created, updated))
+        else:
+            buf.write(json.dumps(
+                {"id": r[0], "category": r[1], "amount": r[2], "note": r[3],
+                 "created_at": created, "updated_at": updated},
+                separators=(",", ":"),
+            ))
+            buf.write("\n")
+    return buf.getvalue()
@@ -0,0 +1,153 @@
+"""Spending distributions for one user, computed with NumPy.
+
+``load`` reads ``(id, local day, category, amount)`` of a period with one
+query, reading the archive too when the period reaches it. Postgres returns a
+row per category with each column joined into one comma-separated string,
+which NumPy parses in C: no Python object per expense. At most
+``DISTRIBUTION_MAX_ROWS`` of the newest rows are loaded (about 22 bytes each
+once parsed); ``Columns.truncated`` says when older ones were left out.
+
+``summarize`` has no Python loop over rows: amounts are sorted once by
+``(category, amount)``, and every per-category statistic is read off group
+offsets in that order. It returns percentiles and a histogram of amounts;
+per-category quartiles with Tukey outliers (beyond 1.5 IQR of the category's
+quartiles); and daily totals with trailing 7- and 30-day averages.
+``python -m benchmarks.distribution`` compares it with the same statistics in
+SQL.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import Date, Integer, Text, cast, func, literal, select, type_coerce
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.db import queries
+
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95, 99)
+WINDOWS = (7, 30)
+TOP_OUTLIERS = 5  # per category
+EPOCH = date(1970, 1, 1)
+
+@dataclass
+class Columns:
+    id: np.ndarray  # int64
+    day: np.ndarray  # int32, local days since 1970-01-01
+    category: np.ndarray  # int16, index into ``categories``
+    amount: np.ndarray  # float64
+    categories: list[str]
+    truncated: bool = False
+
+def load(db: Session, user_id: int, period: queries.Range, tz: str = queries.UTC,
+         category: str | None = None, max_rows: int | None = None) -> Columns:
+    """The newest ``max_rows`` (default ``DISTRIBUTION_MAX_ROWS``) expenses in ``period``."""
+    max_rows = max_rows or settings.DISTRIBUTION_MAX_ROWS
+    src = queries.expense_rows(("id", "category", "amount", "created_at"), user_id, category, period=period)
+    newest = (src.c.created_at.desc(), src.c.id.desc())
+    day = type_coerce(cast(func.timezone(tz, src.c.created_at), Date) - literal(EPOCH, Date), Integer)
+    rows = (select(src.c.id, day.label("day"), src.c.category, src.c.amount,
+                   func.row_number().over(order_by=newest).label("n"))
+            .order_by(*newest).limit(max_rows + 1).subquery())
+    kept = rows.c.n <= max_rows
+    joined = lambda col: func.string_agg(cast(col, Text), literal(",")).filter(kept)
+    stmt = (select(rows.c.category, joined(rows.c.id), joined(rows.c.day), joined(rows.c.amount),
+                   func.bool_or(~kept))
+            .group_by(rows.c.category))
+
+    categories, columns, truncated = [], [], False
+    for cat, ids, days, amounts, over in db.connection().execute(stmt):
+        truncated |= over
+        if ids is None:  # only the row past max_rows
+            continue
+        cols = [np.fromstring(s, t, sep=",")
+                for s, t in ((ids, np.int64), (days, np.int32), (amounts, np.float64))]
+        cols.insert(2, np.full(len(cols[0]), len(categories), np.int16))
+        categories.append(cat)
+        columns.append(cols)
+    if not columns:
+        return Columns(*(np.empty(0, t) for t in (np.int64, np.int32, np.int16, np.float64)), categories=[])
+    return Columns(*(np.concatenate(c) for c in zip(*columns)), categories=categories, truncated=truncated)
+
+def _day(n: int) -> str:
+    return (EPOCH + timedelta(days=int(n))).isoformat()
+
+def _edges(amount: np.ndarray, bins: int, scale: str) -> np.ndarray:
+    lo, hi = float(amount.min()), float(amount.max())
+    if hi <= lo:
+        return np.array([lo, lo + 1.0])
+    if scale == "log" and lo > 0:
+        return np.geomspace(lo, hi, bins + 1)
+    return np.linspace(lo, hi, bins + 1)
+
+def _group_quantile(sorted_values: np.ndarray, starts: np.ndarray, sizes: np.ndarray, q: float) -> np.ndarray:
+    """Linearly interpolated ``q`` quantile of each group of ``sorted_values`` (numpy's default method)."""
+    pos = starts + q * (sizes - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, starts + sizes - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+def summarize(cols: Columns, first_day: date, last_day: date, bins: int = 20, scale: str = "log") -> dict:
+    """Statistics of ``cols``; ``daily`` covers ``first_day`` through ``last_day``."""
+    amount, n = cols.amount, len(cols.amount)
+    out = {"count": n, "total": float(amount.sum()), "truncated": cols.truncated,
+           "loaded_since": _day(cols.day.min()) if cols.truncated else None}
+
+    if n:
+        pct = np.percentile(amount, PERCENTILES)
+        out["amount"] = {"mean": float(amount.mean()), "std": float(amount.std()),
+                         "min": float(amount.min()), "max": float(amount.max()),
+                         "percentiles": {f"p{p}": float(v) for p, v in zip(PERCENTILES, pct)}}
+        edges = _edges(amount, bins, scale)
+        counts, _ = np.histogram(amount, edges)
+        totals, _ = np.histogram(amount, edges, weights=amount)
+        out["histogram"] = {"scale": scale, "edges": edges.tolist(), "counts": counts.tolist(),
+                            "totals": totals.tolist()}
+    else:
+        out["amount"] = None
+        out["histogram"] = {"scale": scale, "edges": [], "counts": [], "totals": []}
+
+    # per category, from one sort by (category, amount)
+    order = np.lexsort((amount, cols.category))
+    a, c = amount[order], cols.category[order]
+    starts = np.flatnonzero(np.r_[True, c[1:] != c[:-1]]) if n else np.empty(0, np.int64)
+    sizes = np.diff(np.r_[starts, n])
+    group = np.repeat(np.arange(len(starts)), sizes)  # group of each sorted row
+    sums = np.add.reduceat(a, starts) if n else np.empty(0)
+    sq = np.add.reduceat(a * a, starts) if n else np.empty(0)
+    means = sums / np.maximum(sizes, 1)
+    stds = np.sqrt(np.maximum(sq / np.maximum(sizes, 1) - means ** 2, 0.0))
+    q1, median, q3, p90 = (_group_quantile(a, starts, sizes, q) for q in (0.25, 0.5, 0.75, 0.9))
+    above, below = q3 + 1.5 * (q3 - q1), q1 - 1.5 * (q3 - q1)
+    high = a > above[group]
+    outliers = np.bincount(group[high | (a < below[group])], minlength=len(starts))
+
+    by_category = []
+    for g in np.argsort(-sums):  # one iteration per category, not per row
+        s, e = starts[g], starts[g] + sizes[g]
+        top = np.flatnonzero(high[s:e])[::-1][:TOP_OUTLIERS] + s  # the largest come last in the group
+        rows = order[top]
+        by_category.append({
+            "category": cols.categories[c[s]], "count": int(sizes[g]), "total": float(sums[g]),
+            "mean": float(means[g]), "std": float(stds[g]), "median": float(median[g]),
+            "q1": float(q1[g]), "q3": float(q3[g]), "p90": float(p90[g]),
+            "outlier_above": float(above[g]), "outlier_below": float(below[g]), "outliers": int(outliers[g]),
+            "top_outliers": [{"id": int(cols.id[r]), "date": _day(cols.day[r]), "amount": float(cols.amount[r])}
+                             for r in rows],
+        })
+    out["by_category"] = by_category
+
+    # daily totals over the whole window, days without expenses included
+    d0 = (first_day - EPOCH).days
+    ndays = (last_day - first_day).days + 1
+    offset = cols.day.astype(np.int64) - d0
+    keep = (offset >= 0) & (offset < ndays)
+    totals = np.bincount(offset[keep], weights=amount[keep], minlength=ndays).astype(np.float64)
+    counts = np.bincount(offset[keep], minlength=ndays)
+    cum = np.r_[0.0, np.cumsum(totals)]
+    idx = np.arange(1, ndays + 1)
+    # trailing average over the last w days, or all days so far at the start of the window
+    rolling = {f"avg_{w}d": ((cum[idx] - cum[np.maximum(idx - w, 0)]) / np.minimum(idx, w)).tolist()
+               for w in WINDOWS}
+    out["daily"] = [{"date": _day(d0 + i), "total": t, "count": k, **{f: r[i] for f, r in rolling.items()}}
+                    for i, (t, k) in enumerate(zip(totals.tolist(), counts.tolist()))]
+    return out
@@ -0,0 +1,55 @@
+"""Cursor-level SQL instrumentation: per-request query count/time and a slow-query log.
+
+Statements slower than ``SLOW_QUERY_MS`` are logged to ``app.db.slow_query``
+in normalized form: literals and bind parameters become ``?`` and
+multi-row ``VALUES``/``IN`` lists are collapsed. That keeps the lines
+groupable and free of user data.
+"""
+import logging, re, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import metrics, timing
+from app.core.settings import settings
+
+slow_log = logging.getLogger("app.db.slow_query")
+
+SLOW_QUERIES = metrics.Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS")
+
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                       # string literals
+    (re.compile(r"%\(\w+\)s|\$\d+|%s|(?<!:):\w+\b"), "?"),        # bind parameters
+    (re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b"), "?"),           # numbers
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"\(\?(?:, ?\?)+\)"), "(?)"),                     # IN (?, ?, ?)
+    (re.compile(r"(\([^()]*\))(?:, ?\([^()]*\))+"), r"\1, ..."),  # VALUES (...), (...)
+]
+
+def normalize_sql(sql: str) -> str:
+    for pattern, repl in _NORMALIZE:
+        sql = pattern.sub(repl, sql)
+    return sql.strip()
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    t = timing.current()
+    if t is not None:
+        t.db_queries += 1
+        t.add("db", elapsed)
+    threshold = settings.SLOW_QUERY_MS
+    if threshold and elapsed * 1000 >= threshold:
+        SLOW_QUERIES.inc()
+        slow_log.warning("slow query %.1fms rows=%s%s: %s", elapsed * 1000, cursor.rowcount,
+                         " (executemany)" if executemany else "", normalize_sql(statement))
+
+def instrument(engine: Engine):
+    """Attach the hooks to a sync ``Engine`` (use ``async_engine.sync_engine`` for async)."""
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
@@ -0,0 +1,248 @@
+"""Background jobs: a queue in the ``jobs`` table, drained by ``python -m app.worker``.
+
+``enqueue`` inserts a row and NOTIFYs ``jobs`` so an idle worker wakes up at
+once. Workers ``claim`` the oldest runnable row with ``FOR UPDATE SKIP
+LOCKED``, so any number of them can share the table without blocking each
+other or running a job twice. While a job runs, its worker writes a heartbeat
+and the job's progress every ``JOB_HEARTBEAT_INTERVAL`` seconds. A job whose
+heartbeat is older than ``JOB_LEASE_SECONDS`` lost its worker and is requeued
+(``reap``).
+
+A job that raises is retried with exponential backoff until it has run
+``max_attempts`` times. ``JobError`` fails it at once, for errors that a retry
+won't fix. A result is gzip-compressed into a temporary file as the handler
+writes it and stored as ``RESULT_CHUNK_BYTES`` rows of ``job_result_chunks``,
+so neither the worker nor the download route holds it whole. The chunks are
+deleted with the job ``JOB_RESULT_TTL`` seconds after it finishes (``purge``).
+
+Handlers are registered per kind with ``@handler("kind")``. Each gets a
+session and a ``JobContext``, reports progress with ``ctx.report()`` and
+writes its result to ``ctx.result()``.
+"""
+import gzip, tempfile
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Iterator
+from sqlalchemy import case, delete, func, insert, literal, select, text, update
+from sqlalchemy.orm import Session
+
+import app.models as models
+from app.core import serialize
+from app.core.settings import settings
+from app.db import analytics, bulk, queries, rollups
+from app.schemas.job import ExportParams, ReportParams
+
+CHANNEL = "jobs"
+ACTIVE = ("queued", "running")
+RESULT_CHUNK_BYTES = 1 << 20
+RESULT_SPOOL_BYTES = 8 << 20  # a result spills from memory to a temporary file beyond this
+
+class JobError(Exception):
+    """Fails the job without retrying it; the message is shown to its owner."""
+
+@dataclass
+class JobContext:
+    id: int
+    user_id: int
+    params: dict
+    attempt: int
+    progress: float = 0.0
+    message: str | None = None
+    media_type: str | None = None
+    filename: str | None = None
+    size: int = 0
+    _buf: tempfile.SpooledTemporaryFile = field(
+        default_factory=lambda: tempfile.SpooledTemporaryFile(RESULT_SPOOL_BYTES))
+    _gz: gzip.GzipFile | None = None
+
+    def report(self, progress: float, message: str | None = None):
+        """Record progress in [0, 1]; the worker's heartbeat publishes it."""
+        self.progress = min(max(progress, 0.0), 1.0)
+        if message is not None:
+            self.message = message[:255]
+
+    def result(self, media_type: str, filename: str) -> "JobContext":
+        """Start the result; then ``write()`` its bytes."""
+        self.media_type, self.filename = media_type, filename
+        self._gz = gzip.GzipFile(fileobj=self._buf, mode="wb", mtime=0)
+        return self
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        self._gz.write(data)
+
+    def chunks(self) -> Iterator[bytes]:
+        """The gzip result in ``RESULT_CHUNK_BYTES`` slices, read back from the spool."""
+        if self._gz is None:
+            return
+        self._gz.close()
+        self._buf.seek(0)
+        try:
+            while data := self._buf.read(RESULT_CHUNK_BYTES):
+                yield data
+        finally:
+            self._buf.close()
+
+HANDLERS = {}
+
+def handler(kind: str):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+def enqueue(db: Session, user_id: int, kind: str, params: dict) -> models.Job:
+    job = models.Job(user_id=user_id, kind=kind, params=params, max_attempts=settings.JOB_MAX_ATTEMPTS)
+    db.add(job)
+    db.flush()
+    # delivered when the transaction commits
+    db.execute(text("SELECT pg_notify(:c, '')"), {"c": CHANNEL})
+    return job
+
+def active_count(db: Session, user_id: int) -> int:
+    J = models.Job
+    return db.execute(select(func.count()).select_from(J)
+                      .where(J.user_id == user_id, J.status.in_(ACTIVE))).scalar()
+
+def claim(db: Session, worker: str) -> models.Job | None:
+    """Lock the oldest runnable job, mark it running for ``worker`` and commit."""
+    J, U = models.Job, models.User
+    # a user being moved onto or off this shard (see app/db/shards.py) has no runnable jobs here
+    resident = select(U.id).where(U.id == J.user_id, U.resident).exists()
+    next_id = (select(J.id).where(J.status == "queued", J.run_after <= func.now(), resident)
+               .order_by(J.run_after, J.id).limit(1)
+               .with_for_update(skip_locked=True).scalar_subquery())
+    job = db.execute(
+        update(J).where(J.id == next_id)
+        .values(status="running", attempts=J.attempts + 1, worker=worker, progress=0.0,
+                message=None, started_at=func.now(), heartbeat_at=func.now())
+        .returning(J)
+    ).scalar_one_or_none()
+    if job is not None:
+        db.expunge(job)  # stays readable after the commit, in the worker's other sessions
+    db.commit()
+    return job
+
+def _owned(job_id: int, worker: str):
+    J = models.Job
+    return update(J).where(J.id == job_id, J.worker == worker, J.status == "running")
+
+def heartbeat(db: Session, ctx: JobContext, worker: str) -> bool:
+    """False when the job is no longer this worker's (it was reaped)."""
+    n = db.execute(_owned(ctx.id, worker).values(
+        heartbeat_at=func.now(), progress=ctx.progress, message=ctx.message)).rowcount
+    db.commit()
+    return bool(n)
+
+def succeed(db: Session, ctx: JobContext, worker: str) -> bool:
+    n = db.execute(_owned(ctx.id, worker).values(
+        status="succeeded", progress=1.0, message=ctx.message, error=None, finished_at=func.now(),
+        expires_at=func.now() + timedelta(seconds=settings.JOB_RESULT_TTL),
+        result_type=ctx.media_type, result_name=ctx.filename,
+        result_size=ctx.size if ctx.media_type is not None else None,
+    )).rowcount
+    if not n:
+        db.rollback()
+        return False
+    C = models.JobResultChunk
+    for seq, data in enumerate(ctx.chunks()):
+        db.execute(insert(C).values(job_id=ctx.id, seq=seq, user_id=ctx.user_id, data=data))
+    db.commit()
+    return True
+
+def result_chunks(job_id: int):
+    """The stored result of ``job_id``, one gzip slice per row."""
+    C = models.JobResultChunk
+    return select(C.data).where(C.job_id == job_id).order_by(C.seq)
+
+def fail(db: Session, ctx: JobContext, worker: str, error: str, retry: bool) -> str | None:
+    """Requeue with backoff if ``retry`` and attempts remain, else fail; returns the new status."""
+    J = models.Job
+    requeue = (J.attempts < J.max_attempts) if retry else literal(False)
+    backoff = timedelta(seconds=settings.JOB_RETRY_BACKOFF * 2 ** (ctx.attempt - 1))
+    status = db.execute(_owned(ctx.id, worker).values(
+        status=case((requeue, "queued"), else_="failed"),
+        run_after=func.now() + backoff, error=error[:2000], heartbeat_at=None,
+        finished_at=case((requeue, None), else_=func.now()),
+        expires_at=case((requeue, None), else_=func.now() + timedelta(seconds=settings.JOB_RESULT_TTL)),
+    ).returning(J.status)).scalar()
+    db.commit()
+    return status
+
+def reap(db: Session) -> int:
+    """Requeue (or fail, when out of attempts) running jobs whose worker stopped heartbeating."""
+    J = models.Job
+    retry = J.attempts < J.max_attempts
+    n = db.execute(
+        update(J).where(J.status == "running",
+                        J.heartbeat_at < func.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS))
+        .values(status=case((retry, "queued"), else_="failed"), run_after=func.now(),
+                error="worker stopped responding",
+                finished_at=case((retry, None), else_=func.now()),
+                expires_at=case((retry, None), else_=func.now() + timedelta(seconds=settings.JOB_RESULT_TTL)))
+    ).rowcount
+    db.commit()
+    return n
+
+def purge(db: Session) -> int:
+    """Delete finished jobs, and their results, past ``expires_at``."""
+    J = models.Job
+    n = db.execute(delete(J).where(J.expires_at < func.now())).rowcount
+    db.commit()
+    return n
+
+@handler("export")
+def export(db: Session, ctx: JobContext):
+    p = ExportParams.model_validate(ctx.params)
+    if p.month:
+        period = queries.Range.month(queries.parse_month(p.month), p.tz)
+    else:
+        period = queries.Range.between(p.date_from, p.date_to, p.tz)
+    filters = (p.category, p.q, p.match, p.min_amount, p.max_amount, period)
+    total = db.execute(select(func.count()).select_from(
+        queries.expense_rows(("id",), ctx.user_id, *filters))).scalar()
+
+    out = ctx.result("text/csv" if p.format == "csv" else "application/x-ndjson", f"expenses.{p.format}")
+    out.write(bulk.export_header(p.format).encode())
+    stmt = (bulk.export_statement(ctx.user_id, *filters)
+            .execution_options(yield_per=bulk.EXPORT_BATCH_ROWS))
+    done = 0
+    for rows in db.execute(stmt).partitions():
+        out.write(bulk.encode_rows(rows, p.format).encode())
+        done += len(rows)
+        ctx.report(done / total if total else 1.0, f"{done} of {total} rows")
+    ctx.report(1.0, f"{done} rows")
+
+@handler("yoy_report")
+def yoy_report(db: Session, ctx: JobContext):
+    """Monthly and per-category totals for a year next to the year before."""
+    p = ReportParams.model_validate(ctx.params)
+    year = p.year or queries.today(p.tz).year
+    cur = analytics.period_stats(db, ctx.user_id, date(year, 1, 1), date(year + 1, 1, 1), tz=p.tz)
+    ctx.report(0.5)
+    prev = analytics.period_stats(db, ctx.user_id, date(year - 1, 1, 1), date(year, 1, 1), tz=p.tz)
+
+    months, prev_months = ({d.month: t for d, t in s.series} for s in (cur, prev))
+    categories = list(cur.current.by_category) + [c for c in prev.current.by_category
+                                                  if c not in cur.current.by_category]
+
+    def row(total, previous, **key):
+        return {**key, "total": total, "previous_total": previous, "delta": total - previous,
+                "delta_pct": (total - previous) / previous * 100 if previous else None}
+
+    report = {
+        "year": year, "previous_year": year - 1, "tz": p.tz,
+        **row(cur.current.total, prev.current.total),
+        "count": cur.current.count, "previous_count": prev.current.count,
+        "months": [row(months.get(m, 0.0), prev_months.get(m, 0.0), month=f"{year}-{m:02d}")
+                   for m in range(1, 13)],
+        "by_category": [row(cur.current.by_category.get(c, (0.0, 0))[0],
+                            prev.current.by_category.get(c, (0.0, 0))[0], category=c)
+                        for c in categories],
+    }
+    ctx.result("application/json", f"report-{year}.json").write(serialize.dumps(report))
+
+@handler("rollup_rebuild")
+def rollup_rebuild(db: Session, ctx: JobContext):
+    rollups.rebuild(db, user_id=ctx.user_id)
+    db.commit()
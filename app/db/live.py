@@ -0,0 +1,247 @@
+"""Live summary deltas for ``/ws/expenses``: writers NOTIFY, every API process LISTENs.
+
+``publish`` runs inside the writing transaction (``rollups.apply_many`` calls
+it with the deltas the rollups get), so Postgres delivers the notification
+only when that transaction commits, to every process listening on
+``expenses``. The payload carries the transaction id, the user and the changes
+folded into 15-minute slots of ``created_at``. Every UTC offset is a multiple
+of 15 minutes, so each subscriber can bucket the slots into its own local days.
+Changes that don't fit in one notification are sent as a resync instead.
+
+Each API process has one LISTEN connection per shard (``listener``) and a
+``Hub`` of its websocket subscribers. A user's writes notify on their shard;
+moving a user to another shard sends a resync (``resync``). A subscriber remembers the Postgres snapshot its last
+full state was read in, and skips changes that snapshot already contains.
+Delivery is coalesced: changes that arrive while a client is being sent to are
+merged into its next message. A client that falls ``LIVE_QUEUE_SIZE`` changes
+behind gets a fresh snapshot instead of the backlog, so a slow reader costs
+bounded memory.
+"""
+import asyncio, logging
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import orjson
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core import metrics
+from app.core.settings import settings
+
+log = logging.getLogger("uvicorn.error")
+
+CHANNEL = "expenses"
+SLOT_SECONDS = 15 * 60
+MAX_PAYLOAD = 7900  # bytes; Postgres rejects NOTIFY payloads of 8000 or more
+
+CONNECTIONS = metrics.Gauge("live_connections", "Open /ws/expenses connections")
+MESSAGES = metrics.Counter("live_messages_total", "Messages sent to /ws/expenses clients by type")
+RESYNCS = metrics.Counter("live_resyncs_total",
+                          "Subscribers sent a fresh snapshot instead of deltas, by reason")
+
+def publish(db: Session, user_id: int, deltas) -> None:
+    """NOTIFY ``(created_at, category, amount, count)`` deltas; sent when the transaction commits."""
+    if not settings.LIVE_UPDATES:
+        return
+    slots: dict[tuple, list] = defaultdict(lambda: [0.0, 0])
+    for created_at, category, amount, count in deltas:
+        acc = slots[int(created_at.timestamp()) // SLOT_SECONDS, category]
+        acc[0] += amount
+        acc[1] += count
+    changes = [[s, c, t, n] for (s, c), (t, n) in slots.items() if t or n]
+    if not changes:
+        return
+    payload = orjson.dumps([user_id, changes])
+    if len(payload) > MAX_PAYLOAD:
+        payload = orjson.dumps([user_id, None])
+    db.execute(text("SELECT pg_notify(:c, pg_current_xact_id()::text || ' ' || :p)"),
+               {"c": CHANNEL, "p": payload.decode()})
+
+def resync(db: Session, user_id: int, reason: str) -> None:
+    """NOTIFY that ``user_id``'s subscribers need a fresh snapshot; sent when the transaction commits."""
+    db.execute(text("SELECT pg_notify(:c, pg_current_xact_id()::text || ' ' || :p)"),
+               {"c": CHANNEL, "p": orjson.dumps([user_id, None, reason]).decode()})
+
+@dataclass(frozen=True)
+class Snapshot:
+    """A ``pg_snapshot``: which transactions a read could see."""
+    xmin: int
+    xmax: int
+    xip: frozenset[int]
+
+    @classmethod
+    def parse(cls, s: str) -> "Snapshot":
+        xmin, xmax, xip = s.split(":")
+        return cls(int(xmin), int(xmax), frozenset(int(x) for x in xip.split(",") if x))
+
+    def sees(self, xid: int) -> bool:
+        return xid < self.xmin or (xid < self.xmax and xid not in self.xip)
+
+def current_snapshot(db: Session) -> Snapshot:
+    return Snapshot.parse(db.execute(text("SELECT pg_current_snapshot()::text")).scalar_one())
+
+class Subscriber:
+    def __init__(self, user_id: int, tz: str):
+        self.user_id, self.zone = user_id, ZoneInfo(tz)
+        self.snapshot: Snapshot | None = None
+        self.stale = True  # needs a full snapshot before any delta
+        self.wake = asyncio.Event()
+        self._events: deque = deque()
+
+    def push(self, xid: int, changes: list | None, reason: str = "too_large") -> None:
+        if self.stale:
+            return  # the snapshot it is about to read covers this
+        if changes is None or len(self._events) >= settings.LIVE_QUEUE_SIZE:
+            RESYNCS.inc(reason=reason if changes is None else "behind")
+            self._events.clear()
+            self.stale = True
+        else:
+            self._events.append((xid, changes))
+        self.wake.set()
+
+    def resync(self) -> None:
+        self._events.clear()
+        self.stale = True
+        self.wake.set()
+
+    def reset(self) -> None:
+        """Call right before reading the snapshot; everything queued so far is in it."""
+        self._events.clear()
+        self.stale = False
+        self.wake.clear()
+
+    def take(self) -> dict | None:
+        """Everything queued since the last call as one delta, None if the snapshot had it all."""
+        events, self._events = self._events, deque()
+        self.wake.clear()
+        total, count = 0.0, 0
+        by_category: dict[str, float] = defaultdict(float)
+        days: dict[str, float] = defaultdict(float)
+        for xid, changes in events:
+            if self.snapshot is not None and self.snapshot.sees(xid):
+                continue
+            for slot, category, amount, n in changes:
+                total += amount
+                count += n
+                by_category[category] += amount
+                days[datetime.fromtimestamp(slot * SLOT_SECONDS, self.zone).date().isoformat()] += amount
+        if not by_category:
+            return None
+        return {"type": "delta", "total_spent": total, "count": count, "by_category": dict(by_category),
+                "trend": [{"date": d, "total": t} for d, t in sorted(days.items())]}
+
+class Hub:
+    """This process's subscribers by user; ``dispatch`` fans a notification out to them."""
+    def __init__(self):
+        self._subs: dict[int, set[Subscriber]] = defaultdict(set)
+        self.count = 0
+
+    def refuse(self, user_id: int) -> str | None:
+        """Why a new connection for ``user_id`` is refused, None if it isn't."""
+        if self.count >= settings.LIVE_MAX_CONNECTIONS:
+            return "Too many live connections on this server"
+        if len(self._subs.get(user_id, ())) >= settings.LIVE_MAX_PER_USER:
+            return f"At most {settings.LIVE_MAX_PER_USER} live connections per user"
+        return None
+
+    def subscribe(self, user_id: int, tz: str) -> Subscriber:
+        sub = Subscriber(user_id, tz)
+        self._subs[user_id].add(sub)
+        self.count += 1
+        CONNECTIONS.set(self.count)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        subs = self._subs.get(sub.user_id)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subs[sub.user_id]
+        self.count -= 1
+        CONNECTIONS.set(self.count)
+
+    def dispatch(self, payload: str) -> None:
+        xid, _, body = payload.partition(" ")
+        user_id, changes, *reason = orjson.loads(body)
+        for sub in self._subs.get(user_id, ()):
+            sub.push(int(xid), changes, *reason)
+
+    def resync_all(self, reason: str) -> None:
+        for subs in self._subs.values():
+            for sub in subs:
+                RESYNCS.inc(reason=reason)
+                sub.resync()
+
+class Listener:
+    """The process's LISTEN connections, one per shard, read from the event loop; reconnect when lost."""
+    RETRY_MAX = 30.0
+
+    def __init__(self, hub: Hub):
+        self.hub = hub
+        self._tasks: list[asyncio.Task] = []
+
+    def _connect(self, engine):
+        raw = engine.raw_connection()
+        conn = raw.driver_connection
+        raw.detach()  # lives as long as the listener, never returned to the pool
+        conn.autocommit = True
+        conn.cursor().execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _read(self, conn, lost: asyncio.Future) -> None:
+        try:
+            conn.poll()
+        except Exception as e:
+            if not lost.done():
+                lost.set_result(e)
+            return
+        while conn.notifies:
+            n = conn.notifies.pop(0)
+            try:
+                self.hub.dispatch(n.payload)
+            except (ValueError, TypeError):
+                log.warning("live: ignoring malformed notification %r", n.payload[:100])
+
+    async def _run(self, shard) -> None:
+        loop = asyncio.get_running_loop()
+        delay = 1.0
+        while True:
+            try:
+                conn = await run_in_threadpool(self._connect, shard.engine)
+            except Exception as e:
+                log.warning("live: LISTEN connection to %s failed (%s); retrying in %.0f s", shard.name, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RETRY_MAX)
+                continue
+            delay = 1.0
+            # notifications sent while nobody was listening are gone
+            self.hub.resync_all("reconnect")
+            lost, fd = loop.create_future(), conn.fileno()
+            loop.add_reader(fd, self._read, conn, lost)
+            try:
+                log.warning("live: LISTEN connection to %s lost (%s); reconnecting", shard.name,
+                            str(await lost).strip())
+            finally:
+                loop.remove_reader(fd)
+                conn.close()
+
+    def start(self) -> None:
+        from app.db.shards import cluster
+        driver = cluster[0].engine.dialect.driver
+        if driver != "psycopg2":
+            log.warning("live: %s can't LISTEN from the event loop; /ws/expenses gets no deltas", driver)
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._run(shard)) for shard in cluster]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+hub = Hub()
+listener = Listener(hub)
@@ -0,0 +1,166 @@
+"""Monthly range partitions of ``expenses`` on ``created_at`` (UTC month bounds).
+
+``expenses_pYYYY_MM`` holds one month; ``expenses_default`` catches anything
+outside the existing partitions (back-dated imports, clock skew). ``ensure``
+creates the current month plus ``AHEAD_MONTHS`` ahead. It also creates a
+partition for every month that has rows in the default partition, and moves
+those rows into it. ``drop`` deletes old months for good: it drops their
+partitions and takes their rows out of the rollups in the same transaction.
+It never touches ``expenses_archive``; to keep old months queryable, use
+``app.db.archive`` instead.
+
+Run ``ensure`` from cron (daily is plenty):
+
+    python -m app.db.partitions ensure
+    python -m app.db.partitions drop --older-than 24            # months
+    python -m app.db.partitions list
+"""
+import argparse, re
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+TABLE = "expenses"
+DEFAULT_PARTITION = f"{TABLE}_default"
+ROLLUPS = (("expense_rollups_daily", "day"), ("expense_rollups_monthly", "month"))  # app.models
+AHEAD_MONTHS = 3
+# note_tsv is generated, so it is never copied
+COLUMNS = "id, user_id, category, amount, note, created_at, updated_at"
+
+_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+@dataclass
+class Partition:
+    name: str
+    month: date | None  # None for the default partition
+    bounds: str
+
+def add_months(d: date, n: int) -> date:
+    m = d.month - 1 + n
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month:%Y_%m}"
+
+def _bound(month: date) -> str:
+    return f"{month.isoformat()} 00:00:00+00"
+
+def is_partitioned(conn: Connection) -> bool:
+    return conn.execute(text(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {"t": TABLE}).scalar() or False
+
+def partitions(conn: Connection) -> list[Partition]:
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:t)
+        ORDER BY c.relname
+    """), {"t": TABLE}).all()
+    out = []
+    for name, bounds in rows:
+        m = _NAME.match(name)
+        out.append(Partition(name, date(int(m[1]), int(m[2]), 1) if m else None, bounds))
+    return out
+
+def create_month(conn: Connection, month: date) -> bool:
+    """Create the partition for ``month``, moving its rows out of the default partition."""
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar():
+        return False
+    lo, hi = _bound(month), _bound(add_months(month, 1))
+    has_default = conn.execute(text("SELECT to_regclass(:n)"), {"n": DEFAULT_PARTITION}).scalar()
+    if has_default:
+        # the new range can't be attached while the default partition holds rows in it
+        conn.execute(text(f"""
+            CREATE TEMP TABLE _moving AS SELECT {COLUMNS} FROM {DEFAULT_PARTITION}
+            WHERE created_at >= :lo AND created_at < :hi
+        """), {"lo": lo, "hi": hi})
+        conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :lo AND created_at < :hi"),
+                     {"lo": lo, "hi": hi})
+    conn.execute(text(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM ('{lo}') TO ('{hi}')"))
+    if has_default:
+        conn.execute(text(f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM _moving"))
+        conn.execute(text("DROP TABLE _moving"))
+    return True
+
+def ensure(conn: Connection, ahead: int = AHEAD_MONTHS, today: date | None = None) -> list[str]:
+    """Create the default partition, this month + ``ahead``, and any month found in the default."""
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+    this_month = (today or datetime.now(timezone.utc).date()).replace(day=1)
+    months = {add_months(this_month, n) for n in range(ahead + 1)}
+    months.update(r[0] for r in conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date FROM {DEFAULT_PARTITION}")))
+    return [partition_name(m) for m in sorted(months) if create_month(conn, m)]
+
+def _uncount(conn: Connection, p: Partition) -> None:
+    """Subtract the rows of ``p`` from the rollups, removing buckets left empty."""
+    lo, hi = p.month, add_months(p.month, 1)
+    for rollup, bucket in ROLLUPS:
+        conn.execute(text(f"""
+            UPDATE {rollup} r SET total = r.total - d.total, count = r.count - d.count
+            FROM (SELECT user_id, date_trunc('{bucket}', created_at AT TIME ZONE 'UTC')::date AS bucket,
+                         category, sum(amount) AS total, count(*) AS count
+                  FROM {p.name} GROUP BY 1, 2, 3) d
+            WHERE r.user_id = d.user_id AND r.{bucket} = d.bucket AND r.category = d.category
+        """))
+        conn.execute(text(f"DELETE FROM {rollup} WHERE {bucket} >= :lo AND {bucket} < :hi AND count <= 0"),
+                     {"lo": lo, "hi": hi})
+
+def drop(conn: Connection, before: date) -> list[str]:
+    """Drop every monthly partition that ends on or before ``before``, with its rollups.
+
+    Rows of those months still in the default partition get their partition
+    first (``ensure``), so nothing older than ``before`` is left behind.
+    """
+    ensure(conn, ahead=0)
+    done = []
+    for p in partitions(conn):
+        if p.month is None or add_months(p.month, 1) > before:
+            continue
+        # no writes may land between the rollup update and the drop
+        conn.execute(text(f"LOCK TABLE {p.name} IN EXCLUSIVE MODE"))
+        _uncount(conn, p)
+        conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {p.name}"))
+        conn.execute(text(f"DROP TABLE {p.name}"))
+        done.append(p.name)
+    return done
+
+def on_create(target, connection, **kw):
+    """``after_create`` hook so ``create_all`` yields a usable partitioned table."""
+    ensure(connection)
+
+def main(argv=None):
+    from app.db.session import require_database
+    from app.db.shards import cluster, sharded
+
+    parser = argparse.ArgumentParser(prog="python -m app.db.partitions")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="show partitions and their bounds")
+    en = sub.add_parser("ensure", help="create upcoming partitions and drain the default partition")
+    en.add_argument("--ahead", type=int, default=AHEAD_MONTHS, help="months to create ahead")
+    dr = sub.add_parser("drop", help="delete the partitions of old months and their rollups")
+    dr.add_argument("--older-than", type=int, required=True, metavar="MONTHS",
+                    help="drop months that ended more than this many months ago")
+    args = parser.parse_args(argv)
+
+    require_database()
+    for shard in cluster:
+        if sharded():
+            print(f"shard {shard.index} ({shard.name})")
+        with shard.engine.begin() as conn:
+            if not is_partitioned(conn):
+                raise SystemExit(f"{TABLE} is not partitioned; run `alembic upgrade head` first")
+            if args.cmd == "list":
+                for p in partitions(conn):
+                    print(f"{p.name:<24} {p.bounds}")
+            elif args.cmd == "ensure":
+                created = ensure(conn, args.ahead)
+                print("created " + (", ".join(created) if created else "nothing"))
+            else:
+                this_month = datetime.now(timezone.utc).date().replace(day=1)
+                done = drop(conn, add_months(this_month, -args.older_than))
+                print("dropped " + (", ".join(done) if done else "nothing"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Engine/pool configuration from ``Settings`` plus live pool instrumentation.
+
+Pools are labelled by ``pool_logging_name`` (e.g. ``sync``/``async``) in the
+``db_pool_*`` metrics exposed at ``/metrics``.
+"""
+import logging, time, uuid, weakref
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from app.core import metrics, timing
+from app.core.settings import settings
+
+log = logging.getLogger(__name__)
+
+_pools: "weakref.WeakSet[QueuePool]" = weakref.WeakSet()
+
+def _label(pool) -> str:
+    return pool._orig_logging_name or ("async" if isinstance(pool, AsyncAdaptedQueuePool) else "sync")
+
+def _sample(attr: str):
+    def fn():
+        out = {}
+        for p in list(_pools):
+            key = (("pool", _label(p)),)
+            out[key] = out.get(key, 0) + getattr(p, attr)()
+        return out
+    return fn
+
+POOL_CHECKED_OUT = metrics.Gauge("db_pool_checked_out", "Connections currently checked out",
+                                 fn=_sample("checkedout"))
+POOL_IDLE = metrics.Gauge("db_pool_idle", "Idle connections held by the pool",
+                          fn=_sample("checkedin"))
+POOL_OVERFLOW_IN_USE = metrics.Gauge("db_pool_overflow", "Overflow connections currently open",
+                                     fn=lambda: {k: max(v, 0) for k, v in _sample("overflow")().items()})
+POOL_WAIT = metrics.Histogram("db_pool_wait_seconds", "Time spent waiting to check out a connection")
+POOL_OVERFLOW_EVENTS = metrics.Counter("db_pool_overflow_total",
+                                       "Connections opened beyond pool_size")
+POOL_TIMEOUTS = metrics.Counter("db_pool_timeouts_total",
+                                "Checkouts that gave up after pool_timeout")
+
+class _InstrumentedMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _pools.add(self)
+
+    def _do_get(self):
+        label = _label(self)
+        overflow_before = self._overflow
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc(pool=label)
+            log.warning("db pool %s exhausted: size=%d overflow=%d checked_out=%d timeout=%.1fs",
+                        label, self.size(), self.overflow(), self.checkedout(), self._timeout)
+            raise
+        finally:
+            waited = time.perf_counter() - t0
+            POOL_WAIT.observe(waited, pool=label)
+            timing.record("pool", waited)
+        if self._overflow > overflow_before and self._overflow > 0:
+            POOL_OVERFLOW_EVENTS.inc(pool=label)
+        return conn
+
+class InstrumentedQueuePool(_InstrumentedMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedMixin, AsyncAdaptedQueuePool):
+    pass
+
+def engine_kwargs(is_async: bool, label: str) -> dict:
+    """Keyword arguments for ``create_engine``/``create_async_engine``."""
+    kw: dict = {"pool_logging_name": label}
+    connect_args: dict = {}
+
+    if settings.DB_PGBOUNCER:
+        # transaction-pooling PgBouncer owns pooling; prepared statements don't survive it
+        kw["poolclass"] = NullPool
+        if is_async:
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    else:
+        kw.update(
+            poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout}"
+
+    if connect_args:
+        kw["connect_args"] = connect_args
+    return kw
@@ -0,0 +1,166 @@
+"""Query building shared by the expense routes: date ranges and cached statements.
+
+Periods become half-open ``[start, end)`` ranges on the bare ``created_at``
+column (or a rollup's ``day``/``month``), never ``extract()`` or
+``date_trunc()`` of it, so they seek into the ``(user_id, ...)`` indexes and
+prune expense partitions. Calendar boundaries are local midnights in the
+request's ``tz`` (an IANA name), converted to UTC instants.
+
+Rollups are bucketed by UTC day, so analytics in any other zone aggregate
+``expenses`` directly and bucket with ``date_trunc`` in that zone.
+
+Ranges that start before the archive horizon read ``expenses_archive`` too
+(see ``app.db.archive``): ``expense_rows`` and the local statistics scan the
+``UNION ALL`` of both tables.
+
+Analytics statements have a fixed shape per variant, so ``stats_statement``
+builds each variant once with bind parameters. SQLAlchemy then reuses the
+statement, its cache key and its compiled form instead of rebuilding them per
+request. ``python -m benchmarks.explain`` checks the resulting plans.
+"""
+import functools
+from dataclasses import dataclass
+from datetime import date, datetime, time, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import Date, DateTime, bindparam, cast, func, literal, select, tuple_, union_all
+
+import app.models as models
+from app.db import archive
+from app.db.partitions import add_months
+from app.db.search import search_clause
+
+UTC = "UTC"
+
+def zone(tz: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"unknown time zone {tz!r}")
+
+def parse_month(month: str) -> date:
+    try:
+        return datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise ValueError("month must be YYYY-MM")
+
+def today(tz: str = UTC) -> date:
+    return datetime.now(zone(tz)).date()
+
+def midnight(d: date, tz: str = UTC) -> datetime:
+    """Start of the local day ``d`` in ``tz``, as a UTC instant."""
+    return datetime.combine(d, time(), zone(tz)).astimezone(timezone.utc)
+
+@dataclass(frozen=True)
+class Range:
+    """Half-open ``[start, end)`` of UTC instants; ``None`` leaves that side open."""
+    start: datetime | None = None
+    end: datetime | None = None
+
+    @classmethod
+    def days(cls, first: date | None, end: date | None, tz: str = UTC) -> "Range":
+        """Local days ``first`` up to (not including) ``end``."""
+        return cls(first and midnight(first, tz), end and midnight(end, tz))
+
+    @classmethod
+    def month(cls, month: date, tz: str = UTC) -> "Range":
+        return cls.days(month, add_months(month, 1), tz)
+
+    @classmethod
+    def year(cls, year: int, tz: str = UTC) -> "Range":
+        return cls.days(date(year, 1, 1), date(year + 1, 1, 1), tz)
+
+    @classmethod
+    def between(cls, start: datetime | None, end: datetime | None, tz: str = UTC) -> "Range":
+        """Explicit bounds; naive datetimes are local to ``tz``."""
+        def aware(dt):
+            if dt is not None and dt.tzinfo is None:
+                dt = dt.replace(tzinfo=zone(tz))
+            return dt
+        return cls(aware(start), aware(end))
+
+    def where(self, col=models.Expense.created_at) -> list:
+        crit = []
+        if self.start is not None:
+            crit.append(col >= self.start)
+        if self.end is not None:
+            crit.append(col < self.end)
+        return crit
+
+def expense_filters(user_id: int, category: str | None = None, q: str | None = None,
+                    match: str = "contains", min_amount: float | None = None,
+                    max_amount: float | None = None, period: Range = Range(),
+                    model=models.Expense) -> list:
+    """WHERE criteria for the list and export routes, on ``expenses`` or the archive."""
+    E = model
+    crit = [E.user_id == user_id]
+    if category:
+        crit.append(E.category == category)
+    if q:
+        crit.append(search_clause(q, match, E)[0])
+    if min_amount is not None:
+        crit.append(E.amount >= min_amount)
+    if max_amount is not None:
+        crit.append(E.amount <= max_amount)
+    return crit + period.where(E.created_at)
+
+def expense_rows(fields: tuple[str, ...], user_id: int, category: str | None = None,
+                 q: str | None = None, match: str = "contains", min_amount: float | None = None,
+                 max_amount: float | None = None, period: Range = Range(), rank: bool = False):
+    """Subquery of ``fields`` (and ``rank`` on ``q``) of the matching rows of both tiers.
+
+    Just ``expenses`` unless ``period`` reaches the archive. Postgres pushes
+    outer filters, ordering and limits into each branch of the ``UNION ALL``.
+    """
+    branches = []
+    for M in archive.tables(period.start):
+        cols = [getattr(M, f) for f in fields]
+        if rank:
+            cols.append(search_clause(q, match, M)[1].label("rank"))
+        branches.append(select(*cols).where(*expense_filters(
+            user_id, category, q, match, min_amount, max_amount, period, M)))
+    stmt = branches[0] if len(branches) == 1 else union_all(*branches)
+    return stmt.subquery("expenses")
+
+@functools.cache
+def stats_statement(granularity: str, local: bool, compare: bool, lower: bool, upper: bool,
+                    archived: bool = False):
+    """The ``GROUPING SETS`` statement behind ``analytics.period_stats``.
+
+    Binds ``user_id``, ``lower`` and ``end`` (when bounded), ``start`` (when
+    ``compare``) and ``tz`` (when ``local``). Rollup variants take dates; local
+    variants scan ``expenses`` (and the archive, when ``archived``) and take
+    UTC instants.
+    """
+    if local:
+        E = models.Expense
+        if archived:
+            A = models.ArchivedExpense
+            E = union_all(*(select(M.user_id, M.category, M.amount, M.created_at)
+                            for M in (E, A))).subquery("expenses").c
+        bucket = cast(func.date_trunc(granularity, func.timezone(bindparam("tz"), E.created_at)), Date)
+        key, user_col, type_ = E.created_at, E.user_id, DateTime(timezone=True)
+        cols = (E.category, bucket.label("bucket"), E.amount.label("total"), literal(1).label("count"))
+    else:
+        R = models.DailyRollup if granularity == "day" else models.MonthlyRollup
+        key = R.day if granularity == "day" else R.month
+        user_col, type_ = R.user_id, Date
+        cols = (R.category, key.label("bucket"), R.total, R.count)
+
+    cur = (key >= bindparam("start", type_=type_)) if compare else literal(True)
+    src = select(*cols, cur.label("cur")).where(user_col == bindparam("user_id"))
+    if lower:
+        src = src.where(key >= bindparam("lower", type_=type_))
+    if upper:
+        src = src.where(key < bindparam("end", type_=type_))
+    s = src.subquery()
+
+    return (
+        select(
+            s.c.cur, s.c.category, s.c.bucket,
+            func.sum(s.c.total).label("total"), func.sum(s.c.count).label("cnt"),
+            func.grouping(s.c.category).label("g_cat"), func.grouping(s.c.bucket).label("g_bucket"),
+        )
+        .group_by(func.grouping_sets(
+            tuple_(s.c.cur), tuple_(s.c.cur, s.c.category), tuple_(s.c.cur, s.c.bucket),
+        ))
+    )
@@ -0,0 +1,355 @@
+"""Moving users between shards while they use the API: ``python -m app.db.rebalance``.
+
+    python -m app.db.rebalance status
+    python -m app.db.rebalance move USER_ID SHARD
+    python -m app.db.rebalance rebalance [--tolerance 0.1] [--max-moves 50] [--dry-run]
+    python -m app.db.rebalance repair [USER_ID ...]
+
+A move (see app/db/shards.py for the fence it relies on):
+
+1. copy: the user's row, with ``resident`` off, then their rows in every
+   table with a ``user_id`` column, go to the target with binary COPY. The
+   user keeps writing on the source meanwhile.
+2. catch up: per row digests are compared on both sides. Rows that differ or
+   are missing are copied again and rows gone from the source are deleted,
+   until a round changes fewer than ``CATCH_UP_ROWS`` rows.
+3. freeze: on the source, take the user's fence lock exclusively. This waits
+   up to ``DB_SHARD_MOVE_TIMEOUT`` seconds for the user's open transactions;
+   new ones wait at the fence. Then catch up once more, clear ``resident``
+   and commit.
+4. switch: set ``resident`` on the target and point ``user_directory`` at
+   it. Transactions that waited at the fence fail it and are retried on the
+   target, and ``/ws/expenses`` subscribers reload their snapshot.
+5. clean up: delete the user from the source.
+
+Requests for the user only wait during 3 and 4. A move that fails before the
+freeze commits deletes its copy. A failure after that leaves the user resident
+on at most one shard, and ``repair`` finishes or undoes the move. Rows are
+compared by their columns' text, so both sides run with ``TimeZone`` UTC.
+
+``rebalance`` plans moves from the heaviest to the lightest shard open to new
+users (``DB_SHARD_NEW_USERS``), weighing users by their expense count in the
+monthly rollups, until every shard is within ``--tolerance`` of the mean.
+"""
+import argparse, logging, tempfile
+from sqlalchemy import exc, insert, literal_column, select, text, tuple_
+from sqlalchemy.engine import Connection
+
+from app.core.settings import settings
+from app.db import live
+from app.db.shards import LOCK_KEY, Shard, cluster, open_shards, sharded, user_tables
+
+log = logging.getLogger(__name__)
+
+MOVE_KEY = 0x6d6f7665  # session advisory lock on shard 0: one move or repair per user at a time
+CHUNK = 1000  # keys per DELETE / SELECT while catching up
+CATCH_UP_ROWS = 100  # catch-up rounds stop once one changes fewer rows than this
+CATCH_UP_ROUNDS = 5
+SPOOL_BYTES = 64 << 20  # COPY data spills to a temporary file beyond this
+
+USER_SQL = text("SELECT id, email, hashed_password FROM users WHERE id = :u")
+UPSERT_USER_SQL = text("""
+    INSERT INTO users (id, email, hashed_password, resident) VALUES (:id, :email, :hashed_password, false)
+    ON CONFLICT (id) DO UPDATE SET email = excluded.email, hashed_password = excluded.hashed_password
+""")
+
+class MoveError(RuntimeError):
+    pass
+
+def _connect(shard: Shard) -> Connection:
+    conn = shard.engine.connect()
+    conn.execute(text("SET TIME ZONE 'UTC'"))
+    conn.commit()
+    return conn
+
+def _columns(table) -> list:
+    return [c for c in table.c if c.computed is None]
+
+def _key(table) -> list:
+    return [c for c in table.primary_key.columns if c.name != "user_id"]
+
+def _copy_user(src: Connection, dst: Connection, user_id: int) -> None:
+    row = src.execute(USER_SQL, {"u": user_id}).mappings().one_or_none()
+    if row is None:
+        raise MoveError(f"user {user_id} is not on the source shard")
+    dst.execute(UPSERT_USER_SQL, dict(row))
+
+def _bulk_copy(src: Connection, dst: Connection, table, user_id: int) -> None:
+    cols = ", ".join(c.name for c in _columns(table))
+    with tempfile.SpooledTemporaryFile(SPOOL_BYTES) as buf:
+        cur = src.connection.cursor()
+        try:
+            cur.copy_expert(f"COPY (SELECT {cols} FROM {table.name} WHERE user_id = {int(user_id)}) "
+                            "TO STDOUT (FORMAT binary)", buf)
+        finally:
+            cur.close()
+        buf.seek(0)
+        cur = dst.connection.cursor()
+        try:
+            cur.copy_expert(f"COPY {table.name} ({cols}) FROM STDIN (FORMAT binary)", buf)
+        finally:
+            cur.close()
+
+def _digests(conn: Connection, table, user_id: int) -> dict:
+    key = _key(table)
+    digest = literal_column("md5(row({})::text)".format(", ".join(c.name for c in _columns(table))))
+    rows = conn.execute(select(*key, digest).select_from(table).where(table.c.user_id == user_id))
+    return {tuple(r[:-1]): r[-1] for r in rows}
+
+def _sync(src: Connection, dst: Connection, table, user_id: int) -> int:
+    """Make ``dst``'s rows of ``user_id`` in ``table`` match ``src``'s; returns rows changed."""
+    theirs, ours = _digests(src, table, user_id), _digests(dst, table, user_id)
+    stale = [k for k, d in ours.items() if theirs.get(k) != d]
+    missing = [k for k, d in theirs.items() if ours.get(k) != d]
+    key, cols = tuple_(*_key(table)), _columns(table)
+    for i in range(0, len(stale), CHUNK):
+        dst.execute(table.delete().where(table.c.user_id == user_id, key.in_(stale[i:i + CHUNK])))
+    for i in range(0, len(missing), CHUNK):
+        rows = src.execute(select(*cols).where(table.c.user_id == user_id, key.in_(missing[i:i + CHUNK])))
+        dst.execute(insert(table), [dict(r._mapping) for r in rows])
+    return len(stale) + len(missing)
+
+def _delete_user(conn: Connection, user_id: int) -> None:
+    # every per-user table cascades from users
+    conn.execute(text("DELETE FROM users WHERE id = :u"), {"u": user_id})
+
+def _locked(directory: Connection, user_id: int) -> None:
+    if not directory.execute(text("SELECT pg_try_advisory_lock(:k, :u)"), {"k": MOVE_KEY, "u": user_id}).scalar():
+        raise MoveError(f"user {user_id} is already being moved or repaired")
+    directory.commit()
+
+def _unlock(directory: Connection, user_id: int) -> None:
+    directory.rollback()
+    directory.execute(text("SELECT pg_advisory_unlock(:k, :u)"), {"k": MOVE_KEY, "u": user_id})
+    directory.commit()
+
+def _point(directory: Connection, user_id: int, shard: int) -> None:
+    directory.execute(text("UPDATE user_directory SET shard = :s WHERE id = :u"), {"s": shard, "u": user_id})
+    live.resync(directory, user_id, "moved")
+    directory.commit()
+
+def _settle(directory: Connection, conns: list[Connection], user_id: int) -> int | None:
+    """Leave ``user_id`` resident on exactly one shard, the directory's; returns it (None: no user).
+
+    A resident copy wins. With none, the shard the directory names keeps its
+    copy; that is where the user was before an interrupted move.
+    """
+    home = directory.execute(text("SELECT shard FROM user_directory WHERE id = :u"), {"u": user_id}).scalar()
+    present = {}
+    for n, conn in enumerate(conns):
+        resident = conn.execute(text("SELECT resident FROM users WHERE id = :u"), {"u": user_id}).scalar()
+        conn.commit()
+        if resident is not None:
+            present[n] = resident
+    residents = [n for n, r in present.items() if r]
+    if len(residents) > 1:
+        raise MoveError(f"user {user_id} is resident on shards {residents}; delete all but one copy by hand")
+    keep = residents[0] if residents else home if home in present else None
+    if keep is None:
+        if present:
+            raise MoveError(f"user {user_id} is on shards {sorted(present)}, none of them resident "
+                            f"nor the directory's ({home})")
+        return None
+    if not present[keep]:
+        conns[keep].execute(text("UPDATE users SET resident = true WHERE id = :u"), {"u": user_id})
+        conns[keep].commit()
+    if home != keep:
+        _point(directory, user_id, keep)
+    for n in present:
+        if n != keep:
+            _delete_user(conns[n], user_id)
+            conns[n].commit()
+    return keep
+
+def _move(directory: Connection, conns: list[Connection], user_id: int, to: int) -> int:
+    """Steps 1-5 of the module docstring; returns how many rows were copied or fixed up."""
+    frm = _settle(directory, conns, user_id)
+    if frm is None:
+        raise MoveError(f"no user {user_id}")
+    if frm == to:
+        return 0
+    src, dst, tables = conns[frm], conns[to], user_tables()
+    frozen = False
+    try:
+        _copy_user(src, dst, user_id)
+        for t in tables:
+            _bulk_copy(src, dst, t, user_id)
+        src.commit()
+        dst.commit()
+        changed = 0
+        for _ in range(CATCH_UP_ROUNDS):
+            n = sum(_sync(src, dst, t, user_id) for t in tables)
+            src.commit()
+            dst.commit()
+            changed += n
+            if n < CATCH_UP_ROWS:
+                break
+
+        src.execute(text(f"SET LOCAL lock_timeout = '{int(settings.DB_SHARD_MOVE_TIMEOUT * 1000)}ms'"))
+        try:
+            src.execute(text("SELECT pg_advisory_xact_lock(:k, :u)"), {"k": LOCK_KEY, "u": user_id})
+        except exc.OperationalError as e:
+            if getattr(e.orig, "pgcode", None) != "55P03":  # lock_not_available
+                raise
+            raise MoveError(f"user {user_id} kept a transaction open for over DB_SHARD_MOVE_TIMEOUT "
+                            f"({settings.DB_SHARD_MOVE_TIMEOUT} s); try again")
+        if not src.execute(text("SELECT resident FROM users WHERE id = :u FOR UPDATE"), {"u": user_id}).scalar():
+            raise MoveError(f"user {user_id} stopped being resident on shard {frm} mid-move")
+        _copy_user(src, dst, user_id)
+        changed += sum(_sync(src, dst, t, user_id) for t in tables)
+        dst.commit()
+        src.execute(text("UPDATE users SET resident = false WHERE id = :u"), {"u": user_id})
+        src.commit()
+        frozen = True
+    finally:
+        if not frozen:
+            src.rollback()
+            dst.rollback()
+            _delete_user(dst, user_id)
+            dst.commit()
+
+    dst.execute(text("UPDATE users SET resident = true WHERE id = :u"), {"u": user_id})
+    dst.commit()
+    _point(directory, user_id, to)
+    _delete_user(src, user_id)
+    src.commit()
+    return changed
+
+def _with_conns(fn, user_id: int, *args):
+    """Run ``fn(directory, conns, user_id, *args)`` holding ``user_id``'s move lock."""
+    conns = [_connect(s) for s in cluster]
+    directory = cluster[0].engine.connect()
+    try:
+        _locked(directory, user_id)
+        try:
+            return fn(directory, conns, user_id, *args)
+        finally:
+            _unlock(directory, user_id)
+    finally:
+        directory.close()
+        for conn in conns:
+            conn.close()
+
+def move(user_id: int, to: int) -> int:
+    """Move ``user_id`` to shard ``to`` online; returns rows caught up after the bulk copy."""
+    if not 0 <= to < len(cluster):
+        raise MoveError(f"no shard {to}; there are {len(cluster)}")
+    return _with_conns(_move, user_id, to)
+
+def repair(user_id: int) -> int | None:
+    """Finish or undo an interrupted move of ``user_id``; returns its home shard."""
+    return _with_conns(_settle, user_id)
+
+def unsettled() -> list[int]:
+    """Users with a non-resident row on some shard: moving now, or interrupted."""
+    ids = set()
+    for shard in cluster:
+        with shard.engine.connect() as conn:
+            ids.update(conn.execute(text("SELECT id FROM users WHERE NOT resident")).scalars())
+    return sorted(ids)
+
+def weights(shard: Shard) -> dict[int, int]:
+    """Resident users on ``shard`` and their expense counts."""
+    with shard.engine.connect() as conn:
+        return dict(conn.execute(text("""
+            SELECT u.id, coalesce(sum(m.count), 0)::bigint
+            FROM users u LEFT JOIN expense_rollups_monthly m ON m.user_id = u.id
+            WHERE u.resident GROUP BY u.id
+        """)).all())
+
+def plan(loads: dict[int, dict[int, int]], targets: list[int], tolerance: float, max_moves: int) -> list[tuple]:
+    """``(user_id, from, to)`` moves that even out the shards' total weights.
+
+    Greedy: move from the heaviest shard to the lightest target the user whose
+    weight is closest to half the gap, as long as that narrows it.
+    """
+    users = {n: dict(w) for n, w in loads.items()}
+    totals = {n: sum(w.values()) for n, w in users.items()}
+    mean = sum(totals.values()) / len(totals)
+    moves = []
+    while len(moves) < max_moves:
+        heavy = max(totals, key=totals.get)
+        light = min((n for n in targets if n != heavy), key=totals.get, default=None)
+        if light is None or totals[heavy] - mean <= tolerance * mean:
+            break
+        gap = totals[heavy] - totals[light]
+        pick = min(((u, w) for u, w in users[heavy].items() if 0 < w < gap),
+                   key=lambda uw: abs(gap - 2 * uw[1]), default=None)
+        if pick is None:
+            break
+        user_id, w = pick
+        del users[heavy][user_id]
+        users[light][user_id] = w
+        totals[heavy] -= w
+        totals[light] += w
+        moves.append((user_id, heavy, light))
+    return moves
+
+def status() -> None:
+    placing = {s.index for s in open_shards()}
+    print(f"{'shard':>5} {'users':>9} {'expenses':>12} {'size':>10}  new users  name")
+    for shard in cluster:
+        with shard.engine.connect() as conn:
+            users, expenses, size = conn.execute(text("""
+                SELECT (SELECT count(*) FROM users WHERE resident),
+                       (SELECT coalesce(sum(count), 0) FROM expense_rollups_monthly m
+                        WHERE m.user_id IN (SELECT id FROM users WHERE resident)),
+                       pg_size_pretty(pg_database_size(current_database()))
+            """)).one()
+        print(f"{shard.index:>5} {users:>9} {expenses:>12} {size:>10}  "
+              f"{'yes' if shard.index in placing else 'no':<9}  {shard.name}")
+    if pending := unsettled():
+        print(f"unsettled (moving, or run repair): {', '.join(map(str, pending))}")
+
+def main(argv=None):
+    from app.db.session import require_database
+
+    parser = argparse.ArgumentParser(prog="python -m app.db.rebalance")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="users, expenses and size per shard")
+    mv = sub.add_parser("move", help="move one user to another shard")
+    mv.add_argument("user_id", type=int)
+    mv.add_argument("shard", type=int)
+    rb = sub.add_parser("rebalance", help="move users until the shards are even")
+    rb.add_argument("--tolerance", type=float, default=0.1, help="allowed excess over the mean load")
+    rb.add_argument("--max-moves", type=int, default=50)
+    rb.add_argument("--dry-run", action="store_true", help="print the plan only")
+    rp = sub.add_parser("repair", help="settle users left between shards by an interrupted move")
+    rp.add_argument("user_ids", type=int, nargs="*", help="default: every unsettled user")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    require_database()
+    if args.cmd == "status":
+        return status()
+    if not sharded():
+        raise SystemExit("only one shard; set DB_SHARD_URLS")
+    try:
+        if args.cmd == "move":
+            changed = move(args.user_id, args.shard)
+            print(f"moved user {args.user_id} to shard {args.shard} ({changed} rows caught up)")
+        elif args.cmd == "repair":
+            for user_id in args.user_ids or unsettled():
+                try:
+                    home = repair(user_id)
+                except MoveError as e:
+                    print(f"user {user_id}: {e}")
+                    continue
+                print(f"user {user_id}: " + (f"on shard {home}" if home is not None else "not found"))
+        else:
+            loads = {s.index: weights(s) for s in cluster}
+            moves = plan(loads, [s.index for s in open_shards()], args.tolerance, args.max_moves)
+            for user_id, frm, to in moves:
+                w = loads[frm][user_id]
+                if args.dry_run:
+                    print(f"would move user {user_id} ({w} expenses) from shard {frm} to {to}")
+                    continue
+                move(user_id, to)
+                print(f"moved user {user_id} ({w} expenses) from shard {frm} to {to}")
+            if not moves:
+                print("shards are within tolerance")
+    except MoveError as e:
+        raise SystemExit(str(e))
+
+if __name__ == "__main__":
+    main()
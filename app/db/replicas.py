@@ -0,0 +1,268 @@
+"""Read replicas: health and lag tracking, and routing for read-only endpoints.
+
+``DB_REPLICA_URLS`` lists hot standbys. A daemon thread polls each one every
+``DB_REPLICA_CHECK_INTERVAL`` seconds for its replay lag. List, export and
+analytics routes depend on ``get_read_db`` instead of ``get_db``. Their session
+is a ``RoutingSession``: SELECTs go to the chosen replica, and a write (or a
+``FOR UPDATE``) pins the session to the primary from then on.
+
+A request stays on the primary when:
+- no replica is up, recently checked and within ``DB_REPLICA_MAX_LAG``;
+- no such replica had replayed the WAL position of the user's last write
+  (``write_lsn``, kept by ``cache.bump_version``) at its last check, so users
+  always read their own writes. Those marks must be shared by every worker,
+  so replicas require ``RESPONSE_CACHE_BACKEND=redis``.
+
+If the replica connection fails mid-request, the work is retried once on the
+primary. The replica is then marked down until its next good check.
+
+Replicas are for a single primary: with user shards (``app.db.shards``) reads
+go to the user's shard instead.
+"""
+import itertools, logging, threading, time
+from dataclasses import dataclass
+from fastapi import Depends
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+
+from app.core import cache, metrics
+from app.core.security import get_current_user_id
+from app.core.settings import settings
+from app.db.instrument import instrument
+from app.db.pool import engine_kwargs
+from app.db.session import DB_ASYNC, Database, async_engine, async_url, engine, prewarm
+from app.db.shards import ShardDatabase, ShardSession, cluster, describe
+
+log = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 3  # seconds; a dead replica must not stall requests or probes
+# replay lag in seconds; 0 when everything received has been replayed (an idle primary
+# sends nothing, so the last replayed commit can be old without the replica being behind).
+# Lag only gates staleness; read-your-writes compares WAL positions.
+LAG_SQL = text("""
+    SELECT pg_is_in_recovery(),
+           CASE WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() <= pg_last_wal_replay_lsn() THEN 0
+                ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END,
+           pg_last_wal_replay_lsn() - '0/0'
+""")
+# on the primary, after a commit: at or past the end of that commit's WAL record
+WRITE_LSN_SQL = text("SELECT pg_current_wal_lsn() - '0/0'")
+
+READ_ROUTING = metrics.Counter("db_read_routing_total",
+                               "Read-route sessions by target (replica, primary) and reason")
+
+@dataclass(eq=False)
+class Replica:
+    name: str
+    engine: Engine
+    async_engine: AsyncEngine | None = None
+    healthy: bool = False
+    lag: float | None = None
+    checked_at: float = 0.0
+    # WAL position the replica had replayed at its last good check; replay only moves forward
+    replayed_lsn: int = 0
+
+    def check(self):
+        started = time.time()
+        try:
+            with self.engine.connect() as conn:
+                in_recovery, lag, replayed = conn.execute(LAG_SQL).one()
+        except exc.DBAPIError as e:
+            self.mark_down(e)
+            return
+        if not in_recovery:
+            if self.healthy or not self.checked_at:
+                log.warning("replica %s is not in recovery (not a standby); not routing to it", self.name)
+            self.healthy, self.lag, self.checked_at = False, None, started
+            return
+        if not self.healthy:
+            log.info("replica %s is up (lag %s s)", self.name, lag)
+        self.lag = None if lag is None else float(lag)
+        self.replayed_lsn = int(replayed or 0)
+        self.checked_at = started
+        self.healthy = True
+
+    def mark_down(self, error: Exception):
+        if self.healthy or not self.checked_at:
+            log.warning("replica %s is down: %s", self.name, str(error).strip().splitlines()[0])
+        self.healthy, self.lag, self.checked_at = False, None, time.time()
+
+    def usable(self, now: float) -> bool:
+        stale_after = 3 * settings.DB_REPLICA_CHECK_INTERVAL + CONNECT_TIMEOUT
+        return (self.healthy and self.lag is not None and self.lag <= settings.DB_REPLICA_MAX_LAG
+                and now - self.checked_at <= stale_after)
+
+class ReplicaSet:
+    def __init__(self, urls: list[str]):
+        self.replicas = []
+        for n, url in enumerate(urls):
+            kw = engine_kwargs(is_async=False, label=f"replica{n}")
+            kw.setdefault("connect_args", {})["connect_timeout"] = CONNECT_TIMEOUT
+            r = Replica(describe(url), create_engine(url, **kw))
+            instrument(r.engine)
+            if DB_ASYNC:
+                kw = engine_kwargs(is_async=True, label=f"replica{n}-async")
+                kw.setdefault("connect_args", {})["timeout"] = CONNECT_TIMEOUT
+                r.async_engine = create_async_engine(async_url(url), **kw)
+                instrument(r.async_engine.sync_engine)
+            self.replicas.append(r)
+        self._rr = itertools.count()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the probe thread; idempotent."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._probe, name="replica-probe", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    async def prewarm(self, n: int):
+        """Open pooled connections on each replica; an unreachable one is marked down, not fatal."""
+        for r in self.replicas:
+            try:
+                await prewarm(n, r.async_engine or r.engine)
+            except (exc.DBAPIError, OSError) as e:
+                r.mark_down(e)
+
+    def _probe(self):
+        while not self._stop.is_set():
+            for r in self.replicas:
+                r.check()
+            self._stop.wait(settings.DB_REPLICA_CHECK_INTERVAL)
+
+    def choose(self, write_lsn: int) -> tuple[Replica | None, str]:
+        """A replica that is usable and has replayed ``write_lsn``, round-robin."""
+        now = time.time()
+        up = [r for r in self.replicas if r.usable(now)]
+        if not up:
+            return None, "unavailable"
+        caught_up = [r for r in up if r.replayed_lsn >= write_lsn]
+        if not caught_up:
+            return None, "recent_write"
+        return caught_up[next(self._rr) % len(caught_up)], "replica"
+
+urls = [u.strip() for u in settings.DB_REPLICA_URLS.split(",") if u.strip()]
+replicas = ReplicaSet(urls) if urls else None
+
+def require_shared_cache():
+    """Checked at startup: write marks in a per-process cache would miss other workers' writes."""
+    if replicas is not None and settings.RESPONSE_CACHE_BACKEND != "redis":
+        raise RuntimeError("DB_REPLICA_URLS requires RESPONSE_CACHE_BACKEND=redis "
+                           "so that every worker sees every user's last write")
+
+async def write_lsn(db: Database) -> int:
+    """The primary's WAL position after ``db``'s commit, for ``cache.bump_version``; 0 if unused."""
+    if replicas is None or len(cluster) != 1:
+        return 0
+    return int((await db.all(WRITE_LSN_SQL))[0][0])
+
+def _replica_gauge(value):
+    def fn():
+        return {(("replica", r.name),): value(r) for r in (replicas.replicas if replicas else ())}
+    return fn
+
+REPLICA_UP = metrics.Gauge("db_replica_up", "1 if the replica is usable for reads",
+                           fn=_replica_gauge(lambda r: int(r.usable(time.time()))))
+REPLICA_LAG = metrics.Gauge("db_replica_lag_seconds", "Replay lag at the last probe (-1 if unknown)",
+                            fn=_replica_gauge(lambda r: -1 if r.lag is None else r.lag))
+
+class RoutingSession(ShardSession):
+    """Sends SELECTs to ``info["replica"]``; anything that writes or locks pins it to the primary."""
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None:
+            if not (self._flushing or isinstance(clause, UpdateBase)
+                    or getattr(clause, "_for_update_arg", None) is not None):
+                return replica
+            self.info["replica"] = None
+        return super().get_bind(mapper, clause=clause, **kw)
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autoflush=False, bind=engine, future=True)
+AsyncReadSessionLocal = (
+    async_sessionmaker(async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False)
+    if DB_ASYNC else None
+)
+
+def _sqlstate(e: exc.DBAPIError) -> str | None:
+    return getattr(e.orig, "pgcode", None) or getattr(e.orig, "sqlstate", None)
+
+class ReadDatabase(ShardDatabase):
+    """``ShardDatabase`` on a routing session that retries on the primary if the replica fails."""
+    def __init__(self, session, replica: Replica | None, **kw):
+        super().__init__(session, **kw)
+        self.replica = replica
+
+    async def _fail_over(self, e: exc.DBAPIError) -> bool:
+        if self.replica is None or self.session.info.get("replica") is None:
+            return False
+        code = _sqlstate(e)
+        if code == "57014":
+            return False  # statement_timeout; the primary would be no faster
+        if code is None or e.connection_invalidated:
+            self.replica.mark_down(e)
+        # otherwise a query error such as a recovery conflict (40001): the replica stays up
+        READ_ROUTING.inc(target="primary", reason="replica_error")
+        self.replica = None
+        await self.rollback()
+        self.session.info["replica"] = None
+        return True
+
+    async def run(self, fn, *args, **kwargs):
+        try:
+            return await super().run(fn, *args, **kwargs)
+        except (exc.OperationalError, exc.InterfaceError) as e:
+            if not await self._fail_over(e):
+                raise
+        return await super().run(fn, *args, **kwargs)
+
+    async def all(self, stmt) -> list:
+        try:
+            return await super().all(stmt)
+        except (exc.OperationalError, exc.InterfaceError) as e:
+            if not await self._fail_over(e):
+                raise
+        return await super().all(stmt)
+
+    async def stream(self, stmt, batch_rows: int):
+        started = False
+        try:
+            async for rows in super().stream(stmt, batch_rows):
+                started = True
+                yield rows
+            return
+        except (exc.OperationalError, exc.InterfaceError) as e:
+            # rows already sent can't be taken back
+            if started or not await self._fail_over(e):
+                raise
+        async for rows in super().stream(stmt, batch_rows):
+            yield rows
+
+async def get_read_db(user_id: int = Depends(get_current_user_id)):
+    """Like ``get_db``, but reads go to a replica when one is fresh enough for this user."""
+    replica, reason = None, "no_replicas"
+    if replicas is not None and len(cluster) == 1:
+        replicas.start()
+        replica, reason = replicas.choose(await cache.write_lsn(user_id))
+    READ_ROUTING.inc(target="replica" if replica else "primary", reason=reason)
+
+    if replica is None:
+        bind = None
+    elif DB_ASYNC:
+        bind = replica.async_engine.sync_engine
+    else:
+        bind = replica.engine
+    factory = AsyncReadSessionLocal if DB_ASYNC else ReadSessionLocal
+    db = ReadDatabase(factory(info={"replica": bind}), replica, user_id=user_id)
+    try:
+        yield db
+    finally:
+        await db.close()
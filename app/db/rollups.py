@@ -0,0 +1,100 @@
+"""Per-user daily/monthly expense rollups.
+
+Rows are bucketed by the UTC day/month of ``created_at`` and kept in sync by the
+expense write handlers inside their own transaction. ``python -m app.db.rollups
+rebuild`` recomputes them from the raw ``expenses`` and ``expenses_archive``
+tables.
+"""
+import argparse
+from datetime import datetime, timezone
+from sqlalchemy import Date, cast, delete, func, select, union_all, insert as sa_insert
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+import app.models as models
+from app.db import live
+
+def _buckets(created_at: datetime):
+    day = created_at.astimezone(timezone.utc).date()
+    return day, day.replace(day=1)
+
+# keeps multi-row upserts well under the driver's bind-parameter limit; rows go in
+# key order so concurrent writers lock rollup rows in the same sequence
+UPSERT_BATCH = 1000
+
+def _upsert_many(db: Session, model, bucket_col: str, user_id: int, acc: dict) -> None:
+    rows = [{"user_id": user_id, bucket_col: bucket, "category": category, "total": total, "count": count}
+            for (bucket, category), (total, count) in sorted(acc.items()) if count or total]
+    for start in range(0, len(rows), UPSERT_BATCH):
+        stmt = insert(model).values(rows[start:start + UPSERT_BATCH])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.user_id, getattr(model, bucket_col), model.category],
+            set_={"total": model.total + stmt.excluded.total,
+                  "count": model.count + stmt.excluded.count},
+        )
+        db.execute(stmt)
+    if any(r["count"] < 0 for r in rows):
+        db.execute(delete(model).where(model.user_id == user_id, model.count <= 0))
+
+def apply_many(db: Session, user_id: int, deltas) -> None:
+    """Fold (created_at, category, amount, count) deltas into one upsert per rollup table.
+
+    Removals are negative deltas; buckets that drop to zero rows are deleted.
+    The same deltas go to /ws/expenses subscribers when the transaction commits.
+    """
+    deltas = list(deltas)
+    daily, monthly = {}, {}
+    for created_at, category, amount, count in deltas:
+        day, month = _buckets(created_at)
+        for acc, key in ((daily, (day, category)), (monthly, (month, category))):
+            total, n = acc.get(key, (0.0, 0))
+            acc[key] = (total + amount, n + count)
+    _upsert_many(db, models.DailyRollup, "day", user_id, daily)
+    _upsert_many(db, models.MonthlyRollup, "month", user_id, monthly)
+    live.publish(db, user_id, deltas)
+
+def add_many(db: Session, user_id: int, rows) -> None:
+    """Add (created_at, category, amount) tuples of newly inserted expenses."""
+    apply_many(db, user_id, ((created_at, category, amount, 1) for created_at, category, amount in rows))
+
+def rebuild(db: Session, user_id: int | None = None) -> None:
+    branches = [select(M.user_id, M.category, M.amount, M.created_at) for M in
+                (models.Expense, models.ArchivedExpense)]
+    if user_id is not None:
+        branches = [b.where(b.selected_columns.user_id == user_id) for b in branches]
+    E = union_all(*branches).subquery("expenses").c
+    utc_ts = func.timezone("UTC", E.created_at)
+    buckets = [
+        (models.DailyRollup, "day", cast(func.date_trunc("day", utc_ts), Date)),
+        (models.MonthlyRollup, "month", cast(func.date_trunc("month", utc_ts), Date)),
+    ]
+    for model, bucket_col, bucket_expr in buckets:
+        wipe = delete(model)
+        src = select(E.user_id, bucket_expr, E.category, func.sum(E.amount), func.count())
+        if user_id is not None:
+            wipe = wipe.where(model.user_id == user_id)
+        src = src.group_by(E.user_id, bucket_expr, E.category)
+        db.execute(wipe)
+        db.execute(sa_insert(model).from_select(
+            ["user_id", bucket_col, "category", "total", "count"], src
+        ))
+
+def main(argv=None):
+    from app.db.session import require_database
+    from app.db.shards import cluster
+
+    parser = argparse.ArgumentParser(prog="python -m app.db.rollups")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="recompute rollups from the expenses and archive tables")
+    rb.add_argument("--user-id", type=int, default=None, help="only rebuild this user")
+    args = parser.parse_args(argv)
+
+    require_database()
+    for shard in cluster:
+        with shard.session() as db:
+            rebuild(db, user_id=args.user_id)
+            db.commit()
+    print("rollups rebuilt" + (f" for user {args.user_id}" if args.user_id else ""))
+
+if __name__ == "__main__":
+    main()
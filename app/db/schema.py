@@ -0,0 +1,129 @@
+"""Startup schema handling, deferring to Alembic.
+
+``DB_SCHEMA`` picks what the app does at startup:
+
+- ``check`` (default): refuse to start unless the database is at Alembic's head.
+- ``upgrade``: run ``alembic upgrade head``.
+- ``create``: ``create_all`` into an empty database, then stamp head so that
+  Alembic owns the schema from then on. For scratch and benchmark databases.
+- ``off``: do nothing.
+
+DDL runs under a Postgres advisory lock, so workers starting together
+serialize instead of racing. ``python -m app --preload`` does this once in the
+launcher and starts its workers with ``DB_SCHEMA=off``.
+
+Every mode applies to each user shard in turn (``app.db.shards``). With more
+than one shard, ``upgrade`` and ``create`` also set up the id sequences to
+stride, and ``check`` requires that they do.
+
+    python -m app.db.schema check|upgrade|create
+"""
+import logging, sys
+from pathlib import Path
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from app.core.settings import settings
+
+log = logging.getLogger(__name__)
+
+ALEMBIC_DIR = Path(__file__).resolve().parents[2] / "alembic"
+LOCK_KEY = 0x65787073  # pg_advisory_lock key shared by every process migrating this schema
+MODES = ("check", "upgrade", "create", "off")
+
+class SchemaError(RuntimeError):
+    pass
+
+def _config(conn: Connection | None = None):
+    from alembic.config import Config
+    # no alembic.ini: env.py would reset the server's logging through fileConfig
+    cfg = Config()
+    cfg.set_main_option("script_location", str(ALEMBIC_DIR))
+    cfg.attributes["connection"] = conn  # env.py migrates this connection's database
+    return cfg
+
+def head_revision() -> str:
+    from alembic.script import ScriptDirectory
+    return ScriptDirectory.from_config(_config()).get_current_head()
+
+def current_revision(conn: Connection) -> str | None:
+    from alembic.migration import MigrationContext
+    return MigrationContext.configure(conn).get_current_revision()
+
+def check(conn: Connection) -> str:
+    current, head = current_revision(conn), head_revision()
+    if current == head:
+        return current
+    if current is None and inspect(conn).has_table("expenses"):
+        raise SchemaError("tables exist but are not managed by Alembic; "
+                          "`alembic stamp <revision>` to the revision they match, then `alembic upgrade head`")
+    raise SchemaError(f"database is at revision {current or 'none'}, code expects {head}; "
+                      "run `alembic upgrade head` (or start with DB_SCHEMA=upgrade)")
+
+def _create(conn: Connection):
+    import app.models as models  # noqa: F401  (registers the tables)
+    from app.db.session import Base
+    from alembic import command
+
+    if inspect(conn).has_table("expenses"):
+        if current_revision(conn) is None:
+            log.warning("schema exists without an Alembic revision; not stamping it")
+        return
+    Base.metadata.create_all(conn)
+    conn.commit()
+    command.stamp(_config(conn), "head")
+    conn.commit()
+
+def _migrate(conn: Connection, mode: str):
+    if mode == "create":
+        _create(conn)
+    else:
+        from alembic import command
+        command.upgrade(_config(conn), "head")
+        conn.commit()
+
+def run(mode: str | None = None) -> None:
+    """Apply ``mode`` (default ``DB_SCHEMA``) against every shard."""
+    from contextlib import ExitStack
+    from app.db.session import require_database
+    from app.db import shards
+
+    mode = mode or settings.DB_SCHEMA
+    if mode not in MODES:
+        raise SchemaError(f"DB_SCHEMA must be one of {', '.join(MODES)}, not {mode!r}")
+    if mode == "off":
+        return
+    require_database()
+    with ExitStack() as stack:
+        conns = [stack.enter_context(s.engine.connect()) for s in shards.cluster]
+        if mode == "check":
+            for shard, conn in zip(shards.cluster, conns):
+                log.info("schema at %s on %s", check(conn), shard.name)
+                if shards.sharded() and (seqs := shards.strided(conn, shard.index)):
+                    raise SchemaError(f"{', '.join(seqs)} on shard {shard.index} don't stride; "
+                                      "run `python -m app.db.schema upgrade` (or start with DB_SCHEMA=upgrade)")
+            return
+        for conn in conns:
+            conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": LOCK_KEY})
+            conn.commit()
+            stack.callback(_unlock, conn)
+        for shard, conn in zip(shards.cluster, conns):
+            _migrate(conn, mode)
+            log.info("schema at %s on %s", check(conn), shard.name)
+        if shards.sharded():
+            for seq in shards.stride(conns):
+                log.info("id sequence %s now strides", seq)
+            for conn in conns:
+                conn.commit()
+
+def _unlock(conn: Connection):
+    conn.rollback()
+    conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": LOCK_KEY})
+    conn.commit()
+
+if __name__ == "__main__":
+    try:
+        run(sys.argv[1] if len(sys.argv) > 1 else None)
+    except SchemaError as e:
+        raise SystemExit(str(e))
+    print("schema ok")
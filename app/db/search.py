@@ -0,0 +1,33 @@
+"""Note search backed by the pg_trgm and tsvector GIN indexes on ``expenses``.
+
+``contains`` keeps the original ILIKE semantics (served by the trigram index);
+``prefix``, ``phrase`` and ``words`` use the generated ``note_tsv`` column.
+Each mode also yields a relevance expression for ``sort=relevance``. The
+archive (``models.ArchivedExpense``) has neither index, but it is only ever
+scanned for one user's rows.
+"""
+import re
+from sqlalchemy import func
+
+import app.models as models
+
+SEARCH_CONFIG = "simple"  # must match the note_tsv generated column
+MODES = ("contains", "prefix", "phrase", "words")
+MODE_PATTERN = "^(" + "|".join(MODES) + ")$"
+
+def search_clause(q: str, mode: str = "contains", model=models.Expense):
+    """Returns ``(criterion, rank)`` for filtering and ranking ``model``'s rows on ``q``."""
+    E = model
+    if mode == "prefix":
+        terms = re.findall(r"\w+", q)
+        if terms:
+            tsq = func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{t}:*" for t in terms))
+            return E.note_tsv.op("@@")(tsq), func.ts_rank(E.note_tsv, tsq)
+    elif mode == "phrase":
+        tsq = func.phraseto_tsquery(SEARCH_CONFIG, q)
+        return E.note_tsv.op("@@")(tsq), func.ts_rank(E.note_tsv, tsq)
+    elif mode == "words":
+        tsq = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        return E.note_tsv.op("@@")(tsq), func.ts_rank(E.note_tsv, tsq)
+    # Postgres ILIKE for case-insensitive contains; pg_trgm GIN index serves it
+    return E.note.ilike(f"%{q}%"), func.word_similarity(q, E.note)
@@ -1,20 +1,113 @@
-import os
+import asyncio, os
 from dotenv import load_dotenv
+from app.core.settings import settings
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool
+from app.db.pool import engine_kwargs
+from app.db.instrument import instrument
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
+# checked at startup (require_database) rather than at import, so tooling can import the app
+DATABASE_URL = os.getenv("DATABASE_URL") or settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL, future=True)
+# DB_ASYNC=1 serves requests from an AsyncEngine instead of the threadpool
+DB_ASYNC = settings.DB_ASYNC
+
+def async_url(url: str):
+    u = make_url(url)
+    if u.drivername in ("postgresql", "postgresql+psycopg2"):
+        u = u.set(drivername="postgresql+asyncpg")
+    return u
+
+engine = (
+    create_engine(DATABASE_URL, future=True, **engine_kwargs(is_async=False, label="sync"))
+    if DATABASE_URL else None
+)
+if engine is not None:
+    instrument(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async_engine = (
+    create_async_engine(async_url(DATABASE_URL), **engine_kwargs(is_async=True, label="async"))
+    if DB_ASYNC and DATABASE_URL else None
+)
+if async_engine is not None:
+    instrument(async_engine.sync_engine)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if DB_ASYNC else None
+)
+
+def require_database():
+    if engine is None:
+        raise RuntimeError("DATABASE_URL environment variable is not set")
+
+async def prewarm(n: int, *engines):
+    """Open ``n`` connections per engine (sync or async) so first requests skip the connect."""
+    n = min(n, settings.DB_POOL_SIZE)
+    for e in engines:
+        if n <= 0 or isinstance(e.pool, NullPool):
+            continue
+        if isinstance(e, AsyncEngine):
+            conns = await asyncio.gather(*(e.connect() for _ in range(n)))
+            await asyncio.gather(*(c.close() for c in conns))
+        else:
+            def open_and_return(e=e):
+                conns = [e.connect() for _ in range(n)]
+                for c in conns:
+                    c.close()
+            await run_in_threadpool(open_and_return)
+
+class Database:
+    """Request-scoped handle that runs sync ORM code without holding the event loop.
+
+    With a plain ``Session`` the work hops to Starlette's threadpool; with an
+    ``AsyncSession`` it runs via ``run_sync`` on the async driver, so concurrency
+    is bounded by the connection pool rather than by threads.
+    """
+    def __init__(self, session: Session | AsyncSession):
+        self.session = session
+
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self.session, AsyncSession)
+
+    async def run(self, fn, *args, **kwargs):
+        """Call ``fn(session, *args, **kwargs)`` with a sync ``Session``."""
+        if self.is_async:
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+    async def all(self, stmt) -> list:
+        if self.is_async:
+            return (await self.session.execute(stmt)).all()
+        return await run_in_threadpool(lambda: self.session.execute(stmt).all())
+
+    async def stream(self, stmt, batch_rows: int):
+        """Yield lists of rows fetched through a server-side cursor."""
+        stmt = stmt.execution_options(yield_per=batch_rows)
+        if self.is_async:
+            result = await self.session.stream(stmt)
+            async for rows in result.partitions():
+                yield rows
+        else:
+            result = await run_in_threadpool(self.session.execute, stmt)
+            async for rows in iterate_in_threadpool(result.partitions()):
+                yield rows
+
+    async def rollback(self):
+        if self.is_async:
+            await self.session.rollback()
+        else:
+            await run_in_threadpool(self.session.rollback)
+
+    async def close(self):
+        if self.is_async:
+            await self.session.close()
+        else:
+            await run_in_threadpool(self.session.close)
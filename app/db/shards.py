@@ -0,0 +1,336 @@
+"""User shards: each user's rows live in one of several Postgres databases.
+
+``DATABASE_URL`` is shard 0 and ``DB_SHARD_URLS`` lists shards 1, 2, ... A
+shard's number is its position, so shards are only ever appended. Every shard
+has the full schema (Alembic migrates each one, see ``app.db.schema``).
+``user_directory`` on shard 0 maps every user id and email to its home shard.
+User ids come from the directory's sequence. Other ids (expenses, jobs) come
+from per-shard sequences that count in steps of ``STRIDE`` from different
+offsets (``stride``), so a user's rows keep their ids when moved.
+
+``get_db`` routes a request to the home shard of the user that
+``get_current_user_id`` resolved. Dependencies resolve in no fixed order, so the
+shard is picked at the first query from the principal memoized on
+``request.state``. Requests without one (register, login) use shard 0. Homes are
+cached per process (``DB_SHARD_CACHE_SIZE``) and read from the directory on a
+miss.
+
+A cached home goes stale when ``python -m app.db.rebalance`` moves the user.
+The fence catches that: with more than one shard, every transaction a
+``ShardSession`` begins for a user first calls ``shard_fence(user_id)``. That
+takes a shared advisory lock on the user, held until the transaction ends, and
+checks that ``users.resident`` is still set on this shard. A move freezes the
+user by taking the same lock exclusively, so it waits for the user's open
+transactions and new ones wait for it. When the fence fails, ``ShardDatabase``
+rolls back, forgets the cached home and retries on the directory's answer. If
+the user is still moving after a few tries it raises ``WrongShard`` (a 503).
+A transaction is only retried if it was the first one the call began.
+
+With one shard nothing is fenced or looked up: ``get_db`` is a plain session on
+``engine``.
+"""
+import asyncio, itertools, zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.requests import HTTPConnection
+
+from app.core import metrics
+from app.core.settings import settings
+from app.db.instrument import instrument
+from app.db.pool import engine_kwargs
+from app.db.session import (DB_ASYNC, AsyncSessionLocal, Base, Database, SessionLocal, async_engine,
+                            async_url, engine)
+
+LOCK_KEY = 0x73686172  # first key of the per-user advisory lock the fence and moves share
+STRIDE = 16  # id sequences step by this much, so there can be at most this many shards
+REROUTE_DELAYS = (0.0, 0.05, 0.25)  # seconds before each retry on the directory's answer
+
+# installed on every shard by create_all (after_create on users) and by migration a8d0c2e4f6b7
+FENCE_SQL = f"""
+CREATE OR REPLACE FUNCTION shard_fence(uid integer) RETURNS boolean LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared({LOCK_KEY}, uid);
+    RETURN EXISTS (SELECT 1 FROM users WHERE id = uid AND resident);
+END $$
+"""
+
+REROUTES = metrics.Counter("db_shard_reroutes_total", "Transactions retried after the fence found the user gone")
+DIRECTORY_LOOKUPS = metrics.Counter("db_shard_directory_lookups_total",
+                                    "Home shards read from user_directory on a cache miss")
+
+def describe(url) -> str:
+    """``host:port/db`` for logs and metrics, without credentials."""
+    u = make_url(url)
+    host = u.host or u.query.get("host") or "localhost"  # ?host= for unix sockets
+    port = u.port or u.query.get("port") or 5432
+    return f"{host}:{port}/{u.database}"
+
+@dataclass(eq=False)
+class Shard:
+    index: int
+    name: str
+    engine: Engine
+    async_engine: AsyncEngine | None = None
+
+    @property
+    def bind(self) -> Engine:
+        """What a ``ShardSession`` (sync, or inside an ``AsyncSession``) binds to."""
+        return self.async_engine.sync_engine if self.async_engine is not None else self.engine
+
+    def session(self, user_id: int | None = None) -> Session:
+        """A sync session for CLIs and the worker; fenced for ``user_id`` when there are shards."""
+        if user_id is None or not sharded():
+            return SessionLocal(bind=self.engine)
+        return ShardSessionLocal(bind=self.engine, info={"fence": user_id})
+
+def _cluster() -> list[Shard]:
+    if engine is None:
+        return []
+    shards = [Shard(0, describe(engine.url), engine, async_engine)]
+    for url in (u.strip() for u in settings.DB_SHARD_URLS.split(",")):
+        if not url:
+            continue
+        n = len(shards)
+        s = Shard(n, describe(url), create_engine(url, future=True, **engine_kwargs(is_async=False, label=f"shard{n}")))
+        instrument(s.engine)
+        if DB_ASYNC:
+            s.async_engine = create_async_engine(async_url(url), **engine_kwargs(is_async=True, label=f"shard{n}-async"))
+            instrument(s.async_engine.sync_engine)
+        shards.append(s)
+    if len(shards) > STRIDE:
+        raise RuntimeError(f"at most {STRIDE} shards are supported")
+    return shards
+
+cluster = _cluster()
+
+def sharded() -> bool:
+    return len(cluster) > 1
+
+def open_shards() -> list[Shard]:
+    """Shards new users are placed on (``DB_SHARD_NEW_USERS``, default all)."""
+    picked = [int(n) for n in settings.DB_SHARD_NEW_USERS.split(",") if n.strip()]
+    return [cluster[n] for n in picked] if picked else cluster
+
+def place(email: str) -> Shard:
+    """Home shard for a new user: a stable hash of the email over the open shards."""
+    candidates = open_shards()
+    return candidates[zlib.crc32(email.encode()) % len(candidates)]
+
+class WrongShard(Exception):
+    """The fence found that ``user_id`` no longer lives on the shard a transaction began on."""
+    def __init__(self, user_id: int, retry: bool):
+        super().__init__(f"user {user_id} is not on this shard (being moved?)")
+        self.user_id, self.retry = user_id, retry
+
+class ShardSession(Session):
+    """Binds to ``info["shard"]``; with ``info["fence"]`` set, fences every transaction it begins."""
+    def get_bind(self, mapper=None, clause=None, **kw):
+        shard = self.info.get("shard")
+        if shard is not None:
+            return shard.bind
+        return super().get_bind(mapper, clause=clause, **kw)
+
+@event.listens_for(ShardSession, "after_begin")
+def _fence(session: Session, transaction, connection: Connection):
+    user_id = session.info.get("fence")
+    if user_id is None or transaction.nested:
+        return
+    session.info["begins"] = session.info.get("begins", 0) + 1
+    if not connection.execute(text("SELECT shard_fence(:u)"), {"u": user_id}).scalar():
+        # only the call's first transaction can be retried; an earlier one may have committed
+        raise WrongShard(user_id, retry=session.info["begins"] == 1)
+
+ShardSessionLocal = sessionmaker(class_=ShardSession, autoflush=False, bind=engine, future=True)
+AsyncShardSessionLocal = (
+    async_sessionmaker(async_engine, sync_session_class=ShardSession, autoflush=False, expire_on_commit=False)
+    if DB_ASYNC else None
+)
+
+def new_session():
+    return AsyncShardSessionLocal() if DB_ASYNC else ShardSessionLocal()
+
+class ShardMap:
+    """user id -> home shard number, least recently used out first."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._homes: OrderedDict[int, int] = OrderedDict()
+
+    def get(self, user_id: int) -> int | None:
+        shard = self._homes.get(user_id)
+        if shard is not None:
+            self._homes.move_to_end(user_id)
+        return shard
+
+    def put(self, user_id: int, shard: int) -> None:
+        if self.maxsize <= 0:
+            return
+        self._homes[user_id] = shard
+        self._homes.move_to_end(user_id)
+        while len(self._homes) > self.maxsize:
+            self._homes.popitem(last=False)
+
+    def discard(self, user_id: int) -> None:
+        self._homes.pop(user_id, None)
+
+shard_map = ShardMap(settings.DB_SHARD_CACHE_SIZE)
+
+def remember(user_id: int, shard: int) -> None:
+    """Cache a home learned elsewhere (login reads it with the password hash)."""
+    if 0 <= shard < len(cluster):
+        shard_map.put(user_id, shard)
+
+HOME_SQL = text("SELECT shard FROM user_directory WHERE id = :u")
+
+async def locate(user_id: int) -> tuple[Shard, bool]:
+    """``user_id``'s home shard, and whether its transactions are fenced."""
+    if not sharded():
+        return cluster[0], False
+    n = shard_map.get(user_id)
+    if n is None:
+        DIRECTORY_LOOKUPS.inc()
+        db = Database(AsyncSessionLocal() if DB_ASYNC else SessionLocal())
+        try:
+            rows = await db.all(HOME_SQL.bindparams(u=user_id))
+        finally:
+            await db.close()
+        if not rows:
+            return cluster[0], False  # no such user (e.g. the warmup's user 0): nothing to find anywhere
+        n = rows[0].shard
+        shard_map.put(user_id, n)
+    return cluster[n], True
+
+class ShardDatabase(Database):
+    """``Database`` on a ``ShardSession`` routed to its user's home shard at the first query.
+
+    The user is ``user_id``, or the principal on ``conn`` once one is resolved;
+    ``shard`` pins the session instead, unfenced.
+    """
+    def __init__(self, session, conn: HTTPConnection | None = None, user_id: int | None = None,
+                 shard: Shard | None = None):
+        super().__init__(session)
+        self.conn, self.user_id = conn, user_id
+        if shard is not None:
+            session.info["shard"] = shard
+
+    async def _route(self):
+        info = self.session.info
+        info["begins"] = 0
+        if "shard" in info:
+            return
+        user_id = self.user_id
+        if user_id is None and self.conn is not None:
+            principal = getattr(self.conn.state, "principal", None)
+            user_id = principal.user_id if principal is not None else None
+        shard, fenced = await locate(user_id) if user_id is not None else (cluster[0], False)
+        info["shard"], info["fence"] = shard, user_id if fenced else None
+
+    async def _reroute(self, e: WrongShard, attempt: int):
+        """Roll back and forget ``e.user_id``'s home before another try, or re-raise ``e``."""
+        if not e.retry or attempt >= len(REROUTE_DELAYS):
+            raise e
+        REROUTES.inc()
+        await self.rollback()
+        shard_map.discard(e.user_id)
+        self.session.info.pop("shard", None)
+        await asyncio.sleep(REROUTE_DELAYS[attempt])
+
+    async def run(self, fn, *args, **kwargs):
+        for attempt in itertools.count():
+            await self._route()
+            try:
+                return await super().run(fn, *args, **kwargs)
+            except WrongShard as e:
+                await self._reroute(e, attempt)
+
+    async def all(self, stmt) -> list:
+        for attempt in itertools.count():
+            await self._route()
+            try:
+                return await super().all(stmt)
+            except WrongShard as e:
+                await self._reroute(e, attempt)
+
+    async def stream(self, stmt, batch_rows: int):
+        for attempt in itertools.count():
+            await self._route()
+            try:
+                # the fence runs before the first row, so nothing has been yielded when it fails
+                async for rows in super().stream(stmt, batch_rows):
+                    yield rows
+                return
+            except WrongShard as e:
+                await self._reroute(e, attempt)
+
+async def get_db(conn: HTTPConnection):
+    db = ShardDatabase(new_session(), conn=conn)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+async def get_directory():
+    """A ``Database`` on shard 0, where ``user_directory`` is; for finding users by email."""
+    db = ShardDatabase(new_session(), shard=cluster[0])
+    try:
+        yield db
+    finally:
+        await db.close()
+
+@asynccontextmanager
+async def user_db(user_id: int | None = None, shard: Shard | None = None):
+    """A ``ShardDatabase`` for ``user_id`` (routed and fenced) or on ``shard``, outside ``get_db``."""
+    db = ShardDatabase(new_session(), user_id=user_id, shard=shard)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def user_tables() -> list:
+    """Tables holding per-user rows besides ``users``: those with a ``user_id`` column."""
+    import app.models  # noqa: F401  (registers the tables)
+    return [t for t in Base.metadata.sorted_tables
+            if "user_id" in t.c and t.name not in ("users", "user_directory")]
+
+def _sequences(conn: Connection) -> list[str]:
+    names = (conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": t.name}).scalar()
+             for t in user_tables() if "id" in t.c)
+    return [s for s in names if s]
+
+def strided(conn: Connection, index: int) -> list[str]:
+    """This shard's id sequences that don't yet step by ``STRIDE`` from offset ``index``."""
+    wrong = []
+    for seq in _sequences(conn):
+        step, start = conn.execute(text("SELECT seqincrement, seqstart FROM pg_sequence WHERE seqrelid = CAST(:s AS regclass)"),
+                                   {"s": seq}).one()
+        if step != STRIDE or start % STRIDE != index:
+            wrong.append(seq)
+    return wrong
+
+def stride(conns: list[Connection]) -> list[str]:
+    """Make every shard's id sequences (``conns[n]`` is shard n) hand out ids no other shard does.
+
+    Sequences already striding are left alone; the rest restart above the
+    largest id any shard has used. Returns the sequences changed.
+    """
+    if len(conns) > STRIDE:
+        raise RuntimeError(f"at most {STRIDE} shards are supported")
+    todo = [(conn, n, strided(conn, n)) for n, conn in enumerate(conns)]
+    if not any(seqs for _, _, seqs in todo):
+        return []
+    top = 0
+    for conn in conns:
+        for seq in _sequences(conn):
+            last, called = conn.execute(text(f"SELECT last_value, is_called FROM {seq}")).one()
+            top = max(top, last if called else last - 1)
+    base = (top // STRIDE + 1) * STRIDE
+    changed = []
+    for conn, n, seqs in todo:
+        for seq in seqs:
+            conn.execute(text(f"ALTER SEQUENCE {seq} INCREMENT BY {STRIDE} START WITH {base + n} RESTART"))
+            changed.append(f"{seq} on shard {n}")
+    return changed
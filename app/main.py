@@ -1,24 +1,122 @@
-from fastapi import FastAPI
+import logging, time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import exc as sa_exc
 from fastapi.middleware.cors import CORSMiddleware
-from app.db.session import engine, Base
+from starlette.concurrency import run_in_threadpool
+from app.db import schema
+from app.db.live import listener
+from app.db.replicas import replicas, require_shared_cache
+from app.db.session import prewarm, require_database
+from app.db.shards import WrongShard, cluster
 from app import models
-from app.routers import auth, expenses
+from app.routers import auth, expenses, jobs, live
+from app.core import metrics
+from app.core.hashing import hasher
+from app.core.limits import AdmissionMiddleware
+from app.core.security import create_token
+from app.core.settings import settings
+from app.core.timing import TimingMiddleware
+
+log = logging.getLogger("uvicorn.error")  # shows up alongside the server's own startup lines
+
+STARTUP_SECONDS = metrics.Gauge("app_startup_seconds", "Lifespan startup time of this worker by phase")
+
+def _warmup_paths() -> list[str]:
+    today = datetime.now(timezone.utc).date()
+    return ["/expenses/", "/expenses/?q=warmup", "/expenses/summary", "/expenses/trend",
+            "/expenses/dashboard", f"/expenses/stats/summary?month={today:%Y-%m}",
+            f"/expenses/stats/by-month?year={today.year}"]
+
+async def _warm_routes(app: FastAPI):
+    """Replay hot GET routes in-process before the first real request arrives.
+
+    User id 0 owns no rows, so each query is cheap. Running them still fills the
+    engine's compiled-statement cache and asyncpg's prepared statements, and
+    builds the Pydantic validators and route handlers.
+    """
+    import httpx  # only needed here; keeps it off the import path
+
+    headers = {"Authorization": f"Bearer {create_token(0)}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://warmup") as c:
+        for path in _warmup_paths():
+            r = await c.get(path, headers=headers)
+            if r.status_code >= 400:
+                log.warning("warmup %s returned %d", path, r.status_code)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    phases = {}
+    t0 = time.perf_counter()
+    require_database()
+    require_shared_cache()
+    await run_in_threadpool(schema.run)
+    phases["schema"], t0 = time.perf_counter() - t0, time.perf_counter()
+    await prewarm(settings.DB_POOL_PREWARM, *(s.async_engine or s.engine for s in cluster))
+    if replicas is not None:
+        replicas.start()
+        await replicas.prewarm(settings.DB_POOL_PREWARM)
+    if settings.LIVE_UPDATES:
+        listener.start()
+    phases["pool"], t0 = time.perf_counter() - t0, time.perf_counter()
+    if settings.WARMUP_REQUESTS:
+        await _warm_routes(app)
+    phases["warmup"] = time.perf_counter() - t0
+    for phase, seconds in phases.items():
+        STARTUP_SECONDS.set(seconds, phase=phase)
+    log.info("startup: %s", ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in phases.items()))
+
+    yield
+
+    await listener.stop()
+    if replicas is not None:
+        replicas.stop()
+    hasher.shutdown()
+    for shard in cluster:
+        if shard.async_engine is not None:
+            await shard.async_engine.dispose()
+        shard.engine.dispose()
 
 app = FastAPI(
     title="Expense Tracker API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.include_router(auth.router)
-app.include_router(expenses.router, prefix="/expenses", tags=["expenses"])
+app.include_router(expenses.router)
+app.include_router(jobs.router)
+app.include_router(live.router)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.exception_handler(sa_exc.TimeoutError)
+async def pool_timeout_handler(request: Request, exc: sa_exc.TimeoutError):
+    # pool exhausted for DB_POOL_TIMEOUT seconds: shed instead of surfacing a 500
+    return JSONResponse(status_code=503, content={"detail": "Database busy, retry shortly"},
+                        headers={"Retry-After": "1"})
+
+@app.exception_handler(WrongShard)
+async def wrong_shard_handler(request: Request, exc: WrongShard):
+    # the user is being moved to another shard; that takes seconds at most
+    return JSONResponse(status_code=503, content={"detail": "Account is being moved, retry shortly"},
+                        headers={"Retry-After": "1"})
 
+# inside CORS, so 503s from shedding still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# outermost, so the timings cover CORS and error handling too
+app.add_middleware(TimingMiddleware)
 
-models
-Base.metadata.create_all(bind=engine)
+models  # mappers are configured at import; the schema itself is Alembic's (see app/db/schema.py)
@@ -1,27 +1,130 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index, UniqueConstraint, DateTime, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, Boolean, String, Float, ForeignKey, Index, PrimaryKeyConstraint, UniqueConstraint, DateTime, Date, Computed, DDL, LargeBinary, Text, cast, event, func, true
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, deferred, column_property
 from app.db.session import Base
+from app.db import partitions, shards
 
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
+    # cleared while the user is moved off this shard; see app/db/shards.py
+    resident = Column(Boolean, nullable=False, server_default=true())
 
     expenses = relationship("Expense", back_populates="user", cascade="all, delete")
 
+event.listen(User.__table__, "after_create", DDL(shards.FENCE_SQL))
+
+class UserDirectory(Base):
+    """Every user's id, email and home shard; only shard 0's copy is used."""
+    __tablename__ = "user_directory"
+    id = Column(Integer, primary_key=True)
+    email = Column(String(255), unique=True, index=True, nullable=False)
+    shard = Column(SmallInteger, nullable=False, server_default="0")
+
 class Expense(Base):
     __tablename__ = "expenses"
-    id = Column(Integer, primary_key=True, index=True)
+    # monthly range partitions on created_at; see app/db/partitions.py
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+    # the partition key has to be part of the primary key; ids still come from one sequence
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     category = Column(String(64), nullable=False, index=True)
     amount = Column(Float, nullable=False)
     note = Column(String(255))
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False,
+                        primary_key=True, index=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # kept in sync by Postgres; see app/db/search.py
+    note_tsv = deferred(Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(note, ''))", persisted=True)))
 
     user = relationship("User", back_populates="expenses")
 
+    # fetch created_at/updated_at via RETURNING on flush instead of a refresh SELECT
+    # and identify rows by id alone, as before partitioning
+    __mapper_args__ = {"eager_defaults": True, "primary_key": [id]}
+
 Index("ix_expenses_user_created_at", Expense.user_id, Expense.created_at.desc())
 Index("ix_expenses_user_category", Expense.user_id, Expense.category)
+Index("ix_expenses_user_amount_id", Expense.user_id, Expense.amount, Expense.id)
+Index("ix_expenses_note_trgm", Expense.note, postgresql_using="gin", postgresql_ops={"note": "gin_trgm_ops"})
+Index("ix_expenses_note_tsv", Expense.note_tsv, postgresql_using="gin")
+event.listen(Expense.__table__, "after_create", partitions.on_create)
+
+class ArchivedExpense(Base):
+    """An expense older than ``ARCHIVE_AFTER_MONTHS``, moved out of ``expenses``; see app/db/archive.py.
+
+    Compact: integer cents, no search column and no index but the
+    ``(user_id, created_at, id)`` key, in whose order rows are written.
+    """
+    __tablename__ = "expenses_archive"
+    __table_args__ = (PrimaryKeyConstraint("user_id", "created_at", "id"),)
+    # fixed-width columns first, widest first, so rows carry no alignment padding
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    id = Column(Integer, nullable=False)
+    category = Column(String(64), nullable=False)
+    note = Column(String(255))
+
+    # named like Expense's columns, so the same filters and search apply to both tables
+    amount = column_property(cast(amount_cents, Float) / 100)
+    note_tsv = deferred(func.to_tsvector("simple", func.coalesce(note, "")))
+
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+class DailyRollup(Base):
+    __tablename__ = "expense_rollups_daily"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    category = Column(String(64), primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+class MonthlyRollup(Base):
+    __tablename__ = "expense_rollups_monthly"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month (UTC)
+    category = Column(String(64), primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+class Job(Base):
+    """A background job and, once it succeeds, its result; see app/db/jobs.py."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(32), nullable=False)
+    params = Column(JSONB, nullable=False, server_default="{}")
+    status = Column(String(16), nullable=False, server_default="queued")  # queued, running, succeeded, failed
+    progress = Column(Float, nullable=False, server_default="0")
+    message = Column(String(255))
+    attempts = Column(Integer, nullable=False, server_default="0")
+    max_attempts = Column(Integer, nullable=False, server_default="3")
+    error = Column(Text)
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    worker = Column(String(128))
+    heartbeat_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    expires_at = Column(DateTime(timezone=True))
+    result_type = Column(String(64))
+    result_name = Column(String(128))
+    result_size = Column(BigInteger)  # uncompressed bytes
+
+# what workers claim from, oldest first; stays as small as the backlog
+Index("ix_jobs_queued", Job.run_after, Job.id, postgresql_where=Job.status == "queued")
+Index("ix_jobs_user_created_at", Job.user_id, Job.created_at.desc())
+
+class JobResultChunk(Base):
+    """A slice of a job's gzip result; the slices in ``seq`` order make up the file."""
+    __tablename__ = "job_result_chunks"
+    job_id = Column(Integer, ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    # so the chunks move with the user between shards (app/db/rebalance.py)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    data = Column(LargeBinary, nullable=False)
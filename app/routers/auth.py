@@ -1,25 +1,76 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import exc
 from sqlalchemy.orm import Session
-from app.db.session import get_db
+from app.db.session import Database
+from app.db import shards
 from app import models
 from app.schemas.user import UserCreate, UserOut
-from app.core.security import hash_password, verify_password, create_token
+from app.core.security import create_token
+from app.core.hashing import hasher
+from app.core.limits import rate_limit
+from app.core.timing import TimedRoute
 from fastapi.security import OAuth2PasswordRequestForm
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=TimedRoute)
+AUTH = Depends(rate_limit("auth"))
 
-@router.post("/register", response_model=UserOut)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-    if db.query(models.User).filter_by(email=payload.email).first():
+def _user_by_email(db: Session, email: str):
+    """``(id, shard, hashed_password)`` from the directory; the hash is None unless the user is on shard 0."""
+    D, U = models.UserDirectory, models.User
+    return db.query(D.id, D.shard, U.hashed_password) \
+        .outerjoin(U, (U.id == D.id) & U.resident).filter(D.email == email).first()
+
+def _password(db: Session, user_id: int) -> str | None:
+    return db.query(models.User.hashed_password).filter(models.User.id == user_id).scalar()
+
+@router.post("/register", response_model=UserOut, dependencies=[AUTH])
+async def register(payload: UserCreate, db: Database = Depends(shards.get_directory)):
+    if await db.run(_user_by_email, payload.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    u = models.User(email=payload.email, hashed_password=hash_password(payload.password))
-    db.add(u); db.commit(); db.refresh(u)
-    return u
-
-@router.post("/login")
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form.username).first()
-    if not user or not verify_password(form.password, user.hashed_password):
+    hashed = await hasher.hash(payload.password)
+
+    def reserve(session: Session):
+        entry = models.UserDirectory(email=payload.email, shard=shards.place(payload.email).index)
+        session.add(entry); session.flush()
+        return entry.id, entry.shard
+
+    def create(session: Session, user_id: int):
+        u = models.User(id=user_id, email=payload.email, hashed_password=hashed)
+        session.add(u); session.commit(); session.refresh(u)
+        return u
+
+    try:
+        # the directory entry commits last, so a user it names always exists
+        user_id, home = await db.run(reserve)
+        if home == 0:
+            user = await db.run(create, user_id)  # one transaction with the entry
+        else:
+            async with shards.user_db(shard=shards.cluster[home]) as home_db:
+                user = await home_db.run(create, user_id)
+            await db.run(lambda session: session.commit())
+    except exc.IntegrityError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    shards.remember(user_id, home)
+    return user
+
+@router.post("/login", dependencies=[AUTH])
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: Database = Depends(shards.get_directory)):
+    user = await db.run(_user_by_email, form.username)
+    hashed = user and user.hashed_password
+    if user and hashed is None:  # lives on another shard
+        shards.remember(user.id, user.shard)
+        async with shards.user_db(user.id) as home_db:
+            hashed = await home_db.run(_password, user.id)
+    ok, new_hash = await hasher.verify(form.password, hashed) if hashed else (False, None)
+    if not ok:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if new_hash:
+        # stored hash predates the current argon2 cost settings
+        def rehash(session: Session):
+            session.query(models.User).filter(models.User.id == user.id) \
+                .update({models.User.hashed_password: new_hash})
+            session.commit()
+        async with shards.user_db(user.id) as home_db:
+            await home_db.run(rehash)
     token = create_token(str(user.id))
     return {"access_token": token, "token_type": "bearer"}
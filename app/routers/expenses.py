@@ -1,275 +1,445 @@
 from typing import Optional
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc
+from sqlalchemy import desc, asc, tuple_
 from pydantic import BaseModel
 
-from app.db.session import get_db
+from app.db.session import Database
+from app.db.shards import get_db
+from app.db.replicas import get_read_db, write_lsn
+from app.db.paging import encode_cursor, decode_cursor, estimate_count
+from app.db import bulk, analytics, batch, distribution, queries
+from app.db.search import MODE_PATTERN
 from app.core.security import get_current_user_id
-import app.models as models
-from app.schemas.expense import ExpenseCreate, ExpenseOut
-from app.schemas.paging import Page, PageMeta
+from app.core.cache import CachedResponse, bump_version, response_cache
+from app.core.limits import rate_limit
+from app.core.timing import TimedRoute
+from app.core.serialize import json_response, records
+from app.schemas.expense import (BatchResult, ExpenseBatch, ExpenseCreate, ExpenseOut,
+                                 ExpenseUpdateItem, ImportResult)
+from app.schemas.paging import Page
 
-router = APIRouter(prefix="/expenses", tags=["expenses"])
+router = APIRouter(prefix="/expenses", tags=["expenses"], route_class=TimedRoute)
 
-@router.get("/", response_model=list[ExpenseOut])
-def list_expenses(
-    db: Session = Depends(get_db),
+# admission budgets; checked before the route's other dependencies run
+READ, WRITE, ANALYTICS = (Depends(rate_limit(b)) for b in ("read", "write", "analytics"))
+
+def _month_start(month: str) -> date:
+    try:
+        return queries.parse_month(month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _zone(tz: str) -> str:
+    try:
+        queries.zone(tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return tz
+
+def _period(month, date_from, date_to, tz) -> queries.Range:
+    if month:
+        return queries.Range.month(_month_start(month), tz)
+    return queries.Range.between(date_from, date_to, tz)
+
+def _local_today(request: Request):
+    # cache key material for windows relative to today, which rolls over at local midnight
+    try:
+        return queries.today(request.query_params.get("tz", queries.UTC))
+    except ValueError:
+        return None  # the handler rejects the zone
+
+TZ_DESCRIPTION = "IANA time zone for day and month boundaries (e.g. Europe/Berlin)"
+
+# ExpenseOut's fields in declaration order, loaded as plain columns for the list fast path
+EXPENSE_FIELDS = tuple(ExpenseOut.model_fields)
+
+@router.get("/", response_model=Page[ExpenseOut], dependencies=[READ])
+async def list_expenses(
+    db: Database = Depends(get_read_db),
     user_id: int = Depends(get_current_user_id),
 
     category: Optional[str] = Query(None, description="Exact category match"),
     q: Optional[str] = Query(None, description="Search in note (case-insensitive)"),
+    match: str = Query("contains", pattern=MODE_PATTERN,
+                       description="How q matches: substring, word prefixes, exact phrase, or web-style words"),
     min_amount: Optional[float] = Query(None, ge=0),
     max_amount: Optional[float] = Query(None, ge=0),
     date_from: Optional[datetime] = Query(None, description="ISO start"),
     date_to: Optional[datetime] = Query(None, description="ISO end"),
     month: Optional[str] = Query(None, description="YYYY-MM (e.g. 2025-11)"),
+    tz: str = Query(queries.UTC, description=TZ_DESCRIPTION),
 
-    sort: str = Query("created_at", pattern="^(created_at|amount)$"),
+    sort: str = Query("created_at", pattern="^(created_at|amount|relevance)$"),
     order: str = Query("desc", pattern="^(asc|desc)$"),
 
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from meta.next_cursor/prev_cursor (ignores offset)"),
+    total: str = Query("exact", pattern="^(exact|estimate|none)$",
+                       description="exact count(), planner estimate, or skip the total"),
 ):
-    qy = db.query(models.Expense).filter(models.Expense.user_id == user_id)
-
-    if category:
-        qy = qy.filter(models.Expense.category == category)
-
-    if q:
-        # Postgres ILIKE for case-insensitive contains
-        qy = qy.filter(models.Expense.note.ilike(f"%{q}%"))
-
-    if min_amount is not None:
-        qy = qy.filter(models.Expense.amount >= min_amount)
-    if max_amount is not None:
-        qy = qy.filter(models.Expense.amount <= max_amount)
+    if sort == "relevance" and not q:
+        raise HTTPException(status_code=400, detail="sort=relevance requires q")
+    if sort == "relevance" and cursor:
+        raise HTTPException(status_code=400, detail="cursor pagination is not available for sort=relevance")
+
+    period = _period(month, date_from, date_to, _zone(tz))
+
+    def work(session: Session):
+        src = queries.expense_rows(EXPENSE_FIELDS, user_id, category, q, match, min_amount, max_amount,
+                                   period, rank=sort == "relevance")
+        qy = session.query(*(src.c[f] for f in EXPENSE_FIELDS))
+
+        if total == "exact":
+            total_count = qy.count()
+        elif total == "estimate":
+            total_count = estimate_count(session, qy)
+        else:
+            total_count = None
+
+        sort_col = src.c.rank if sort == "relevance" else src.c[sort]
+        descending = order == "desc"
+        backwards = False
+        page_offset = offset
+
+        if cursor:
+            try:
+                value, last_id, direction = decode_cursor(cursor, sort, order)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            backwards = direction == "prev"
+            # row-value comparison seeks straight into (user_id, <sort col>) indexes
+            key, bound = tuple_(sort_col, src.c.id), tuple_(value, last_id)
+            qy = qy.filter(key < bound if descending != backwards else key > bound)
+            page_offset = 0
+
+        sort_dir = desc if descending != backwards else asc
+        qy = qy.order_by(sort_dir(sort_col), sort_dir(src.c.id))
+
+        rows = qy.limit(limit + 1).offset(page_offset).all()
+        has_more = len(rows) > limit
+        items = rows[:limit]
+        if backwards:
+            items.reverse()
+
+        def _cursor(e, direction):
+            return encode_cursor(sort, order, getattr(e, sort), e.id, direction)
+
+        next_cursor = prev_cursor = None
+        if items and sort != "relevance":
+            if has_more or backwards:
+                next_cursor = _cursor(items[-1], "next")
+            if (has_more if backwards else (cursor or page_offset > 0)):
+                prev_cursor = _cursor(items[0], "prev")
+
+        return json_response({
+            "items": records(EXPENSE_FIELDS, items),
+            "meta": {
+                "total": total_count,
+                "total_is_estimate": total == "estimate",
+                "limit": limit,
+                "offset": page_offset,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+            },
+        })
+
+    return await db.run(work)
+
+
+@router.get("/export", dependencies=[READ])
+async def export_expenses(
+    db: Database = Depends(get_read_db),
+    user_id: int = Depends(get_current_user_id),
 
-    if month:
-        try:
-            start = datetime.strptime(month, "%Y-%m")
-            next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
-            qy = qy.filter(models.Expense.created_at >= start,
-                           models.Expense.created_at < next_month)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="month must be YYYY-MM")
-    else:
-        if date_from:
-            qy = qy.filter(models.Expense.created_at >= date_from)
-        if date_to:
-            qy = qy.filter(models.Expense.created_at < date_to)
-
-    total = qy.count()
-
-    sort_col = models.Expense.created_at if sort == "created_at" else models.Expense.amount
-    sort_dir = desc if order == "desc" else asc
-    qy = qy.order_by(sort_dir(sort_col))
-
-    items = qy.limit(limit).offset(offset).all()
-
-    return Page[ExpenseOut](
-        items=items,
-        meta=PageMeta(total=total, limit=limit, offset=offset),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    category: Optional[str] = Query(None, description="Exact category match"),
+    q: Optional[str] = Query(None, description="Search in note (case-insensitive)"),
+    match: str = Query("contains", pattern=MODE_PATTERN),
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    date_from: Optional[datetime] = Query(None, description="ISO start"),
+    date_to: Optional[datetime] = Query(None, description="ISO end"),
+    month: Optional[str] = Query(None, description="YYYY-MM (e.g. 2025-11)"),
+    tz: str = Query(queries.UTC, description=TZ_DESCRIPTION),
+):
+    period = _period(month, date_from, date_to, _zone(tz))
+    stmt = bulk.export_statement(user_id, category, q, match, min_amount, max_amount, period)
+
+    # server-side cursor: rows are fetched in batches as the response is written
+    async def body():
+        yield bulk.export_header(format)
+        async for rows in db.stream(stmt, bulk.EXPORT_BATCH_ROWS):
+            yield bulk.encode_rows(rows, format)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="expenses.{format}"'},
     )
 
 
-@router.post("/", response_model=ExpenseOut, status_code=status.HTTP_201_CREATED)
-def create_expense(
+@router.post("/", response_model=ExpenseOut, status_code=status.HTTP_201_CREATED, dependencies=[WRITE])
+async def create_expense(
     payload: ExpenseCreate,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_db),
     user_id: int = Depends(get_current_user_id),
 ):
-    expense = models.Expense(**payload.model_dump(), user_id=user_id)
-    db.add(expense)
-    db.commit()
-    db.refresh(expense)
+    def work(session: Session):
+        rows = batch.insert_expenses(session, user_id, [payload])
+        batch.update_rollups(session, user_id, created=rows)
+        session.commit()
+        return rows[0]
+
+    expense = await db.run(work)
+    await bump_version(user_id, await write_lsn(db))
     return expense
 
-@router.put("/{expense_id}", response_model=ExpenseOut)
-def update_expense(
+@router.post("/import", response_model=ImportResult, dependencies=[WRITE])
+async def import_expenses(
+    request: Request,
+    db: Database = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$",
+                                  description="Defaults from Content-Type"),
+):
+    fmt = format or ("ndjson" if "json" in request.headers.get("content-type", "") else "csv")
+    parser = bulk.ImportParser(fmt)
+    pending: list = []
+    inserted = 0
+
+    async for chunk in request.stream():
+        pending += parser.feed(chunk)
+        if len(pending) >= bulk.CHUNK_ROWS:
+            inserted += await db.run(bulk.load_rows, user_id, pending)
+            pending = []
+    pending += parser.close()
+    if pending:
+        inserted += await db.run(bulk.load_rows, user_id, pending)
+    await db.run(Session.commit)
+    await bump_version(user_id, await write_lsn(db))
+
+    return parser.result(inserted)
+
+@router.post("/batch", response_model=BatchResult, dependencies=[WRITE])
+async def batch_expenses(
+    payload: ExpenseBatch,
+    db: Database = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+):
+    def work(session: Session):
+        result = batch.apply(session, user_id, payload)
+        session.commit()
+        return result
+
+    result = await db.run(work)
+    if result.created or result.updated or result.deleted:
+        await bump_version(user_id, await write_lsn(db))
+    return result
+
+@router.put("/{expense_id}", response_model=ExpenseOut, dependencies=[WRITE])
+async def update_expense(
     expense_id: int,
     payload: ExpenseCreate,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_db),
     user_id: int = Depends(get_current_user_id),
 ):
-    exp = (
-        db.query(models.Expense)
-        .filter(models.Expense.id == expense_id, models.Expense.user_id == user_id)
-        .first()
-    )
-    if not exp:
-        raise HTTPException(status_code=404, detail="Expense not found")
-
-    for k, v in payload.model_dump().items():
-        setattr(exp, k, v)
-
-    db.commit()
-    db.refresh(exp)
+    def work(session: Session):
+        rows = batch.update_expenses(session, user_id,
+                                     [ExpenseUpdateItem(id=expense_id, **payload.model_dump())])
+        if not rows:
+            raise HTTPException(status_code=404, detail="Expense not found")
+        batch.update_rollups(session, user_id, updated=rows.values())
+        session.commit()
+        return rows[expense_id]
+
+    exp = await db.run(work)
+    await bump_version(user_id, await write_lsn(db))
     return exp
 
 
-@router.delete("/{expense_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_expense(
+@router.delete("/{expense_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[WRITE])
+async def delete_expense(
     expense_id: int,
-    db: Session = Depends(get_db),
+    db: Database = Depends(get_db),
     user_id: int = Depends(get_current_user_id),
 ):
-    exp = (
-        db.query(models.Expense)
-        .filter(models.Expense.id == expense_id, models.Expense.user_id == user_id)
-        .first()
-    )
-    if not exp:
-        raise HTTPException(status_code=404, detail="Expense not found")
-
-    db.delete(exp)
-    db.commit()
+    def work(session: Session):
+        rows = batch.delete_expenses(session, user_id, [expense_id])
+        if not rows:
+            raise HTTPException(status_code=404, detail="Expense not found")
+        batch.update_rollups(session, user_id, deleted=rows.values())
+        session.commit()
+
+    await db.run(work)
+    await bump_version(user_id, await write_lsn(db))
     return
 
+# The analytics models below document the responses; handlers build plain dicts
+# and cache.store() encodes them with orjson, so no model is built per point.
 class SummaryOut(BaseModel):
     month: str | None
     total_spent: float
     count: int
     by_category: dict[str, float]
 
-@router.get("/summary", response_model=SummaryOut, tags=["expenses"])
-def get_expense_summary(
-    db: Session = Depends(get_db),
+@router.get("/summary", response_model=SummaryOut, tags=["expenses"], dependencies=[ANALYTICS])
+async def get_expense_summary(
+    db: Database = Depends(get_read_db),
     user_id: int = Depends(get_current_user_id),
     month: str | None = Query(None, description="YYYY-MM (optional)"),
+    tz: str = Query(queries.UTC, description=TZ_DESCRIPTION),
+    cache: CachedResponse = Depends(response_cache("summary")),
 ):
-    q = db.query(
-        models.Expense.category,
-        func.sum(models.Expense.amount).label("total_amount")
-    ).filter(models.Expense.user_id == user_id)
+    if cache.hit:
+        return cache.hit
+    start = _month_start(month) if month else None
+    end = queries.add_months(start, 1) if start else None
+    stats = await db.run(analytics.period_stats, user_id, start, end, tz=_zone(tz))
 
-    if month:
-        period = month
-        try:
-            start = datetime.strptime(period, "%Y-%m")
-            next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="month must be YYYY-MM")
-        q = q.filter(
-            models.Expense.created_at >= start,
-            models.Expense.created_at < next_month)
-
-    total, cnt = db.query(
-        func.coalesce(func.sum(models.Expense.amount), 0),
-        func.count(models.Expense.id)
-    ).filter(models.Expense.user_id == user_id) \
-    .filter(*q._criterion if getattr(q, '_criterion', None) else []) \
-    .one()
-
-    rows = db.query(
-        models.Expense.category,
-        func.coalesce(func.sum(models.Expense.amount), 0.0)
-    ).filter(models.Expense.user_id == user_id) \
-    .filter(*q._criterion if getattr(q, '_criterion', None) else []) \
-    .group_by(models.Expense.category).all()
-
-    by_cat = {c: float(a) for c, a in rows}
-
-    return SummaryOut(
-        month=period,
-        total_spent=float(total),
-        count=int(cnt),
-        by_category=by_cat)
+    return await cache.store({
+        "month": month,
+        "total_spent": stats.current.total,
+        "count": stats.current.count,
+        "by_category": {c: t for c, (t, _) in stats.current.by_category.items()},
+    })
 
 class DayPoint(BaseModel):
     date: str
     total: float
-@router.get("/trend", response_model=list[DayPoint], tags=["expenses"])
-def expenses__trend(
-    db: Session = Depends(get_db),
+@router.get("/trend", response_model=list[DayPoint], tags=["expenses"], dependencies=[ANALYTICS])
+async def expenses__trend(
+    db: Database = Depends(get_read_db),
     user_id: int = Depends(get_current_user_id),
     days: int = Query(30, ge=1, le=365),
+    tz: str = Query(queries.UTC, description=TZ_DESCRIPTION),
+    cache: CachedResponse = Depends(response_cache("trend", vary=_local_today)),
 ):
-    end = datetime.now()
-    start = end - timedelta(days=days)
-    rows = (
-        db.query(
-            func.date_trunc("day", models.Expense.created_at).label("d"),
-            func.coalesce(func.sum(models.Expense.amount), 0.0).label("total")
-        )
-        .filter(
-            models.Expense.user_id == user_id,
-            models.Expense.created_at >= start,
-            models.Expense.created_at <= end
-        )
-        .group_by(func.date_trunc("day", models.Expense.created_at))
-        .order_by(func.date_trunc("day", models.Expense.created_at))
-        .all()
-    )
+    if cache.hit:
+        return cache.hit
+    # bounded above too, so future expense partitions are pruned
+    end = queries.today(_zone(tz)) + timedelta(days=1)
+    stats = await db.run(analytics.period_stats, user_id, end - timedelta(days=days + 1), end,
+                         granularity="day", tz=tz)
 
-    return [DayPoint(date=r.d.date().isoformat(), total=float(r.total)) for r in rows]
+    return await cache.store([{"date": d, "total": t} for d, t in stats.series])
 
-@router.get("/stats/summary")
-def stats_summary(
-    db: Session = Depends(get_db),
+class CategoryDelta(BaseModel):
+    category: str
+    total: float
+    count: int
+    previous_total: float
+    delta: float
+
+class DashboardOut(BaseModel):
+    month: str
+    total: float
+    average: float
+    count: int
+    previous_total: float
+    previous_count: int
+    total_delta: float
+    total_delta_pct: float | None
+    by_category: list[CategoryDelta]
+    daily: list[DayPoint]
+
+@router.get("/dashboard", response_model=DashboardOut, tags=["expenses"], dependencies=[ANALYTICS])
+async def expenses_dashboard(
+    db: Database = Depends(get_read_db),
+    user_id: int = Depends(get_current_user_id),
+    month: str | None = Query(None, description="YYYY-MM (defaults to the current month)"),
+    tz: str = Query(queries.UTC, description=TZ_DESCRIPTION),
+    cache: CachedResponse = Depends(response_cache("dashboard", vary=_local_today)),
+):
+    if cache.hit:
+        return cache.hit
+    start = _month_start(month) if month else queries.today(_zone(tz)).replace(day=1)
+    stats = await db.run(analytics.period_stats, user_id, start, queries.add_months(start, 1),
+                         prev_start=queries.add_months(start, -1), granularity="day", tz=_zone(tz))
+    cur, prev = stats.current, stats.previous
+
+    categories = list(cur.by_category) + [c for c in prev.by_category if c not in cur.by_category]
+    by_category = []
+    for c in categories:
+        total, count = cur.by_category.get(c, (0.0, 0))
+        prev_total = prev.by_category.get(c, (0.0, 0))[0]
+        by_category.append({"category": c, "total": total, "count": count,
+                            "previous_total": prev_total, "delta": total - prev_total})
+
+    return await cache.store({
+        "month": start.strftime("%Y-%m"),
+        "total": cur.total,
+        "average": cur.average,
+        "count": cur.count,
+        "previous_total": prev.total,
+        "previous_count": prev.count,
+        "total_delta": cur.total - prev.total,
+        "total_delta_pct": (cur.total - prev.total) / prev.total * 100 if prev.total else None,
+        "by_category": by_category,
+        "daily": [{"date": d, "total": t} for d, t in stats.series],
+    })
+
+@router.get("/stats/summary", dependencies=[ANALYTICS])
+async def stats_summary(
+    db: Database = Depends(get_read_db),
     user_id: int = Depends(get_current_user_id),
     month: str = Query(..., description="YYYY-MM"),
+    tz: str = Query(queries.UTC, description=TZ_DESCRIPTION),
+    cache: CachedResponse = Depends(response_cache("stats_summary")),
 ):
-    try:
-        start = datetime.strptime(month, "%Y-%m")
-        next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="month must be YYYY-MM")
-
-    total, avg = db.query(
-        func.coalesce(func.sum(models.Expense.amount), 0.0),
-        func.coalesce(func.avg(models.Expense.amount), 0.0),
-    ).filter(
-        models.Expense.user_id == user_id,
-        models.Expense.created_at >= start,
-        models.Expense.created_at < next_month
-    ).one()
-
-    by_category = (
-        db.query(models.Expense.category, func.coalesce(func.sum(models.Expense.amount), 0.0))
-          .filter(
-              models.Expense.user_id == user_id,
-              models.Expense.created_at >= start,
-              models.Expense.created_at < next_month
-          )
-          .group_by(models.Expense.category)
-          .order_by(func.sum(models.Expense.amount).desc())
-          .all()
-    )
-
-    count = db.query(models.Expense).filter(
-        models.Expense.user_id == user_id,
-        models.Expense.created_at >= start,
-        models.Expense.created_at < next_month
-    ).count()
-
-    return {
+    if cache.hit:
+        return cache.hit
+    start = _month_start(month)
+    stats = await db.run(analytics.period_stats, user_id, start, queries.add_months(start, 1),
+                         tz=_zone(tz))
+    cur = stats.current
+
+    return await cache.store({
         "month": month,
-        "total": float(total),
-        "average": float(avg),
-        "count": count,
-        "by_category": [{"category": c, "total": float(t)} for c, t in by_category],
-    }
-
-@router.get("/stats/by-month")
-def stats_by_month(
-    db: Session = Depends(get_db),
+        "total": cur.total,
+        "average": cur.average,
+        "count": cur.count,
+        "by_category": [{"category": c, "total": t} for c, (t, _) in cur.by_category.items()],
+    })
+
+@router.get("/stats/by-month", dependencies=[ANALYTICS])
+async def stats_by_month(
+    db: Database = Depends(get_read_db),
     user_id: int = Depends(get_current_user_id),
     year: int = Query(..., ge=1970, le=3000),
+    tz: str = Query(queries.UTC, description=TZ_DESCRIPTION),
+    cache: CachedResponse = Depends(response_cache("stats_by_month")),
 ):
-    rows = (
-        db.query(
-            func.date_trunc("month", models.Expense.created_at).label("m"),
-            func.coalesce(func.sum(models.Expense.amount), 0.0).label("total"),
-        )
-        .filter(
-            models.Expense.user_id == user_id,
-            func.extract("year", models.Expense.created_at) == year,
-        )
-        .group_by(func.date_trunc("month", models.Expense.created_at))
-        .order_by(func.date_trunc("month", models.Expense.created_at).asc())
-        .all()
-    )
+    if cache.hit:
+        return cache.hit
+    stats = await db.run(analytics.period_stats, user_id, date(year, 1, 1), date(year + 1, 1, 1),
+                         tz=_zone(tz))
+
+    return await cache.store([{"month": m.strftime("%Y-%m"), "total": t} for m, t in stats.series])
 
-    return [{"month": r.m.date().strftime("%Y-%m"), "total": float(r.total)} for r in rows]
+@router.get("/stats/distribution", dependencies=[ANALYTICS])
+async def stats_distribution(
+    db: Database = Depends(get_read_db),
+    user_id: int = Depends(get_current_user_id),
+    days: int = Query(365, ge=1, le=3650, description="Window ending today"),
+    category: Optional[str] = Query(None, description="Exact category match"),
+    bins: int = Query(20, ge=1, le=200, description="Histogram bins"),
+    scale: str = Query("log", pattern="^(log|linear)$", description="Histogram bin spacing"),
+    tz: str = Query(queries.UTC, description=TZ_DESCRIPTION),
+    cache: CachedResponse = Depends(response_cache("stats_distribution", vary=_local_today)),
+):
+    if cache.hit:
+        return cache.hit
+    last = queries.today(_zone(tz))
+    first = last - timedelta(days=days - 1)
+    period = queries.Range.days(first, last + timedelta(days=1), tz)
+    cols = await db.run(distribution.load, user_id, period, tz, category)
+    # CPU-bound: off the event loop, which db.run may share in async mode
+    stats = await run_in_threadpool(distribution.summarize, cols, first, last, bins, scale)
+
+    return await cache.store({"from": first.isoformat(), "to": last.isoformat(), "tz": tz, **stats})
@@ -0,0 +1,125 @@
+import zlib
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.session import Database
+from app.db.shards import get_db
+from app.db import jobs, queries
+from app.core.security import get_current_user_id
+from app.core.limits import rate_limit
+from app.core.settings import settings
+from app.core.timing import TimedRoute
+import app.models as models
+from app.schemas.job import JobCreate, JobOut
+
+router = APIRouter(prefix="/jobs", tags=["jobs"], route_class=TimedRoute)
+
+READ, WRITE = (Depends(rate_limit(b)) for b in ("read", "write"))
+
+def _out(job: models.Job) -> JobOut:
+    out = JobOut.model_validate(job)
+    if job.status == "succeeded" and job.result_type is not None:
+        out.result_url = f"/jobs/{job.id}/result"
+    return out
+
+def _check_params(payload: JobCreate):
+    # what pydantic can't: the zone and month are checked here, not when the job runs
+    try:
+        queries.zone(payload.params.get("tz", queries.UTC))
+        if payload.params.get("month"):
+            queries.parse_month(payload.params["month"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED, dependencies=[WRITE])
+async def create_job(
+    payload: JobCreate,
+    response: Response,
+    db: Database = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+):
+    _check_params(payload)
+
+    def work(session: Session):
+        if jobs.active_count(session, user_id) >= settings.JOB_MAX_ACTIVE:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"At most {settings.JOB_MAX_ACTIVE} jobs may be queued or running",
+                headers={"Retry-After": str(int(settings.JOB_POLL_INTERVAL))},
+            )
+        job = jobs.enqueue(session, user_id, payload.kind, payload.params)
+        session.commit()
+        session.refresh(job)
+        return _out(job)
+
+    out = await db.run(work)
+    response.headers["Location"] = f"/jobs/{out.id}"
+    return out
+
+@router.get("", response_model=list[JobOut], dependencies=[READ])
+async def list_jobs(
+    db: Database = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+    limit: int = Query(20, ge=1, le=100),
+):
+    J = models.Job
+    stmt = select(J).where(J.user_id == user_id).order_by(J.created_at.desc()).limit(limit)
+    return await db.run(lambda s: [_out(j) for j in s.scalars(stmt)])
+
+def _get(session: Session, user_id: int, job_id: int, *options) -> models.Job:
+    job = session.get(models.Job, job_id, options=options)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}", response_model=JobOut, dependencies=[READ])
+async def get_job(
+    job_id: int,
+    db: Database = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+):
+    return await db.run(lambda s: _out(_get(s, user_id, job_id)))
+
+@router.get("/{job_id}/result", dependencies=[READ])
+async def get_job_result(
+    job_id: int,
+    request: Request,
+    db: Database = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+):
+    def work(session: Session):
+        job = _get(session, user_id, job_id)
+        if job.status != "succeeded":
+            raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+        if job.expires_at <= datetime.now(timezone.utc):
+            raise HTTPException(status_code=410, detail="Job result has expired")
+        if job.result_type is None:
+            raise HTTPException(status_code=404, detail="Job has no result")
+        return job.result_type, job.result_name
+
+    media_type, filename = await db.run(work)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Vary": "Accept-Encoding"}
+    # stored gzipped: sent as is to clients that accept it, inflated for the rest
+    gzipped = "gzip" in request.headers.get("accept-encoding", "")
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+
+    # a chunk at a time from a server-side cursor
+    async def body():
+        inflate = None if gzipped else zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        async for rows in db.stream(jobs.result_chunks(job_id), 1):
+            for (data,) in rows:
+                if inflate is None:
+                    yield data
+                    continue
+                while data:  # inflated in bounded pieces, however well the chunk compressed
+                    out = inflate.decompress(data, jobs.RESULT_CHUNK_BYTES)
+                    data = inflate.unconsumed_tail
+                    yield out
+        if inflate is not None:
+            yield inflate.flush()
+
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
@@ -0,0 +1,99 @@
+import asyncio, contextlib, time
+from datetime import timedelta
+from fastapi import APIRouter, Depends, Query, WebSocket, status
+from jwt import InvalidTokenError
+from sqlalchemy.orm import Session
+
+from app.db.session import Database
+from app.db.shards import get_db
+from app.db import analytics, live, queries
+from app.core import serialize
+from app.core.security import resolve_principal, verify_token
+from app.core.settings import settings
+
+router = APIRouter(prefix="/ws", tags=["live"])
+
+def _snapshot(session: Session, user_id: int, tz: str, days: int):
+    """The bodies of /expenses/summary and /expenses/trend, read in one Postgres snapshot."""
+    session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    try:
+        summary = analytics.period_stats(session, user_id, None, None, tz=tz)
+        end = queries.today(tz) + timedelta(days=1)
+        trend = analytics.period_stats(session, user_id, end - timedelta(days=days + 1), end,
+                                       granularity="day", tz=tz)
+        snapshot = live.current_snapshot(session)
+    finally:
+        session.rollback()
+    return {
+        "type": "snapshot",
+        "summary": {"month": None, "total_spent": summary.current.total, "count": summary.current.count,
+                    "by_category": {c: t for c, (t, _) in summary.current.by_category.items()}},
+        "trend": [{"date": d, "total": t} for d, t in trend.series],
+    }, snapshot
+
+async def _send(websocket: WebSocket, message: dict):
+    await asyncio.wait_for(websocket.send_text(serialize.dumps(message).decode()), settings.LIVE_SEND_TIMEOUT)
+    live.MESSAGES.inc(type=message["type"])
+
+async def _drain(websocket: WebSocket):
+    # clients have nothing to say; reading is how a disconnect is noticed
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+@router.websocket("/expenses")
+async def expenses_live(
+    websocket: WebSocket,
+    db: Database = Depends(get_db),
+    tz: str = Query(queries.UTC),
+    days: int = Query(30, ge=1, le=365),
+    token: str | None = Query(None, description="For clients that can't send an Authorization header"),
+):
+    principal = resolve_principal(websocket, token)
+    if principal is None:
+        return await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or expired token")
+    if token is None:
+        token = websocket.headers["authorization"].partition(" ")[2]
+    try:
+        queries.zone(tz)
+    except ValueError as e:
+        return await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+
+    await websocket.accept()
+    refused = live.hub.refuse(principal.user_id)
+    if refused:
+        return await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=refused)
+
+    sub = live.hub.subscribe(principal.user_id, tz)
+    reader = asyncio.create_task(_drain(websocket))
+    recheck = time.monotonic() + settings.LIVE_AUTH_INTERVAL
+    try:
+        while True:
+            if sub.stale:
+                sub.reset()
+                message, sub.snapshot = await db.run(_snapshot, principal.user_id, tz, days)
+            else:
+                message = sub.take()
+            if message is not None:
+                await _send(websocket, message)
+
+            woken = asyncio.create_task(sub.wake.wait())
+            done, _ = await asyncio.wait({woken, reader}, timeout=max(recheck - time.monotonic(), 0),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            if reader in done:
+                return
+            if time.monotonic() >= recheck:  # tokens expire or get revoked while connected
+                try:
+                    verify_token(token)
+                except InvalidTokenError:
+                    return await websocket.close(code=status.WS_1008_POLICY_VIOLATION,
+                                                 reason="Invalid or expired token")
+                recheck = time.monotonic() + settings.LIVE_AUTH_INTERVAL
+    except asyncio.TimeoutError:
+        # not reading: the socket buffers are full, so even the close frame may not fit
+        with contextlib.suppress(Exception):
+            await asyncio.wait_for(websocket.close(code=status.WS_1008_POLICY_VIOLATION,
+                                                   reason="Client is not reading"), settings.LIVE_SEND_TIMEOUT)
+    finally:
+        live.hub.unsubscribe(sub)
+        reader.cancel()
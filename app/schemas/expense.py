@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+from typing import Literal, Optional
 from datetime import datetime
 
 
@@ -13,6 +13,22 @@ class ExpenseCreate(ExpenseBase):
     pass
 
 
+class ExpenseImportRow(ExpenseCreate):
+    created_at: Optional[datetime] = None
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[ImportRowError]
+    errors_truncated: bool = False
+
+
 class ExpenseOut(ExpenseBase):
     id: int
     user_id: int
@@ -28,3 +44,42 @@ class ExpensePage(BaseModel):
     page_size: int
 
     model_config = ConfigDict(from_attributes=True)
+
+
+BATCH_MAX_ITEMS = 1000
+
+
+class ExpenseUpdateItem(ExpenseCreate):
+    id: int
+
+
+class ExpenseBatch(BaseModel):
+    create: list[ExpenseCreate] = Field(default_factory=list)
+    update: list[ExpenseUpdateItem] = Field(default_factory=list)
+    delete: list[int] = Field(default_factory=list)
+
+    @model_validator(mode="after")
+    def _check(self):
+        if len(self.create) + len(self.update) + len(self.delete) > BATCH_MAX_ITEMS:
+            raise ValueError(f"at most {BATCH_MAX_ITEMS} items per batch")
+        ids = [u.id for u in self.update] + self.delete
+        if len(ids) != len(set(ids)):
+            raise ValueError("an id may appear only once across update and delete")
+        return self
+
+
+class BatchItemResult(BaseModel):
+    op: Literal["create", "update", "delete"]
+    index: int
+    status: int
+    id: Optional[int] = None
+    expense: Optional[ExpenseOut] = None
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    created: int
+    updated: int
+    deleted: int
+    failed: int
+    results: list[BatchItemResult]
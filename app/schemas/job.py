@@ -0,0 +1,65 @@
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Literal, Optional
+from datetime import datetime
+
+
+class ExportParams(BaseModel):
+    """The filters of ``GET /expenses/export``."""
+    format: Literal["csv", "ndjson"] = "csv"
+    category: Optional[str] = None
+    q: Optional[str] = None
+    match: Literal["contains", "prefix", "phrase", "words"] = "contains"
+    min_amount: Optional[float] = Field(default=None, ge=0)
+    max_amount: Optional[float] = Field(default=None, ge=0)
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    month: Optional[str] = None
+    tz: str = "UTC"
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class ReportParams(BaseModel):
+    """Year-over-year report; ``year`` defaults to the current one in ``tz``."""
+    year: Optional[int] = Field(default=None, ge=1971, le=3000)
+    tz: str = "UTC"
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class RebuildParams(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+
+JOB_PARAMS = {"export": ExportParams, "yoy_report": ReportParams, "rollup_rebuild": RebuildParams}
+
+
+class JobCreate(BaseModel):
+    kind: Literal["export", "yoy_report", "rollup_rebuild"]
+    params: dict = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def _check(self):
+        self.params = JOB_PARAMS[self.kind].model_validate(self.params).model_dump(mode="json")
+        return self
+
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    params: dict
+    status: Literal["queued", "running", "succeeded", "failed"]
+    progress: float
+    message: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    result_type: Optional[str] = None
+    result_size: Optional[int] = None
+    result_url: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,12 +1,15 @@
 from pydantic import BaseModel
-from typing import Generic, TypeVar, List
+from typing import Generic, TypeVar, List, Optional
 
 T = TypeVar("T")
 
 class PageMeta(BaseModel):
-    total: int
+    total: Optional[int] = None
+    total_is_estimate: bool = False
     limit: int
     offset: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 class Page(BaseModel, Generic[T]):
     items: List[T]
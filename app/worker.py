@@ -0,0 +1,168 @@
+"""Job worker: ``python -m app.worker``.
+
+    python -m app.worker                  # JOB_WORKERS processes
+    python -m app.worker --processes 4
+    python -m app.worker --burst          # run what is runnable now, then exit
+
+A supervisor starts the worker processes and restarts any that die. Each
+process claims one job at a time (see ``app.db.jobs``), heartbeats it from a
+thread and sleeps on ``LISTEN jobs`` between jobs, so a new job starts at
+once. With user shards it claims from each shard in turn and listens on all
+of them. It also polls every ``JOB_POLL_INTERVAL`` seconds, which picks up
+retries whose backoff has passed. SIGTERM or Ctrl-C lets running jobs finish,
+then exits.
+"""
+import argparse, logging, multiprocessing, os, select, signal, socket, sys, threading, time
+
+log = logging.getLogger("app.worker")
+
+def _listen(engine):
+    """A raw connection LISTENing on the jobs channel, or None to just poll."""
+    from app.db.jobs import CHANNEL
+    if engine.dialect.driver != "psycopg2":
+        return None
+    raw = engine.raw_connection()
+    conn = raw.driver_connection
+    raw.detach()  # kept for the life of the process, never returned to the pool
+    conn.autocommit = True
+    conn.cursor().execute(f"LISTEN {CHANNEL}")
+    return conn
+
+def _wait(conns: list, timeout: float, stop):
+    """Until a notification on any of ``conns``, ``timeout`` or ``stop``."""
+    deadline = time.monotonic() + timeout
+    while not stop.is_set() and (left := deadline - time.monotonic()) > 0:
+        if not conns:
+            time.sleep(min(left, 1.0))
+            continue
+        ready = select.select(conns, [], [], min(left, 1.0))[0]
+        for conn in ready:
+            conn.poll()
+        if any(conn.notifies for conn in ready):
+            for conn in ready:
+                conn.notifies.clear()
+            return
+
+def _run(name: str, job, shard):
+    from app.core.settings import settings
+    from app.db import jobs
+    from app.db.shards import WrongShard
+
+    ctx = jobs.JobContext(id=job.id, user_id=job.user_id, params=job.params, attempt=job.attempts)
+    done = threading.Event()
+
+    def beat():
+        with shard.session() as db:
+            while not done.wait(settings.JOB_HEARTBEAT_INTERVAL):
+                if not jobs.heartbeat(db, ctx, name):
+                    log.warning("job %d is no longer ours", ctx.id)
+                    return
+
+    beater = threading.Thread(target=beat, name=f"heartbeat-{ctx.id}", daemon=True)
+    beater.start()
+    t0 = time.perf_counter()
+    error = retry = None
+    with shard.session(job.user_id) as db:
+        try:
+            try:
+                fn = jobs.HANDLERS.get(job.kind)
+                if fn is None:
+                    raise jobs.JobError(f"unknown job kind {job.kind!r}")
+                fn(db, ctx)
+            except jobs.JobError as e:
+                error, retry = str(e), False
+            except WrongShard:
+                raise
+            except Exception as e:
+                log.exception("job %d (%s) failed", ctx.id, job.kind)
+                error, retry = f"{type(e).__name__}: {e}", True
+            finally:
+                done.set()
+                beater.join()
+            db.rollback()
+            if error is None:
+                outcome = "succeeded" if jobs.succeed(db, ctx, name) else "lost"
+            else:
+                outcome = jobs.fail(db, ctx, name, error, retry) or "lost"
+        except WrongShard:
+            # its copy on the user's new shard is still "running"; reap requeues it there
+            outcome = "user moved to another shard"
+    log.info("job %d (%s) attempt %d: %s in %.2f s", ctx.id, job.kind, ctx.attempt, outcome,
+             time.perf_counter() - t0)
+
+def work(index: int, stop, burst: bool):
+    """One worker process: claim and run jobs until ``stop`` (or, with ``burst``, none are left)."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s worker-{index} %(levelname)s %(message)s")
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when to stop
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    from app.core.settings import settings
+    from app.db import jobs
+    from app.db.shards import cluster
+
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    listeners = [c for c in map(_listen, (s.engine for s in cluster)) if c is not None]
+    housekeeping = 0.0
+    while not stop.is_set():
+        ran = False
+        tidy = time.monotonic() - housekeeping > settings.JOB_LEASE_SECONDS / 2
+        for shard in cluster:  # a job from each shard in turn, so none starves
+            with shard.session() as db:
+                if tidy:
+                    reaped, purged = jobs.reap(db), jobs.purge(db)
+                    if reaped or purged:
+                        log.info("requeued or failed %d stalled jobs, purged %d expired (shard %d)",
+                                 reaped, purged, shard.index)
+                job = jobs.claim(db, name)
+            if job is not None:
+                _run(name, job, shard)
+                ran = True
+            if stop.is_set():
+                break
+        if tidy:
+            housekeeping = time.monotonic()
+        if ran:
+            continue
+        if burst:
+            break
+        _wait(listeners, settings.JOB_POLL_INTERVAL, stop)
+
+def main(argv=None):
+    from app.core.settings import settings
+
+    parser = argparse.ArgumentParser(prog="python -m app.worker")
+    parser.add_argument("--processes", type=int, default=settings.JOB_WORKERS)
+    parser.add_argument("--burst", action="store_true", help="exit once no job is runnable")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s supervisor %(levelname)s %(message)s")
+
+    from app.db.session import require_database
+    require_database()
+
+    # spawn, not fork: each process builds its own engine and connections
+    mp = multiprocessing.get_context("spawn")
+    stop = mp.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    def start(i):
+        p = mp.Process(target=work, args=(i, stop, args.burst), name=f"worker-{i}")
+        p.start()
+        return p
+
+    procs = {i: start(i) for i in range(args.processes)}
+    log.info("started %d worker processes", len(procs))
+    while procs:
+        for i, p in list(procs.items()):
+            p.join(timeout=0.5 / len(procs))
+            if p.is_alive():
+                continue
+            del procs[i]
+            if p.exitcode != 0 and not stop.is_set() and not args.burst:
+                log.warning("worker-%d exited with %s; restarting", i, p.exitcode)
+                time.sleep(1)
+                procs[i] = start(i)
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
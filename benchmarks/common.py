@@ -0,0 +1,45 @@
+"""Helpers shared by the benchmark scripts: a throwaway uvicorn server and percentiles."""
+import asyncio, os, statistics, subprocess, sys, time
+from contextlib import contextmanager
+import httpx
+
+async def wait_ready(base: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base) as c:
+        while time.monotonic() < deadline:
+            try:
+                if (await c.get("/openapi.json")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base} did not start")
+
+@contextmanager
+def server(port: int, workers: int = 1, **env):
+    """Run ``app.main:app`` under uvicorn on ``port`` with extra environment variables."""
+    base = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        # scratch databases get their schema on first start; one client drives every
+        # synthetic user from one IP, so per-client rate limits are off unless asked for
+        env={"DB_SCHEMA": "create", "RATE_LIMIT_BACKEND": "none", **os.environ, **env},
+    )
+    try:
+        asyncio.run(wait_ready(base))
+        yield base
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    """p50/p95/p99 and mean in milliseconds."""
+    if not latencies:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0}
+    if len(latencies) == 1:
+        v = latencies[0] * 1000
+        return {"p50": v, "p95": v, "p99": v, "mean": v}
+    q = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": q[49] * 1000, "p95": q[94] * 1000, "p99": q[98] * 1000,
+            "mean": statistics.fmean(latencies) * 1000}
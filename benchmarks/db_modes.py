@@ -0,0 +1,76 @@
+"""Compare the sync (threadpool) and async (AsyncEngine) DB modes under the same load.
+
+Starts one uvicorn process per mode against DATABASE_URL, seeds a user, then
+hammers the same mix of read endpoints from N concurrent clients:
+
+    python -m benchmarks.db_modes --concurrency 200 --duration 20
+"""
+import argparse, asyncio, time, uuid
+import httpx
+
+from benchmarks.common import percentiles, server
+
+PATHS = [
+    "/expenses/?limit=50&total=none",
+    "/expenses/stats/summary?month={month}",
+    "/expenses/trend?days=30",
+]
+
+async def _token(c: httpx.AsyncClient, email: str, seed: int) -> str:
+    await c.post("/auth/register", json={"email": email, "password": "benchmark-pass"})
+    r = await c.post("/auth/login", data={"username": email, "password": "benchmark-pass"})
+    token = r.json()["access_token"]
+    h = {"Authorization": f"Bearer {token}"}
+    for i in range(seed):
+        await c.post("/expenses/", headers=h,
+                     json={"category": f"cat{i % 8}", "amount": 1 + i % 50, "note": f"seed {i}"})
+    return token
+
+async def _load(base: str, token: str, concurrency: int, duration: float) -> list[float]:
+    latencies: list[float] = []
+    month = time.strftime("%Y-%m")
+    paths = [p.format(month=month) for p in PATHS]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60,
+                                 headers={"Authorization": f"Bearer {token}"}) as c:
+        deadline = time.monotonic() + duration
+
+        async def worker(n: int):
+            i = n
+            while time.monotonic() < deadline:
+                t0 = time.perf_counter()
+                r = await c.get(paths[i % len(paths)])
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - t0)
+                i += 1
+
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return latencies
+
+def _report(mode: str, latencies: list[float], duration: float):
+    p = percentiles(latencies)
+    print(f"{mode:>5}  {len(latencies) / duration:9.1f} req/s  "
+          f"p50 {p['p50']:7.1f} ms  p95 {p['p95']:7.1f} ms  p99 {p['p99']:7.1f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.db_modes")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--seed-rows", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    token = None
+    for mode in ("sync", "async"):
+        with server(args.port, DB_ASYNC="1" if mode == "async" else "0") as base:
+            if token is None:
+                async def seed():
+                    async with httpx.AsyncClient(base_url=base, timeout=60) as c:
+                        return await _token(c, email, args.seed_rows)
+                token = asyncio.run(seed())
+            latencies = asyncio.run(_load(base, token, args.concurrency, args.duration))
+            _report(mode, latencies, args.duration)
+
+if __name__ == "__main__":
+    main()
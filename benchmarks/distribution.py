@@ -0,0 +1,158 @@
+"""/expenses/stats/distribution: NumPy over column arrays vs the same statistics in SQL.
+
+    python -m benchmarks.distribution                        # seed.email(0), last 365 days
+    python -m benchmarks.distribution --email heavy@example.com --days 3650 --iterations 10
+
+"numpy" is the endpoint's path: ``distribution.load`` (one query) then
+``distribution.summarize``. "sql" computes the same numbers in Postgres with
+``percentile_cont``, ``width_bucket`` and window functions. That takes four
+statements, each of which scans the user's rows again. Both are run against
+DATABASE_URL. The results are compared, and the script exits 1 if they
+disagree. The SQL reads ``expenses`` only, so keep ``--days`` short of the
+archive horizon.
+"""
+import argparse, math, statistics, sys, time
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from app.db import distribution, queries
+from app.db.session import SessionLocal, require_database
+from benchmarks import seed
+
+_ROWS = """
+    SELECT id, category, amount, (created_at AT TIME ZONE :tz)::date AS day
+    FROM expenses WHERE user_id = :user_id AND created_at >= :start AND created_at < :end
+"""
+_QS = ", ".join(str(p / 100) for p in distribution.PERCENTILES)
+
+OVERALL_SQL = text(f"""
+    WITH e AS ({_ROWS})
+    SELECT count(*), coalesce(sum(amount), 0), avg(amount), stddev_pop(amount), min(amount), max(amount),
+           percentile_cont(ARRAY[{_QS}]) WITHIN GROUP (ORDER BY amount)
+    FROM e
+""")
+
+HISTOGRAM_SQL = text(f"""
+    WITH e AS ({_ROWS}), b AS (SELECT min(amount) AS lo, max(amount) AS hi FROM e)
+    SELECT least(CASE WHEN :log THEN width_bucket(ln(amount), ln(lo), ln(hi), :bins)
+                      ELSE width_bucket(amount, lo, hi, :bins) END, :bins) AS bucket,
+           count(*), sum(amount)
+    FROM e, b WHERE hi > lo GROUP BY 1 ORDER BY 1
+""")
+
+CATEGORY_SQL = text(f"""
+    WITH e AS ({_ROWS}),
+    c AS (
+        SELECT category, count(*) AS n, sum(amount) AS total, avg(amount) AS mean,
+               stddev_pop(amount) AS std,
+               percentile_cont(ARRAY[0.25, 0.5, 0.75, 0.9]) WITHIN GROUP (ORDER BY amount) AS q
+        FROM e GROUP BY category
+    ),
+    f AS (SELECT *, q[3] + 1.5 * (q[3] - q[1]) AS above, q[1] - 1.5 * (q[3] - q[1]) AS below FROM c),
+    o AS (
+        SELECT e.category, e.amount, e.amount > f.above AS high,
+               row_number() OVER (PARTITION BY e.category, e.amount > f.above ORDER BY e.amount DESC) AS r
+        FROM e JOIN f USING (category) WHERE e.amount > f.above OR e.amount < f.below
+    )
+    SELECT f.category, f.n, f.total, f.mean, f.std, f.q, f.above, f.below,
+           (SELECT count(*) FROM o WHERE o.category = f.category),
+           (SELECT array_agg(amount ORDER BY r) FROM o WHERE o.category = f.category AND high AND r <= :top)
+    FROM f ORDER BY f.total DESC
+""")
+
+DAILY_SQL = text(f"""
+    WITH e AS ({_ROWS}),
+    d AS (SELECT day, sum(amount) AS total, count(*) AS n FROM e GROUP BY day),
+    s AS (
+        SELECT g::date AS day, coalesce(d.total, 0) AS total, coalesce(d.n, 0) AS n
+        FROM generate_series(CAST(:first AS date), CAST(:last AS date), interval '1 day') g
+        LEFT JOIN d ON d.day = g::date
+    )
+    SELECT day, total, n, avg(total) OVER (ORDER BY day ROWS 6 PRECEDING),
+           avg(total) OVER (ORDER BY day ROWS 29 PRECEDING)
+    FROM s ORDER BY day
+""")
+
+def numpy_path(db, user_id, period, tz, first, last, bins, scale):
+    t0 = time.perf_counter()
+    cols = distribution.load(db, user_id, period, tz)
+    t1 = time.perf_counter()
+    out = distribution.summarize(cols, first, last, bins, scale)
+    return out, t1 - t0, time.perf_counter() - t1
+
+def sql_path(db, user_id, period, tz, first, last, bins, scale) -> dict:
+    p = {"user_id": user_id, "start": period.start, "end": period.end, "tz": tz, "bins": bins,
+         "log": scale == "log", "top": distribution.TOP_OUTLIERS, "first": first, "last": last}
+    n, total, mean, std, lo, hi, pct = db.execute(OVERALL_SQL, p).one()
+    out = {"count": n, "total": float(total),
+           "amount": n and {"mean": mean, "std": std, "min": lo, "max": hi,
+                            "percentiles": {f"p{q}": v for q, v in zip(distribution.PERCENTILES, pct)}}}
+    counts, totals = [0] * bins, [0.0] * bins
+    for bucket, k, t in db.execute(HISTOGRAM_SQL, p):
+        counts[bucket - 1], totals[bucket - 1] = k, t
+    out["histogram"] = {"counts": counts, "totals": totals}
+    out["by_category"] = [
+        {"category": c, "count": k, "total": t, "mean": m, "std": s, "q1": q[0], "median": q[1],
+         "q3": q[2], "p90": q[3], "outlier_above": a, "outlier_below": b, "outliers": o,
+         "top_outliers": [{"amount": x} for x in top or []]}
+        for c, k, t, m, s, q, a, b, o, top in db.execute(CATEGORY_SQL, p)]
+    out["daily"] = [{"date": d.isoformat(), "total": float(t), "count": k, "avg_7d": float(a7), "avg_30d": float(a30)}
+                    for d, t, k, a7, a30 in db.execute(DAILY_SQL, p)]
+    return out
+
+def diff(a, b, path="") -> list[str]:
+    """Paths where ``b`` disagrees with ``a``, for the keys ``b`` has."""
+    if isinstance(b, dict):
+        return [d for k in b for d in diff(a.get(k) if isinstance(a, dict) else None, b[k], f"{path}.{k}")]
+    if isinstance(b, list):
+        if not isinstance(a, list) or len(a) != len(b):
+            return [f"{path}: length {len(a) if isinstance(a, list) else a} != {len(b)}"]
+        return [d for i, (x, y) in enumerate(zip(a, b)) for d in diff(x, y, f"{path}[{i}]")]
+    if isinstance(b, (int, float)) and isinstance(a, (int, float)):
+        return [] if math.isclose(a, float(b), rel_tol=1e-9, abs_tol=1e-6) else [f"{path}: {a} != {b}"]
+    return [] if a == b else [f"{path}: {a!r} != {b!r}"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.distribution")
+    parser.add_argument("--email", default=seed.email(0))
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--tz", default=queries.UTC)
+    parser.add_argument("--bins", type=int, default=20)
+    parser.add_argument("--scale", choices=("log", "linear"), default="log")
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args(argv)
+    require_database()
+
+    last = queries.today(args.tz)
+    first = last - timedelta(days=args.days - 1)
+    period = queries.Range.days(first, last + timedelta(days=1), args.tz)
+    with SessionLocal() as db:
+        user_id = db.execute(text("SELECT id FROM users WHERE email = :e"), {"e": args.email}).scalar()
+        if user_id is None:
+            sys.exit(f"no user {args.email}; seed one with python -m benchmarks.seed")
+        call = (db, user_id, period, args.tz, first, last, args.bins, args.scale)
+
+        ours, *_ = numpy_path(*call)  # warm up both, and check they agree
+        problems = diff(ours, sql_path(*call))
+        loads, computes, sqls = [], [], []
+        for _ in range(args.iterations):
+            _, load_s, compute_s = numpy_path(*call)
+            loads.append(load_s)
+            computes.append(compute_s)
+            t0 = time.perf_counter()
+            sql_path(*call)
+            sqls.append(time.perf_counter() - t0)
+
+    ms = lambda xs: statistics.median(xs) * 1000
+    print(f"{ours['count']} rows, {len(ours['by_category'])} categories, {args.days} days, "
+          f"median of {args.iterations}" + (" (truncated to DISTRIBUTION_MAX_ROWS)" if ours["truncated"] else ""))
+    print(f"  numpy  {ms(loads) + ms(computes):9.1f} ms  (load {ms(loads):.1f} ms, compute {ms(computes):.1f} ms)")
+    print(f"  sql    {ms(sqls):9.1f} ms")
+    print(f"speedup {ms(sqls) / (ms(loads) + ms(computes)):.1f}x")
+    for p in problems[:20]:
+        print(f"MISMATCH {p}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""EXPLAIN the queries behind each read endpoint and check that they use the indexes.
+
+    python -m benchmarks.explain                       # as seed.email(0)
+    python -m benchmarks.explain --email me@example.com --verbose
+
+Calls the list, export and analytics routes in-process, captures every
+statement they send to ``expenses``, its archive or the rollup tables, and EXPLAINs it
+against the primary with sequential scans disabled. A small database then still
+shows which indexes a query *can* use. A statement fails the check if
+- it scans one of those tables without an index, or only with indexes that
+  don't lead with ``user_id`` (empty partitions aside: any plan is fine there);
+- it has a period filter but scans more expense partitions than that period
+  overlaps (plus the default partition).
+
+Exits 1 if any check fails.
+"""
+import argparse, json, os, sys
+from datetime import date
+
+# captured statements are EXPLAINed with the sync driver's parameters; no caching
+# or replicas, so every request reaches the primary
+os.environ.update(DB_ASYNC="false", RESPONSE_CACHE_BACKEND="none", RATE_LIMIT_BACKEND="none", DB_REPLICA_URLS="",
+                  DB_SCHEMA="off", WARMUP_REQUESTS="false")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.main import app
+from app.core.security import create_token
+from app.db import queries
+from app.db.session import engine, require_database
+from benchmarks import seed
+
+TABLES = ("expenses", "expenses_archive", "expense_rollups_daily", "expense_rollups_monthly")
+INDEX_SCANS = ("Index Scan", "Index Only Scan", "Bitmap Heap Scan")
+
+# parent table of each partition, parent index of each partition index, whether
+# each index's first column is user_id, and whether the relation has rows
+CATALOG_SQL = text("""
+    SELECT c.relname, coalesce(p.relname, c.relname),
+           c.relkind = 'i' AND a.attname = 'user_id', c.reltuples > 0
+    FROM pg_class c
+    LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+    LEFT JOIN pg_class p ON p.oid = i.inhparent
+    LEFT JOIN pg_index x ON x.indexrelid = c.oid
+    LEFT JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+    WHERE c.relnamespace = 'public'::regnamespace AND c.relkind IN ('r', 'p', 'i', 'I')
+""")
+
+def cases(today: date) -> list[tuple[str, int | None]]:
+    """(path, expense partitions the period may touch); ``None`` when unbounded."""
+    month, year = f"{today:%Y-%m}", today.year
+    return [
+        ("/expenses/?total=exact", None),
+        ("/expenses/?total=estimate&sort=amount", None),
+        ("/expenses/?category=food&total=exact", None),
+        (f"/expenses/?month={month}", 2),
+        (f"/expenses/?month={month}&tz=America/New_York", 3),  # a local month spans two UTC months
+        (f"/expenses/?month={month}&category=food&sort=amount", 2),
+        (f"/expenses/?month={month}&q=coffee", 2),
+        (f"/expenses/export?month={month}", 2),
+        ("/expenses/summary", None),
+        (f"/expenses/summary?month={month}", None),
+        ("/expenses/trend", None),
+        ("/expenses/trend?days=7&tz=Asia/Tokyo", 3),
+        ("/expenses/dashboard", None),
+        ("/expenses/dashboard?tz=Europe/Berlin", 4),
+        (f"/expenses/stats/summary?month={month}", None),
+        (f"/expenses/stats/summary?month={month}&tz=America/Los_Angeles", 3),
+        (f"/expenses/stats/by-month?year={year}", None),
+        (f"/expenses/stats/by-month?year={year}&tz=Australia/Sydney", 14),
+    ]
+
+def _scans(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _scans(child)
+
+def _indexes(node: dict):
+    if "Index Name" in node:
+        yield node["Index Name"]
+    for child in node.get("Plans", ()):
+        yield from _indexes(child)
+
+def check(plan: dict, catalog: dict, max_partitions: int | None) -> list[str]:
+    problems, partitions = [], set()
+    for node in _scans(plan):
+        rel = node.get("Relation Name")
+        if rel is None or catalog.get(rel, (rel,))[0] not in TABLES:
+            continue
+        if catalog[rel][0] == "expenses":
+            partitions.add(rel)
+        if not catalog[rel][2]:
+            continue
+        if node["Node Type"] not in INDEX_SCANS:
+            problems.append(f"{node['Node Type']} on {rel}")
+            continue
+        used = list(_indexes(node))
+        if not any(catalog.get(ix, (None, False))[1] for ix in used):
+            names = ", ".join(catalog.get(ix, (ix,))[0] for ix in used)
+            problems.append(f"{rel} read via {names}, not a (user_id, ...) index")
+    if max_partitions is not None and len(partitions) > max_partitions:
+        problems.append(f"{len(partitions)} expense partitions scanned, expected <= {max_partitions}")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.explain")
+    parser.add_argument("--email", default=seed.email(0), help="user whose data the queries read")
+    parser.add_argument("--verbose", action="store_true", help="print each plan")
+    args = parser.parse_args(argv)
+    require_database()
+
+    with engine.connect() as conn:
+        user_id = conn.execute(text("SELECT id FROM users WHERE email = :e"), {"e": args.email}).scalar()
+        catalog = {name: (parent, leads, rows) for name, parent, leads, rows in conn.execute(CATALOG_SQL)}
+    if user_id is None:
+        sys.exit(f"no user {args.email}; seed one with python -m benchmarks.seed")
+    # partition indexes are reported under their own names; judge them by the parent's
+    catalog = {name: (catalog.get(parent, (parent,))[0] if parent != name else name, leads, rows)
+               for name, (parent, leads, rows) in catalog.items()}
+
+    captured: list = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and any(t in statement for t in TABLES):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    headers = {"Authorization": f"Bearer {create_token(user_id)}"}
+    failures = 0
+    # not entered as a context manager: the lifespan's pool prewarm and warmup aren't wanted here
+    client = TestClient(app, headers=headers)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        for path, max_partitions in cases(queries.today()):
+            captured.clear()
+            r = client.get(path)
+            if r.status_code != 200:
+                print(f"FAIL {path}: HTTP {r.status_code} {r.text[:200]}")
+                failures += 1
+                continue
+            for statement, params in list(captured):
+                plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, params).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                problems = check(plan[0]["Plan"], catalog, max_partitions)
+                first_line = " ".join(statement.split())[:90]
+                print(f"{'FAIL' if problems else 'ok  '} {path}  [{first_line}...]")
+                for p in problems:
+                    print(f"       {p}")
+                if args.verbose:
+                    print(json.dumps(plan[0]["Plan"], indent=1))
+                failures += bool(problems)
+            if not captured:
+                print(f"ok   {path}  (no table reads)")
+    event.remove(engine, "before_cursor_execute", capture)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""How /ws/expenses holds up as connections grow: connect time, delivery latency, memory.
+
+    python -m benchmarks.seed --users 20 --reset
+    python -m benchmarks.live --users 20 --connections 100,1000,5000
+    python -m benchmarks.live --users 20 --connections 2000 --workers 4 --env DB_ASYNC=1
+
+For each step it opens that many connections, spread round-robin over the
+seeded users, and times each one until its snapshot arrives. It then makes
+``--writes`` single-expense creates, one at a time and for random users. For
+each create it times from the POST to the delta reaching every connection of
+that user. The server's resident memory is reported when this script started
+the server (Linux only). Created expenses are deleted again.
+"""
+import argparse, asyncio, json, os, random, resource, time
+import httpx, websockets
+
+from benchmarks import seed
+from benchmarks.common import percentiles, server
+
+CONNECT_CONCURRENCY = 100
+
+async def _tokens(c: httpx.AsyncClient, users: int) -> list[str]:
+    gate = asyncio.Semaphore(4)  # argon2 logins; stay under the hashing pool's queue
+
+    async def one(i: int) -> str:
+        async with gate:
+            r = await c.post("/auth/login", data={"username": seed.email(i), "password": seed.PASSWORD})
+        if r.status_code != 200:
+            raise SystemExit(f"login failed for {seed.email(i)}; run python -m benchmarks.seed first")
+        return r.json()["access_token"]
+
+    return list(await asyncio.gather(*(one(i) for i in range(users))))
+
+def _server_rss() -> int | None:
+    """Resident bytes of this process's descendants (the uvicorn server and its workers)."""
+    try:
+        procs = {}
+        for pid in filter(str.isdigit, os.listdir("/proc")):
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rpartition(")")[2].split()
+            procs[int(pid)] = (int(fields[1]), int(fields[21]))  # ppid, rss pages
+    except OSError:
+        return None
+    ours, total, grew = {os.getpid()}, 0, True
+    while grew:
+        grew = False
+        for pid, (ppid, rss) in procs.items():
+            if ppid in ours and pid not in ours:
+                ours.add(pid)
+                total += rss * os.sysconf("SC_PAGE_SIZE")
+                grew = True
+    return total
+
+async def step(base: str, tokens: list[str], n: int, writes: int, rng: random.Random) -> dict:
+    ws_base = base.replace("http", "ws", 1) + "/ws/expenses"
+    gate = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    conns: dict[int, list] = {u: [] for u in range(len(tokens))}
+    connect_s = []
+    waiting: dict[object, asyncio.Future] = {}
+
+    async def reader(ws):
+        async for raw in ws:
+            fut = waiting.get(ws)
+            if fut is not None and not fut.done() and json.loads(raw)["type"] == "delta":
+                fut.set_result(time.perf_counter())
+
+    async def connect(i: int):
+        user = i % len(tokens)
+        async with gate:
+            t0 = time.perf_counter()
+            ws = await websockets.connect(ws_base, additional_headers={"Authorization": f"Bearer {tokens[user]}"},
+                                          max_queue=None, open_timeout=60)
+            json.loads(await ws.recv())  # the snapshot
+            connect_s.append(time.perf_counter() - t0)
+        conns[user].append((ws, asyncio.create_task(reader(ws))))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(connect(i) for i in range(n)))
+    connect_wall = time.perf_counter() - t0
+    rss = _server_rss()
+
+    delivery_s, created = [], []
+    async with httpx.AsyncClient(base_url=base, timeout=60) as c:
+        for _ in range(writes):
+            user = rng.randrange(len(tokens))
+            loop = asyncio.get_running_loop()
+            for ws, _ in conns[user]:
+                waiting[ws] = loop.create_future()
+            t = time.perf_counter()
+            r = await c.post("/expenses/", headers={"Authorization": f"Bearer {tokens[user]}"},
+                             json={"category": "live-bench", "amount": 1.0})
+            created.append((user, r.json()["id"]))
+            arrived = await asyncio.wait_for(asyncio.gather(*(waiting[ws] for ws, _ in conns[user])), 30)
+            delivery_s += [a - t for a in arrived]
+        metrics = (await c.get("/metrics")).text
+        for user, expense_id in created:
+            await c.delete(f"/expenses/{expense_id}", headers={"Authorization": f"Bearer {tokens[user]}"})
+
+    for ws, task in (x for cs in conns.values() for x in cs):
+        task.cancel()
+        await ws.close()
+    gauge = next((line.split()[1] for line in metrics.splitlines() if line.startswith("live_connections ")), "?")
+    return {"connections": n, "connect_wall_s": connect_wall, "connect": percentiles(connect_s),
+            "delivery": percentiles(delivery_s), "server_rss_mb": rss / 2**20 if rss else None,
+            "live_connections": gauge}
+
+def _print(r: dict):
+    rss = f"{r['server_rss_mb']:.0f} MB" if r["server_rss_mb"] else "n/a"
+    print(f"{r['connections']:>7} conns  open {r['connect_wall_s']:6.1f} s "
+          f"(p50 {r['connect']['p50']:6.1f} ms, p99 {r['connect']['p99']:7.1f} ms)  "
+          f"delivery p50 {r['delivery']['p50']:6.1f} ms p99 {r['delivery']['p99']:7.1f} ms  "
+          f"server RSS {rss}  (server saw {r['live_connections']})")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.live")
+    parser.add_argument("--base-url", help="use a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting a server")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment for the started server, e.g. DB_ASYNC=1")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--connections", default="100,1000", help="comma-separated steps")
+    parser.add_argument("--writes", type=int, default=50, help="creates timed per step")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    steps = [int(n) for n in args.connections.split(",")]
+
+    # both ends of every connection may live in this process tree
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if hard < 2 * max(steps) + 100:
+        print(f"warning: open-file limit {hard} is low for {max(steps)} connections")
+
+    async def run(base: str) -> list[dict]:
+        async with httpx.AsyncClient(base_url=base, timeout=60) as c:
+            tokens = await _tokens(c, args.users)
+        rng = random.Random(args.seed)
+        results = []
+        for n in steps:
+            results.append(await step(base, tokens, n, args.writes, rng))
+            _print(results[-1])
+        return results
+
+    if args.base_url:
+        asyncio.run(run(args.base_url))
+    else:
+        env = dict(kv.split("=", 1) for kv in args.env)
+        # the per-user cap would refuse most of a large step
+        env.setdefault("LIVE_MAX_PER_USER", str(max(steps)))
+        with server(args.port, args.workers, **env) as base:
+            asyncio.run(run(base))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Mixed-workload load driver for every auth and expenses route.
+
+Uses the users created by ``benchmarks.seed`` (same ``--users``), runs a
+weighted mix of operations from ``--concurrency`` clients for ``--duration``
+seconds and reports throughput and p50/p95/p99 per endpoint:
+
+    python -m benchmarks.seed --users 20 --reset
+    python -m benchmarks.load --users 20 --concurrency 50 --duration 30 --out runs/main.json
+    python -m benchmarks.report runs/main.json runs/branch.json
+
+Without ``--base-url`` a uvicorn server is started on ``--port``; pass
+``--env DB_ASYNC=1`` (repeatable) to configure it. Each client draws its
+operations from its own seeded RNG, so runs differ only by timing.
+"""
+import argparse, asyncio, json, random, subprocess, time, uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import httpx
+
+from benchmarks import seed
+from benchmarks.common import percentiles, server
+from benchmarks.report import table
+
+MIX = {
+    "list": 20, "list_search": 6, "list_cursor": 4, "export": 1,
+    "create": 10, "import": 1, "update": 5, "delete": 3, "batch": 2,
+    "summary": 8, "trend": 8, "dashboard": 10, "stats_summary": 6, "stats_by_month": 5,
+    "login": 1, "register": 0.5,
+}
+CATEGORIES = list(seed.CATEGORIES)
+
+@dataclass
+class Client:
+    email: str
+    headers: dict
+    ids: list[int] = field(default_factory=list)
+    cursor: str | None = None
+
+def _month(rng: random.Random) -> str:
+    d = datetime.now(timezone.utc).date() - timedelta(days=30 * rng.randrange(12))
+    return d.strftime("%Y-%m")
+
+def _expense(rng: random.Random) -> dict:
+    category = rng.choice(CATEGORIES)
+    return {"category": category, "amount": round(rng.uniform(1, 120), 2),
+            "note": rng.choice(seed.CATEGORIES[category][4])}
+
+async def op_list(c, u, rng):
+    r = await c.get("/expenses/", headers=u.headers, params={"limit": 50, "total": "estimate"})
+    if r.status_code == 200:
+        u.cursor = r.json()["meta"]["next_cursor"]
+    return "GET /expenses/", r
+
+async def op_list_search(c, u, rng):
+    words = rng.choice(seed.CATEGORIES[rng.choice(CATEGORIES)][4]).split()
+    return "GET /expenses/?q", await c.get("/expenses/", headers=u.headers,
+                                           params={"q": words[0], "limit": 20, "total": "none"})
+
+async def op_list_cursor(c, u, rng):
+    if u.cursor is None:
+        return await op_list(c, u, rng)
+    r = await c.get("/expenses/", headers=u.headers,
+                    params={"cursor": u.cursor, "limit": 50, "total": "none"})
+    u.cursor = r.json()["meta"]["next_cursor"] if r.status_code == 200 else None
+    return "GET /expenses/?cursor", r
+
+async def op_export(c, u, rng):
+    return "GET /expenses/export", await c.get("/expenses/export", headers=u.headers,
+                                               params={"format": rng.choice(["csv", "ndjson"]),
+                                                       "month": _month(rng)})
+
+async def op_create(c, u, rng):
+    r = await c.post("/expenses/", headers=u.headers, json=_expense(rng))
+    if r.status_code == 201:
+        u.ids.append(r.json()["id"])
+    return "POST /expenses/", r
+
+async def op_import(c, u, rng):
+    body = "\n".join(json.dumps(_expense(rng)) for _ in range(50))
+    return "POST /expenses/import", await c.post(
+        "/expenses/import", content=body,
+        headers={**u.headers, "Content-Type": "application/x-ndjson"})
+
+async def op_update(c, u, rng):
+    if not u.ids:
+        return await op_create(c, u, rng)
+    return "PUT /expenses/{id}", await c.put(f"/expenses/{rng.choice(u.ids)}",
+                                             headers=u.headers, json=_expense(rng))
+
+async def op_delete(c, u, rng):
+    # keep a pool of ids around so updates always have something to hit
+    if len(u.ids) < 20:
+        return await op_create(c, u, rng)
+    expense_id = u.ids.pop(rng.randrange(len(u.ids)))
+    return "DELETE /expenses/{id}", await c.delete(f"/expenses/{expense_id}", headers=u.headers)
+
+async def op_batch(c, u, rng):
+    body = {"create": [_expense(rng) for _ in range(5)],
+            "update": [dict(_expense(rng), id=i) for i in rng.sample(u.ids, min(3, len(u.ids)))]}
+    if len(u.ids) >= 20:
+        body["delete"] = [u.ids.pop(rng.randrange(len(u.ids)))]
+    r = await c.post("/expenses/batch", headers=u.headers, json=body)
+    if r.status_code == 200:
+        u.ids += [x["id"] for x in r.json()["results"] if x["op"] == "create"]
+    return "POST /expenses/batch", r
+
+async def op_summary(c, u, rng):
+    params = {"month": _month(rng)} if rng.random() < 0.7 else {}
+    return "GET /expenses/summary", await c.get("/expenses/summary", headers=u.headers, params=params)
+
+async def op_trend(c, u, rng):
+    return "GET /expenses/trend", await c.get("/expenses/trend", headers=u.headers,
+                                              params={"days": rng.choice([7, 30, 90, 365])})
+
+async def op_dashboard(c, u, rng):
+    params = {"month": _month(rng)} if rng.random() < 0.3 else {}
+    return "GET /expenses/dashboard", await c.get("/expenses/dashboard", headers=u.headers, params=params)
+
+async def op_stats_summary(c, u, rng):
+    return "GET /expenses/stats/summary", await c.get("/expenses/stats/summary", headers=u.headers,
+                                                      params={"month": _month(rng)})
+
+async def op_stats_by_month(c, u, rng):
+    year = datetime.now(timezone.utc).year - rng.randrange(2)
+    return "GET /expenses/stats/by-month", await c.get("/expenses/stats/by-month", headers=u.headers,
+                                                       params={"year": year})
+
+async def op_login(c, u, rng):
+    return "POST /auth/login", await c.post("/auth/login",
+                                            data={"username": u.email, "password": seed.PASSWORD})
+
+async def op_register(c, u, rng):
+    # unique rather than seeded: the warmup replays the same sequence
+    email = f"reg-{uuid.uuid4().hex[:12]}@{seed.DOMAIN}"
+    return "POST /auth/register", await c.post("/auth/register",
+                                               json={"email": email, "password": seed.PASSWORD})
+
+OPS = {name: globals()[f"op_{name}"] for name in MIX}
+
+def parse_mix(spec: str | None) -> dict[str, float]:
+    """``"list=10,create=5"`` overrides the default weights; 0 disables an operation."""
+    mix = dict(MIX)
+    for part in filter(None, (spec or "").split(",")):
+        name, _, weight = part.partition("=")
+        if name not in OPS:
+            raise SystemExit(f"unknown operation {name!r}; choose from {', '.join(OPS)}")
+        mix[name] = float(weight)
+    return {k: v for k, v in mix.items() if v > 0}
+
+async def _clients(c: httpx.AsyncClient, users: int) -> list[Client]:
+    # argon2 is deliberately slow; don't trip the hashing pool's 503s while logging in
+    gate = asyncio.Semaphore(4)
+
+    async def one(i: int) -> Client:
+        async with gate:
+            r = await c.post("/auth/login", data={"username": seed.email(i), "password": seed.PASSWORD})
+        if r.status_code != 200:
+            raise SystemExit(f"login failed for {seed.email(i)}; run python -m benchmarks.seed first")
+        u = Client(seed.email(i), {"Authorization": f"Bearer {r.json()['access_token']}"})
+        r = await c.get("/expenses/", headers=u.headers, params={"limit": 200, "total": "none"})
+        u.ids = [e["id"] for e in r.json()["items"]]
+        return u
+
+    return list(await asyncio.gather(*(one(i) for i in range(users))))
+
+async def run(base: str, args, mix: dict[str, float]) -> dict:
+    names, weights = list(mix), list(mix.values())
+    samples: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as c:
+        clients = await _clients(c, args.users)
+
+        async def worker(n: int, until: float, record: bool):
+            rng = random.Random(f"{args.seed}:worker{n}")
+            u = clients[n % len(clients)]
+            while time.monotonic() < until:
+                op = OPS[rng.choices(names, weights)[0]]
+                t0 = time.perf_counter()
+                try:
+                    label, r = await op(c, u, rng)
+                    failed = r.status_code >= 400
+                except httpx.HTTPError:
+                    label, failed = f"{op.__name__[3:]} (transport error)", True
+                if record:
+                    samples.setdefault(label, []).append(time.perf_counter() - t0)
+                    errors[label] = errors.get(label, 0) + failed
+
+        if args.warmup:
+            until = time.monotonic() + args.warmup
+            await asyncio.gather(*(worker(n, until, False) for n in range(args.concurrency)))
+        started = time.monotonic()
+        until = started + args.duration
+        await asyncio.gather(*(worker(n, until, True) for n in range(args.concurrency)))
+        elapsed = time.monotonic() - started
+
+    def stats(latencies: list[float], errs: int) -> dict:
+        return {"count": len(latencies), "errors": errs, "rps": len(latencies) / elapsed,
+                **percentiles(latencies)}
+
+    return {
+        "meta": {
+            "label": args.label or _git_rev(),
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "duration": elapsed, "concurrency": args.concurrency, "users": args.users,
+            "seed": args.seed, "mix": mix, "env": args.env,
+        },
+        "endpoints": {k: stats(v, errors[k]) for k, v in samples.items()},
+        "total": stats([x for v in samples.values() for x in v], sum(errors.values())),
+    }
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--base-url", help="use a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting a server")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment for the started server, e.g. DB_ASYNC=1")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix", help="comma-separated op=weight overrides; ops: " + ", ".join(MIX))
+    parser.add_argument("--label", help="name for this run in reports (default: git commit)")
+    parser.add_argument("--out", help="write the run as JSON for benchmarks.report")
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    if args.base_url:
+        result = asyncio.run(run(args.base_url, args, mix))
+    else:
+        env = dict(kv.split("=", 1) for kv in args.env)
+        with server(args.port, args.workers, **env) as base:
+            result = asyncio.run(run(base, args, mix))
+
+    print(table(result))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Print a saved load-test run, or compare two runs endpoint by endpoint.
+
+    python -m benchmarks.report runs/main.json
+    python -m benchmarks.report runs/main.json runs/branch.json --threshold 10
+
+When comparing, exits 1 if any endpoint's p95 rose, or its throughput fell, by
+more than ``--threshold`` percent.
+"""
+import argparse, json, sys
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def table(run: dict) -> str:
+    lines = [f"{'endpoint':<32}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+    for name, s in sorted(run["endpoints"].items()) + [("TOTAL", run["total"])]:
+        lines.append(f"{name:<32}{s['count']:>8}{s['errors']:>8}{s['rps']:>9.1f}"
+                     f"{s['p50']:>9.1f}{s['p95']:>9.1f}{s['p99']:>9.1f}")
+    return "\n".join(lines)
+
+def _pct(old: float, new: float) -> float | None:
+    return (new - old) / old * 100 if old else None
+
+def compare(base: dict, new: dict, threshold: float) -> tuple[str, list[str]]:
+    lines = [f"{'endpoint':<32}{'req/s':>18}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}"]
+    regressions = []
+    names = sorted(set(base["endpoints"]) | set(new["endpoints"]))
+    for name in names + ["TOTAL"]:
+        a = base["total"] if name == "TOTAL" else base["endpoints"].get(name)
+        b = new["total"] if name == "TOTAL" else new["endpoints"].get(name)
+        if a is None or b is None:
+            lines.append(f"{name:<32}  only in {'new' if a is None else 'base'} run")
+            continue
+        row = f"{name:<32}"
+        for col in ("rps", "p50", "p95", "p99"):
+            d = _pct(a[col], b[col])
+            row += f"{b[col]:>10.1f} {'' if d is None else f'{d:+.0f}%':>6} "
+        lines.append(row)
+        d_rps, d_p95 = _pct(a["rps"], b["rps"]), _pct(a["p95"], b["p95"])
+        if d_rps is not None and d_rps < -threshold:
+            regressions.append(f"{name}: throughput {d_rps:+.1f}%")
+        if d_p95 is not None and d_p95 > threshold:
+            regressions.append(f"{name}: p95 {d_p95:+.1f}%")
+    return "\n".join(lines), regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.report")
+    parser.add_argument("runs", nargs="+", help="one run to print, or base and new runs to compare")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent")
+    args = parser.parse_args(argv)
+
+    if len(args.runs) == 1:
+        print(table(load(args.runs[0])))
+        return
+    base, new = load(args.runs[0]), load(args.runs[1])
+    print(f"base: {base['meta'].get('label')}   new: {new['meta'].get('label')}")
+    text, regressions = compare(base, new, args.threshold)
+    print(text)
+    if regressions:
+        print(f"\nregressions over {args.threshold:g}%:")
+        print("\n".join(f"  {r}" for r in regressions))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
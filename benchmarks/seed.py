@@ -0,0 +1,132 @@
+"""Deterministic synthetic data for load tests, written straight into the database.
+
+Creates ``--users`` accounts (``user<i>@bench.example.com`` / ``benchmark-pass``)
+whose expenses follow rough real-world shapes: log-normal amounts per category,
+monthly rent and utilities, more dining out on weekends, daytime timestamps.
+The same ``--seed`` always produces the same rows relative to today's date.
+With user shards (``DB_SHARD_URLS``) each user goes where registering would
+have put them.
+
+    python -m benchmarks.seed --users 50 --rows-per-user 2000 --reset
+"""
+import argparse, math, random, time
+from datetime import datetime, time as dtime, timedelta, timezone
+
+# app modules are imported inside the functions so that benchmarks.load can use
+# the constants below without a DATABASE_URL
+
+DOMAIN = "bench.example.com"
+PASSWORD = "benchmark-pass"
+
+# category -> (weight, median amount, log-normal sigma, weekend factor, notes)
+CATEGORIES = {
+    "groceries":     (30, 45.0, 0.6, 1.2, ["Trader Joe's", "Whole Foods weekly shop", "Costco run", "farmers market", "corner store"]),
+    "dining":        (18, 24.0, 0.7, 1.8, ["lunch with team", "pizza night", "sushi", "brunch", "takeout thai"]),
+    "transport":     (15, 12.0, 0.8, 0.7, ["uber to airport", "metro card top-up", "gas", "parking downtown", "bike share"]),
+    "coffee":        (12, 4.5, 0.3, 0.8, ["latte", "cold brew", "espresso and croissant"]),
+    "shopping":      (8, 40.0, 1.0, 1.5, ["new shoes", "amazon order", "books", "home goods", "gift for mom"]),
+    "entertainment": (6, 25.0, 0.8, 2.0, ["movie tickets", "concert", "streaming subscription", "bowling"]),
+    "health":        (3, 60.0, 1.0, 0.6, ["pharmacy", "dentist copay", "gym membership", "vitamins"]),
+    "travel":        (1, 300.0, 0.9, 1.3, ["flight to chicago", "hotel two nights", "rental car"]),
+}
+# relative weight of each hour of the day (UTC), peaking at lunch and in the evening
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 4, 6, 6, 5, 6, 9, 8, 5, 5, 6, 8, 9, 8, 6, 4, 2, 1]
+
+def email(i: int) -> str:
+    return f"user{i}@{DOMAIN}"
+
+def _rng(seed: int, i: int) -> random.Random:
+    return random.Random(f"{seed}:{i}")
+
+def generate(rng: random.Random, n: int, days: int, today) -> list:
+    """``n`` discretionary expenses spread over ``days`` before ``today``, plus monthly bills."""
+    from app.schemas.expense import ExpenseImportRow
+    names = list(CATEGORIES)
+    weights = [CATEGORIES[c][0] for c in names]
+    rows = []
+
+    def at(day, hour=None) -> datetime:
+        h = hour if hour is not None else rng.choices(range(24), HOUR_WEIGHTS)[0]
+        return datetime.combine(day, dtime(h, rng.randrange(60), rng.randrange(60)), timezone.utc)
+
+    while len(rows) < n:
+        category = rng.choices(names, weights)[0]
+        _, median, sigma, weekend, notes = CATEGORIES[category]
+        day = today - timedelta(days=rng.randrange(days))
+        # thin out weekday/weekend rows so the surviving mix follows the weekend factor
+        factor = weekend if day.weekday() >= 5 else 1.0
+        if rng.random() > factor / max(weekend, 1.0):
+            continue
+        amount = round(max(0.5, rng.lognormvariate(math.log(median), sigma)), 2)
+        rows.append(ExpenseImportRow(category=category, amount=amount,
+                                     note=rng.choice(notes), created_at=at(day)))
+
+    rent = round(rng.uniform(800, 2500), 2)
+    month = today.replace(day=1)
+    while month > today - timedelta(days=days):
+        rows.append(ExpenseImportRow(category="rent", amount=rent, note="rent", created_at=at(month, 9)))
+        utilities = round(rng.gauss(140, 35), 2)
+        rows.append(ExpenseImportRow(category="utilities", amount=max(utilities, 20.0),
+                                     note=rng.choice(["electric bill", "internet", "water and gas"]),
+                                     created_at=at(month.replace(day=15), 10)))
+        month = (month - timedelta(days=1)).replace(day=1)
+    return rows
+
+def reset(sessions: dict) -> int:
+    """Delete benchmark users from every shard and the directory (shard 0)."""
+    from app import models
+    n = 0
+    for db in sessions.values():
+        n += db.query(models.User).filter(models.User.email.like(f"%@{DOMAIN}")) \
+            .delete(synchronize_session=False)
+        db.commit()
+    sessions[0].query(models.UserDirectory).filter(models.UserDirectory.email.like(f"%@{DOMAIN}")) \
+        .delete(synchronize_session=False)
+    sessions[0].commit()
+    return n
+
+def seed(users: int, rows_per_user: int, days: int, seed: int, do_reset: bool = False):
+    from app import models
+    from app.core.security import hash_password
+    from app.db import bulk, schema, shards
+
+    schema.run("create")  # scratch databases get the schema; existing ones are left alone
+    today = datetime.now(timezone.utc).date()
+    hashed = hash_password(PASSWORD)
+    sessions = {s.index: s.session() for s in shards.cluster}
+    directory = sessions[0]
+    try:
+        if do_reset:
+            print(f"removed {reset(sessions)} existing benchmark users")
+        total, t0 = 0, time.perf_counter()
+        for i in range(users):
+            rng = _rng(seed, i)
+            # activity varies a lot between people; keep the mean at rows_per_user
+            n = max(1, round(rng.lognormvariate(math.log(rows_per_user) - 0.125, 0.5)))
+            entry = models.UserDirectory(email=email(i), shard=shards.place(email(i)).index)
+            directory.add(entry); directory.flush()
+            db = sessions[entry.shard]
+            user = models.User(id=entry.id, email=email(i), hashed_password=hashed)
+            db.add(user); db.flush()
+            rows = generate(rng, n, days, today)
+            for start in range(0, len(rows), bulk.CHUNK_ROWS):
+                total += bulk.load_rows(db, user.id, rows[start:start + bulk.CHUNK_ROWS])
+            db.commit()
+            directory.commit()
+        print(f"seeded {users} users, {total} expenses in {time.perf_counter() - t0:.1f}s")
+    finally:
+        for db in sessions.values():
+            db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.seed")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rows-per-user", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help=f"delete existing *@{DOMAIN} users first")
+    args = parser.parse_args(argv)
+    seed(args.users, args.rows_per_user, args.days, args.seed, args.reset)
+
+if __name__ == "__main__":
+    main()
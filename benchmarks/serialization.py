@@ -0,0 +1,103 @@
+"""CPU and allocations per list page: ORM + Pydantic + FastAPI encoding vs column tuples + orjson.
+
+"before" is the old list path: ORM ``Expense`` objects, ``Page[ExpenseOut]``
+built by the handler, then FastAPI's response-model validation and
+``jsonable_encoder``. "after" is the current path: column tuples dumped
+straight to bytes.
+
+    python -m benchmarks.serialization --rows 200 --iterations 500
+    python -m benchmarks.serialization --source db --user-email user0@bench.example.com
+
+``--source memory`` (default) needs no database; ``--source db`` loads a real
+page from DATABASE_URL so ORM hydration is included.
+"""
+import argparse, asyncio, os, time, tracemalloc
+from datetime import datetime, timedelta, timezone
+
+# memory mode never connects; the engine is created lazily
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/unused")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app import models
+from app.core.serialize import json_response, records
+from app.routers import expenses
+from app.schemas.expense import ExpenseOut
+from app.schemas.paging import Page, PageMeta
+
+META = {"total": None, "total_is_estimate": False, "limit": 200, "offset": 0,
+        "next_cursor": "eyJ2IjoxfQ", "prev_cursor": None}
+
+def _list_route():
+    return next(r for r in expenses.router.routes if r.path == "/expenses/" and "GET" in r.methods)
+
+def _synthetic(n: int) -> list[tuple]:
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [("groceries", 12.5 + i, f"note {i}", i, 1, t0 + timedelta(minutes=i), t0 + timedelta(minutes=i))
+            for i in range(n)]
+
+def _load_db(email: str, n: int):
+    from app.db.session import SessionLocal
+    s = SessionLocal()
+    user = s.query(models.User).filter(models.User.email == email).one()
+
+    def page(*entities):
+        def load():
+            s.expunge_all()  # hydrate fresh objects each time, as a new request would
+            return (s.query(*entities).filter(models.Expense.user_id == user.id)
+                    .order_by(models.Expense.created_at.desc()).limit(n).all())
+        return load
+
+    return page(models.Expense), page(*(getattr(models.Expense, f) for f in expenses.EXPENSE_FIELDS)), s
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.serialization")
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--source", choices=("memory", "db"), default="memory")
+    parser.add_argument("--user-email", default="user0@bench.example.com")
+    args = parser.parse_args(argv)
+
+    field = _list_route().secure_cloned_response_field
+    session = None
+    if args.source == "db":
+        load_orm, load_tuples, session = _load_db(args.user_email, args.rows)
+    else:
+        rows = _synthetic(args.rows)
+        load_orm = lambda: [models.Expense(**dict(zip(expenses.EXPENSE_FIELDS, r))) for r in rows]
+        load_tuples = lambda: rows
+
+    async def before():
+        page = Page[ExpenseOut](items=load_orm(), meta=PageMeta(**META))
+        content = await serialize_response(field=field, response_content=page)
+        return JSONResponse(content).body
+
+    async def after():
+        return json_response({"items": records(expenses.EXPENSE_FIELDS, load_tuples()), "meta": META}).body
+
+    async def measure(fn):
+        await fn()  # warm caches
+        c0 = time.process_time()
+        for _ in range(args.iterations):
+            body = await fn()
+        cpu = (time.process_time() - c0) / args.iterations
+        tracemalloc.start()
+        await fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return cpu, peak, len(body)
+
+    try:
+        results = {name: asyncio.run(measure(fn)) for name, fn in (("before", before), ("after", after))}
+    finally:
+        if session is not None:
+            session.close()
+
+    print(f"{args.rows}-row page, {args.iterations} iterations, source={args.source}")
+    for name, (cpu, peak, size) in results.items():
+        print(f"{name:>7}  {cpu * 1e6:9.0f} µs CPU/page  {peak / 1024:8.1f} KiB peak alloc  {size} bytes")
+    print(f"speedup {results['before'][0] / results['after'][0]:.1f}x")
+
+if __name__ == "__main__":
+    main()
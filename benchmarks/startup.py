@@ -0,0 +1,117 @@
+"""Import time, time to first response, and how warm the first requests are.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --workers 4 --no-preload
+    python -m benchmarks.startup --env WARMUP_REQUESTS=0 --env DB_POOL_PREWARM=0
+    python -m benchmarks.startup --importtime        # slowest imports, cumulative
+
+Each run starts ``python -m app`` on a free port and records:
+- how long until it answers;
+- the ``app_startup_seconds`` phases it reports;
+- the latency of the first list/dashboard/summary requests as ``seed.email(0)``.
+Seed that user first with ``python -m benchmarks.seed``; without it only the
+timings before the first request are reported.
+"""
+import argparse, asyncio, os, socket, statistics, subprocess, sys, time
+import httpx
+
+from benchmarks import seed
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+FIRST_REQUESTS = (("list", "/expenses/"), ("dashboard", "/expenses/dashboard"), ("summary", "/expenses/summary"))
+
+def import_time(env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.split()[-1])
+
+def slowest_imports(env: dict, n: int = 15) -> list[tuple[float, str]]:
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                       env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in r.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:n]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _phases(metrics_text: str) -> dict[str, float]:
+    out = {}
+    for line in metrics_text.splitlines():
+        if line.startswith("app_startup_seconds{"):
+            labels, value = line.rsplit(" ", 1)
+            out[labels.split('phase="')[1].split('"')[0]] = float(value) * 1000
+    return out
+
+async def _measure(base: str, t0: float, timeout: float = 60.0) -> dict:
+    result: dict = {}
+    async with httpx.AsyncClient(base_url=base, timeout=timeout) as c:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                r = await c.get("/metrics")
+                if r.status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"server at {base} did not start")
+            await asyncio.sleep(0.01)
+        result["ready"] = (time.perf_counter() - t0) * 1000
+        result.update(_phases(r.text))
+
+        r = await c.post("/auth/login", data={"username": seed.email(0), "password": seed.PASSWORD})
+        if r.status_code != 200:
+            return result
+        h = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        for name, path in FIRST_REQUESTS:
+            t = time.perf_counter()
+            await c.get(path, headers=h)
+            result[f"first {name}"] = (time.perf_counter() - t) * 1000
+    return result
+
+def run_once(env: dict, workers: int, preload: bool) -> dict:
+    port = _free_port()
+    cmd = [sys.executable, "-m", "app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning", "--preload" if preload else "--no-preload"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stderr=subprocess.DEVNULL)
+    try:
+        return asyncio.run(_measure(f"http://127.0.0.1:{port}", t0))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment for the started server, e.g. WARMUP_REQUESTS=0")
+    parser.add_argument("--importtime", action="store_true", help="list the slowest imports and exit")
+    args = parser.parse_args(argv)
+    env = dict(os.environ, **dict(kv.split("=", 1) for kv in args.env))
+
+    if args.importtime:
+        for ms, name in slowest_imports(env):
+            print(f"{ms:8.1f} ms  {name}")
+        return
+
+    imports = [import_time(env) * 1000 for _ in range(args.runs)]
+    runs = [run_once(env, args.workers, args.preload) for _ in range(args.runs)]
+    print(f"{args.runs} runs, {args.workers} worker(s), preload={'on' if args.preload else 'off'}"
+          + (f", {' '.join(args.env)}" if args.env else ""))
+    print(f"{'import app.main':<22} {statistics.median(imports):8.1f} ms")
+    for key in dict.fromkeys(k for r in runs for k in r):
+        values = [r[key] for r in runs if key in r]
+        label = key if key.startswith(("ready", "first")) else f"  startup: {key}"
+        print(f"{label:<22} {statistics.median(values):8.1f} ms")
+
+if __name__ == "__main__":
+    main()
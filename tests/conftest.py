@@ -0,0 +1,58 @@
+"""Database tests run against ``TEST_DATABASE_URL`` (a psycopg2 Postgres URL).
+
+Point it at an empty database: the app's tables must not exist in ``public``,
+or unqualified names could reach them. The schema is created in a throwaway
+Postgres schema that is dropped at the end of the session, and every test's
+writes are rolled back. Without the variable those tests are skipped.
+"""
+import os, uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("set TEST_DATABASE_URL to run database tests")
+    import app.models as models
+
+    schema = f"test_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_DATABASE_URL)
+    with admin.begin() as conn:
+        if conn.execute(text("SELECT to_regclass('public.expenses')")).scalar():
+            admin.dispose()
+            pytest.exit("TEST_DATABASE_URL must point at an empty database (public.expenses exists)", 2)
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    eng = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-csearch_path={schema},public"})
+    try:
+        models.Base.metadata.create_all(eng, checkfirst=False)
+        yield eng
+    finally:
+        eng.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """A session whose work is rolled back after the test."""
+    with engine.connect() as conn:
+        outer = conn.begin()
+        with Session(bind=conn, join_transaction_mode="create_savepoint") as session:
+            yield session
+        outer.rollback()
+
+
+@pytest.fixture
+def user_id(db):
+    import app.models as models
+
+    user = models.User(email=f"{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    return user.id
@@ -0,0 +1,141 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import insert, select
+
+import app.models as models
+from app.db import analytics, archive, batch, rollups
+from app.schemas.expense import ExpenseBatch, ExpenseUpdateItem
+
+OLD = datetime(2023, 3, 15, 12, tzinfo=timezone.utc)
+BEFORE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def _no_live_updates(monkeypatch):
+    monkeypatch.setattr(rollups.live.settings, "LIVE_UPDATES", False)
+
+
+def test_horizon_is_the_first_of_the_month(monkeypatch):
+    monkeypatch.setattr(archive.settings, "ARCHIVE_AFTER_MONTHS", 12)
+    assert archive.horizon(date(2025, 3, 20)) == datetime(2024, 3, 1, tzinfo=timezone.utc)
+    monkeypatch.setattr(archive.settings, "ARCHIVE_AFTER_MONTHS", 0)
+    assert archive.horizon(date(2025, 3, 20)) is None
+
+
+def test_reaches(monkeypatch):
+    monkeypatch.setattr(archive.settings, "ARCHIVE_AFTER_MONTHS", 12)
+    h = archive.horizon()
+    assert archive.reaches(None) and archive.reaches(h.replace(year=h.year - 1))
+    assert not archive.reaches(h)
+    monkeypatch.setattr(archive.settings, "ARCHIVE_AFTER_MONTHS", 0)
+    assert not archive.reaches(None)
+
+
+def _expenses(db, user_id, amounts, created_at=OLD):
+    rows = db.execute(insert(models.Expense.__table__).returning(models.Expense.id),
+                      [{"user_id": user_id, "category": "food", "amount": a, "note": f"n{a}",
+                        "created_at": created_at} for a in amounts]).scalars().all()
+    rollups.rebuild(db, user_id=user_id)
+    return rows
+
+
+def _rollups(db, user_id):
+    M = models.MonthlyRollup
+    return sorted((r.month, r.category, r.total, r.count) for r in
+                  db.execute(select(M).where(M.user_id == user_id)).scalars())
+
+
+def _matches_rebuild(db, user_id) -> bool:
+    kept = _rollups(db, user_id)
+    rollups.rebuild(db, user_id=user_id)
+    rebuilt = _rollups(db, user_id)
+    return ([(m, c, n) for m, c, _, n in kept] == [(m, c, n) for m, c, _, n in rebuilt]
+            and [t for *_, t, _ in kept] == pytest.approx([t for *_, t, _ in rebuilt], abs=1e-9))
+
+
+def test_amounts_are_archived_in_cents_and_restored(db, user_id):
+    _expenses(db, user_id, [19.99, 0.3, 10.006, 1234567.89])
+    _expenses(db, user_id, [5.0], created_at=datetime(2024, 6, 1, tzinfo=timezone.utc))
+    assert archive.archive_rows(db.connection(), BEFORE) == 4
+
+    A = models.ArchivedExpense
+    cents = db.execute(select(A.amount_cents).where(A.user_id == user_id).order_by(A.amount_cents)).scalars()
+    assert list(cents) == [30, 1001, 1999, 123456789]
+    assert db.execute(select(models.Expense.amount).where(models.Expense.user_id == user_id)).scalars().all() == [5.0]
+
+    assert archive.restore_rows(db.connection(), None) == 4
+    amounts = db.execute(select(models.Expense.amount).where(models.Expense.user_id == user_id)).scalars()
+    assert sorted(amounts) == [0.3, 5.0, 10.01, 19.99, 1234567.89]
+
+
+@pytest.mark.parametrize("move", ["rows", "partition"])
+def test_rollups_follow_the_rounding(db, user_id, monkeypatch, move):
+    monkeypatch.setattr(archive.settings, "ARCHIVE_AFTER_MONTHS", 12)
+    conn = db.connection()
+    if move == "partition":
+        archive.partitions.create_month(conn, OLD.date().replace(day=1))
+    _expenses(db, user_id, [1.333, 2.005])
+    if move == "rows":
+        assert archive.archive_rows(conn, BEFORE) == 2
+    else:
+        p, = (p for p in archive.partitions.partitions(conn) if p.name == "expenses_p2023_03")
+        assert archive.archive_partition(conn, p) == 2
+
+    archived = sum(db.execute(select(models.ArchivedExpense.amount)
+                              .where(models.ArchivedExpense.user_id == user_id)).scalars())
+    utc = analytics.period_stats(db, user_id, None, None).current.total
+    local = analytics.period_stats(db, user_id, None, None, tz="Asia/Seoul").current.total
+    assert utc == pytest.approx(archived, abs=1e-9) and local == pytest.approx(archived, abs=1e-9)
+    assert _matches_rebuild(db, user_id)
+
+
+def test_archived_expense_can_be_updated(db, user_id):
+    expense_id, = _expenses(db, user_id, [19.99])
+    archive.archive_rows(db.connection(), BEFORE)
+
+    rows = batch.update_expenses(db, user_id, [ExpenseUpdateItem(id=expense_id, category="travel",
+                                                                 amount=25.5, note="fixed")])
+    r = rows[expense_id]
+    assert (r.category, r.amount, r.note, r.created_at) == ("travel", 25.5, "fixed", OLD)
+    assert (r.old_category, r.old_amount) == ("food", 19.99)
+    assert r.updated_at > OLD
+
+    batch.update_rollups(db, user_id, updated=rows.values())
+    assert _rollups(db, user_id) == [(date(2023, 3, 1), "travel", 25.5, 1)]
+    assert _matches_rebuild(db, user_id)
+    assert db.get(models.Expense, expense_id) is None  # still archived
+
+
+def test_archived_expense_can_be_deleted(db, user_id):
+    keep, gone = _expenses(db, user_id, [1.0, 2.0])
+    archive.archive_rows(db.connection(), BEFORE)
+
+    rows = batch.delete_expenses(db, user_id, [gone])
+    assert list(rows) == [gone] and rows[gone].amount == 2.0
+    batch.update_rollups(db, user_id, deleted=rows.values())
+    assert _rollups(db, user_id) == [(date(2023, 3, 1), "food", 1.0, 1)]
+    assert _matches_rebuild(db, user_id)
+
+
+def test_batch_mixes_hot_archived_and_missing_ids(db, user_id):
+    hot, = _expenses(db, user_id, [3.0], created_at=datetime(2024, 6, 1, tzinfo=timezone.utc))
+    cold, = _expenses(db, user_id, [4.0])
+    archive.archive_rows(db.connection(), BEFORE)
+
+    result = batch.apply(db, user_id, ExpenseBatch(
+        update=[{"id": hot, "category": "a", "amount": 30}, {"id": cold, "category": "b", "amount": 40}],
+        delete=[10**9]))
+    assert [(r.op, r.id, r.status) for r in result.results] == [
+        ("update", hot, 200), ("update", cold, 200), ("delete", 10**9, 404)]
+    assert _matches_rebuild(db, user_id)
+
+
+def test_other_users_archived_expenses_are_not_found(db, user_id):
+    expense_id, = _expenses(db, user_id, [1.0])
+    archive.archive_rows(db.connection(), BEFORE)
+    other = models.User(email="other@example.com", hashed_password="x")
+    db.add(other)
+    db.flush()
+    assert batch.update_expenses(db, other.id, [ExpenseUpdateItem(id=expense_id, category="x", amount=1)]) == {}
+    assert batch.delete_expenses(db, other.id, [expense_id]) == {}
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.core import limits
+from app.core.limits import Limit, MemoryBackend, parse_limit
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("60/1m", Limit(burst=60, rate=1.0)),
+    ("10/s", Limit(burst=10, rate=10.0)),
+    (" 5 / 10 s ", Limit(burst=5, rate=0.5)),
+    ("3600/h", Limit(burst=3600, rate=1.0)),
+    ("", None),
+    ("0/1m", None),
+])
+def test_parse_limit(spec, expected):
+    assert parse_limit(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["60", "60/1d", "-1/s", "a/s"])
+def test_parse_limit_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_limit(spec)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(limits.time, "monotonic", c)
+    return c
+
+
+def _take(backend, key="k", limit=Limit(burst=3, rate=1.0)):
+    return asyncio.run(backend.take(key, limit))
+
+
+def test_burst_then_wait_for_refill(clock):
+    b = MemoryBackend(10)
+    assert [_take(b) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert _take(b) == pytest.approx(1.0)
+    clock.now += 0.25
+    assert _take(b) == pytest.approx(0.75)  # a refused request doesn't cost a token
+    clock.now += 0.75
+    assert _take(b) == 0.0
+
+
+def test_refill_is_capped_at_the_burst(clock):
+    b = MemoryBackend(10)
+    _take(b)
+    clock.now += 3600
+    assert [_take(b) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert _take(b) > 0
+
+
+def test_keys_have_separate_buckets(clock):
+    b = MemoryBackend(10)
+    one = Limit(burst=1, rate=0.1)
+    assert _take(b, "a", one) == 0.0
+    assert _take(b, "a", one) == pytest.approx(10.0)
+    assert _take(b, "b", one) == 0.0
+
+
+def test_least_recently_used_keys_are_evicted(clock):
+    b = MemoryBackend(2)
+    one = Limit(burst=1, rate=0.1)
+    for key in ("a", "b", "c"):
+        _take(b, key, one)
+    assert list(b._buckets) == ["b", "c"]
+    assert _take(b, "a", one) == 0.0  # evicted, so it starts full again
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.db.paging import decode_cursor, encode_cursor
+
+
+def test_created_at_cursor_round_trips():
+    ts = datetime(2025, 11, 3, 14, 5, 9, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor("created_at", "desc", ts, 42)
+    assert decode_cursor(cursor, "created_at", "desc") == (ts, 42, "next")
+
+
+def test_amount_cursor_round_trips_as_float():
+    cursor = encode_cursor("amount", "asc", 12, 7, direction="prev")
+    value, row_id, direction = decode_cursor(cursor, "amount", "asc")
+    assert (value, row_id, direction) == (12.0, 7, "prev")
+    assert isinstance(value, float)
+
+
+def test_cursor_is_url_safe_and_unpadded():
+    cursor = encode_cursor("created_at", "desc", datetime(2025, 1, 1, tzinfo=timezone.utc), 10**9)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("sort, order", [("amount", "desc"), ("created_at", "asc")])
+def test_cursor_for_another_sort_is_rejected(sort, order):
+    cursor = encode_cursor("created_at", "desc", datetime(2025, 1, 1, tzinfo=timezone.utc), 1)
+    with pytest.raises(ValueError, match="does not match"):
+        decode_cursor(cursor, sort, order)
+
+
+@pytest.mark.parametrize("cursor, sort", [
+    ("", "amount"), ("not-base64!", "amount"), ("e30", "amount"), ("eyJzIjoiYW1vdW50In0", "amount"),
+    # the right shape, but a value that isn't a timestamp or a number
+    (encode_cursor("created_at", "asc", 1, 1), "created_at"),
+    (encode_cursor("created_at", "asc", None, 1), "created_at"),
+    (encode_cursor("created_at", "asc", "yesterday", 1), "created_at"),
+    (encode_cursor("amount", "asc", None, 1), "amount"),
+    (encode_cursor("amount", "asc", [1], 1), "amount"),
+    (encode_cursor("amount", "asc", "abc", 1), "amount"),
+])
+def test_malformed_cursor_is_rejected(cursor, sort):
+    with pytest.raises(ValueError, match="^invalid cursor$"):
+        decode_cursor(cursor, sort, "asc")
+
+
+def test_unknown_direction_is_rejected():
+    cursor = encode_cursor("amount", "asc", 1.5, 1, direction="sideways")
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "amount", "asc")
@@ -0,0 +1,69 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import insert, select
+
+import app.models as models
+from app.db import analytics, partitions, rollups
+
+
+@pytest.mark.parametrize("start, n, expected", [
+    (date(2025, 1, 1), 0, date(2025, 1, 1)),
+    (date(2025, 1, 1), 1, date(2025, 2, 1)),
+    (date(2025, 11, 1), 2, date(2026, 1, 1)),
+    (date(2025, 12, 1), 1, date(2026, 1, 1)),
+    (date(2025, 1, 1), -1, date(2024, 12, 1)),
+    (date(2025, 3, 1), -27, date(2022, 12, 1)),
+    (date(2025, 1, 31), 1, date(2025, 2, 1)),  # always lands on the first of the month
+])
+def test_add_months(start, n, expected):
+    assert partitions.add_months(start, n) == expected
+
+
+def test_partition_name_matches_the_listing_pattern():
+    name = partitions.partition_name(date(2025, 3, 1))
+    assert name == "expenses_p2025_03"
+    m = partitions._NAME.match(name)
+    assert (int(m[1]), int(m[2])) == (2025, 3)
+    assert partitions._NAME.match(partitions.DEFAULT_PARTITION) is None
+
+
+def test_bounds_are_utc_midnights_and_adjacent():
+    month = date(2025, 12, 1)
+    lo, hi = partitions._bound(month), partitions._bound(partitions.add_months(month, 1))
+    assert (lo, hi) == ("2025-12-01 00:00:00+00", "2026-01-01 00:00:00+00")
+
+
+def _monthly(db, user_id):
+    M = models.MonthlyRollup
+    return sorted((r.month, r.category, round(r.total, 9), r.count) for r in
+                  db.execute(select(M).where(M.user_id == user_id)).scalars())
+
+
+def test_drop_removes_old_months_and_their_rollups(db, user_id, monkeypatch):
+    monkeypatch.setattr(rollups.live.settings, "LIVE_UPDATES", False)
+    monkeypatch.setattr(analytics.archive.settings, "ARCHIVE_AFTER_MONTHS", 12)
+    recent = datetime.now(timezone.utc).replace(day=1, hour=12)
+    db.execute(insert(models.Expense.__table__), [
+        {"user_id": user_id, "category": c, "amount": a, "created_at": t} for c, a, t in [
+            ("food", 1.5, datetime(2023, 3, 15, tzinfo=timezone.utc)),  # lands in the default partition
+            ("rent", 2.25, datetime(2023, 4, 30, 23, tzinfo=timezone.utc)),
+            ("food", 4.0, recent)]])
+    db.execute(insert(models.ArchivedExpense.__table__), [
+        {"id": 10**9, "user_id": user_id, "category": "food", "amount_cents": 800,
+         "created_at": datetime(2023, 2, 1, tzinfo=timezone.utc),
+         "updated_at": datetime(2023, 2, 1, tzinfo=timezone.utc)}])
+    rollups.rebuild(db, user_id=user_id)
+    conn = db.connection()
+
+    dropped = partitions.drop(conn, date(2024, 1, 1))
+    assert {"expenses_p2023_03", "expenses_p2023_04"} <= set(dropped)
+    assert not any(p.month and p.month < date(2024, 1, 1) for p in partitions.partitions(conn))
+    assert db.execute(select(models.Expense.amount).where(models.Expense.user_id == user_id)).scalars().all() == [4.0]
+
+    kept = _monthly(db, user_id)
+    assert kept == [(date(2023, 2, 1), "food", 8.0, 1), (recent.date(), "food", 4.0, 1)]
+    rollups.rebuild(db, user_id=user_id)
+    assert _monthly(db, user_id) == kept
+    local = analytics.period_stats(db, user_id, None, None, tz="Asia/Seoul").current
+    assert (local.total, local.count) == (12.0, 2)
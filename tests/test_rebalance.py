@@ -0,0 +1,60 @@
+import copy
+
+from app.db.rebalance import plan
+
+
+def totals_after(loads, moves):
+    users = {n: dict(w) for n, w in loads.items()}
+    for user_id, src, dst in moves:
+        users[dst][user_id] = users[src].pop(user_id)
+    return {n: sum(w.values()) for n, w in users.items()}
+
+
+def test_balanced_shards_need_no_moves():
+    loads = {0: {1: 50, 2: 50}, 1: {3: 60, 4: 40}}
+    assert plan(loads, [0, 1], 0.1, 10) == []
+
+
+def test_moves_from_the_heaviest_to_the_lightest_target():
+    loads = {0: {1: 40, 2: 30, 3: 20, 4: 10}, 1: {5: 10}, 2: {6: 20}}
+    moves = plan(loads, [0, 1, 2], 0.1, 10)
+    assert moves[0][1:] == (0, 1)
+    after = totals_after(loads, moves)
+    assert max(after.values()) - min(after.values()) < 100 - 10
+    assert sum(after.values()) == 130
+
+
+def test_picks_the_user_closest_to_half_the_gap():
+    loads = {0: {1: 5, 2: 48, 3: 30}, 1: {}}
+    assert plan(loads, [0, 1], 0.05, 1) == [(2, 0, 1)]
+
+
+def test_only_open_shards_receive_users():
+    loads = {0: {1: 30, 2: 30, 3: 30}, 1: {}, 2: {4: 10}}
+    moves = plan(loads, [0, 2], 0.1, 10)
+    assert moves
+    assert all(dst == 2 for _, _, dst in moves)
+
+
+def test_stops_at_max_moves():
+    loads = {0: {n: 10 for n in range(10)}, 1: {}}
+    assert len(plan(loads, [0, 1], 0.0, 2)) == 2
+    assert plan(loads, [0, 1], 0.0, 0) == []
+
+
+def test_never_moves_a_user_heavier_than_the_gap():
+    # moving the single user would only swap which shard is heavy
+    loads = {0: {1: 100}, 1: {2: 10}}
+    assert plan(loads, [0, 1], 0.1, 10) == []
+
+
+def test_no_target_besides_the_heavy_shard():
+    loads = {0: {1: 50, 2: 50}, 1: {}}
+    assert plan(loads, [0], 0.1, 10) == []
+
+
+def test_leaves_the_input_untouched():
+    loads = {0: {1: 40, 2: 30}, 1: {}}
+    before = copy.deepcopy(loads)
+    assert plan(loads, [0, 1], 0.1, 10)
+    assert loads == before
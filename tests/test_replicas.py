@@ -0,0 +1,91 @@
+import asyncio, time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import cache
+from app.db import replicas
+
+
+class FakeEngine:
+    """Answers the probe query with a fixed (in_recovery, lag, replayed_lsn) row."""
+    def __init__(self, row):
+        self.row = row
+
+    @contextmanager
+    def connect(self):
+        yield SimpleNamespace(execute=lambda stmt: SimpleNamespace(one=lambda: self.row))
+
+
+def _replica(name, replayed_lsn, lag=0.0):
+    return replicas.Replica(name, engine=None, healthy=True, lag=lag, checked_at=time.time(),
+                            replayed_lsn=replayed_lsn)
+
+
+def _set(*members):
+    rs = replicas.ReplicaSet([])
+    rs.replicas = list(members)
+    return rs
+
+
+def test_a_user_without_writes_reads_from_a_replica():
+    r, reason = _set(_replica("a", 100)).choose(0)
+    assert (r.name, reason) == ("a", "replica")
+
+
+def test_a_replica_behind_the_users_write_is_skipped():
+    rs = _set(_replica("behind", 100), _replica("ahead", 300))
+    for _ in range(3):
+        r, reason = rs.choose(200)
+        assert (r.name, reason) == ("ahead", "replica")
+
+
+def test_exactly_replayed_write_is_visible():
+    assert _set(_replica("a", 200)).choose(200)[1] == "replica"
+
+
+def test_recent_write_keeps_the_read_on_the_primary():
+    assert _set(_replica("a", 100), _replica("b", 150)).choose(151) == (None, "recent_write")
+
+
+def test_lagging_or_stale_replicas_are_unavailable():
+    lagging = _replica("lagging", 10**9, lag=replicas.settings.DB_REPLICA_MAX_LAG + 1)
+    stale = _replica("stale", 10**9)
+    stale.checked_at = time.time() - 3600
+    assert _set(lagging, stale).choose(0) == (None, "unavailable")
+
+
+def test_probe_records_the_replay_position_not_the_clock():
+    r = replicas.Replica("a", engine=FakeEngine((True, 0, 12345)))
+    r.check()
+    assert r.healthy and r.lag == 0.0 and r.replayed_lsn == 12345
+    # an idle standby reports lag 0; what it replayed still decides read-your-writes
+    assert _set(r).choose(12346) == (None, "recent_write")
+
+
+def test_probe_skips_a_primary():
+    r = replicas.Replica("a", engine=FakeEngine((False, 0, None)))
+    r.check()
+    assert not r.healthy
+
+
+def test_memory_backend_keeps_the_highest_write_position():
+    backend = cache.MemoryBackend(10)
+
+    async def run():
+        await backend.bump(1, 500)
+        await backend.bump(1, 300)  # a slower request finishing late
+        await backend.bump(1)  # writes without a position don't clear it
+        return await backend.write_lsn(1), await backend.write_lsn(2)
+
+    assert asyncio.run(run()) == (500, 0)
+
+
+def test_replicas_require_the_shared_cache(monkeypatch):
+    monkeypatch.setattr(replicas, "replicas", _set())
+    monkeypatch.setattr(replicas.settings, "RESPONSE_CACHE_BACKEND", "memory")
+    with pytest.raises(RuntimeError, match="RESPONSE_CACHE_BACKEND=redis"):
+        replicas.require_shared_cache()
+    monkeypatch.setattr(replicas.settings, "RESPONSE_CACHE_BACKEND", "redis")
+    replicas.require_shared_cache()